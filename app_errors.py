@@ -1,21 +1,30 @@
 
+import time
+
 from fastapi import Request
 from starlette.exceptions import HTTPException as StarletteHTTPException
 from starlette.responses import RedirectResponse
 
+from error_log import ERROR_LOG
+
 def not_authorized(request: Request, exc: StarletteHTTPException):
     return RedirectResponse("/users/login")
 
 def not_found(request: Request, exc: StarletteHTTPException):
     return RedirectResponse("/not_found")
 
-def server_error(request: Request, exc: StarletteHTTPException):
-    import traceback
+def server_error(request: Request, exc: Exception):
+    # Only queues the record, error_log writes it on its own thread
+    state = request.state
+    start_time = getattr(state, 'start_time', None)
+    ERROR_LOG.exception(
+        exc,
+        request_id=getattr(state, 'request_id', None),
+        method=request.method,
+        route=getattr(state, 'route', request.url.path),
+        path=request.url.path,
+        user_id=getattr(state, 'user_id', None),
+        latency=time.perf_counter() - start_time if start_time is not None else None,
+    )
 
-    with open("server_errors.txt", "a") as f:
-        content = "".join(
-            traceback.format_exception(etype=type(exc), value=exc, tb=exc.__traceback__)
-        )
-        f.write(content)
-        f.write('\n\n')
-    return RedirectResponse("/server_error")
\ No newline at end of file
+    return RedirectResponse("/server_error")
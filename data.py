@@ -1,62 +1,813 @@
-from typing import Union
+import asyncio
+from contextlib import asynccontextmanager, contextmanager
+import contextvars
+from functools import lru_cache
+import itertools
+import queue
+import threading
+import time
+from typing import Any, Awaitable, Callable, Optional, Sequence, Union, TYPE_CHECKING
+import aiomysql
 import mysql.connector as connector
 from mysql.connector import Error
-import pandas as pd
 
+from cache import TTLCache
 from config import settings
+from error_log import ERROR_LOG
+import metrics
+from statements import statement_name
 
+if TYPE_CHECKING:
+    import pandas as pd
 
+# Constants
+# "host" or "host:port"
+HOST = getattr(settings, 'DATABASE_HOST', 'localhost')
+REPLICA_HOSTS = getattr(settings, 'DATABASE_REPLICA_HOSTS', ())
+# Seconds a user's reads stay on the primary after they write
+REPLICA_PIN = getattr(settings, 'DATABASE_REPLICA_PIN', 5.0)
+REPLICA_PIN_SIZE = getattr(settings, 'DATABASE_REPLICA_PIN_SIZE', 100000)
+POOL_SIZE = getattr(settings, 'DATABASE_POOL_SIZE', 10)
+POOL_TIMEOUT = getattr(settings, 'DATABASE_POOL_TIMEOUT', 30.0)
+STREAM_BATCH_SIZE = getattr(settings, 'DATABASE_STREAM_BATCH_SIZE', 500)
+ROW_TYPES = ('dict', 'tuple', 'row')
+# Write-behind, see WriteQueue
+WRITE_BEHIND = getattr(settings, 'DATABASE_WRITE_BEHIND', False)
+WRITE_QUEUE_SIZE = getattr(settings, 'DATABASE_WRITE_QUEUE_SIZE', 10000)
+WRITE_BATCH_SIZE = getattr(settings, 'DATABASE_WRITE_BATCH_SIZE', 500)
+WRITE_MAX_LATENCY = getattr(settings, 'DATABASE_WRITE_MAX_LATENCY', 0.01)
+SAVEPOINT = "SAVEPOINT write_behind"
+ROLLBACK_TO_SAVEPOINT = "ROLLBACK TO SAVEPOINT write_behind"
+RELEASE_SAVEPOINT = "RELEASE SAVEPOINT write_behind"
 
-class Database:
 
-    def __init__(self) -> None:
-        self.conn, self.cursor = self.create_connection()
+# The user of the request, set by utils.get_current_user. None in the CLI
+# tools, the background tasks and before authentication, never pinned
+CURRENT_USER: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar('current_user', default=None)
+
+
+class PoolTimeout(Error):
+    pass
+
+
+def address(host:str) -> tuple[str, int]:
+    host, _, port = host.partition(':')
+    return host, int(port or 3306)
+
+
+class Row:
+    """
+    Base class for the light row objects returned with row_type='row'.
+    Subclasses are generated per column set by row_class().
+    """
+    __slots__ = ()
+
+    def __getitem__(self, key:str) -> Any:
+        return getattr(self, key)
+
+    def __iter__(self):
+        return (getattr(self, column) for column in self.__slots__)
+
+    def __repr__(self) -> str:
+        values = ", ".join(f"{column}={getattr(self, column)!r}" for column in self.__slots__)
+        return f"Row({values})"
+
+    def keys(self) -> tuple[str]:
+        return self.__slots__
+
+    def as_dict(self) -> dict:
+        return {column: getattr(self, column) for column in self.__slots__}
+
+
+@lru_cache(maxsize=256)
+def row_class(columns:tuple[str]) -> type:
+    def __init__(self, *values):
+        for column, value in zip(columns, values):
+            setattr(self, column, value)
+
+    return type("Row", (Row,), {"__slots__": columns, "__init__": __init__})
+
+
+def build_rows(columns:tuple[str], rows:list[tuple], row_type:str = 'dict') -> list:
+    if row_type == 'dict':
+        return [dict(zip(columns, row)) for row in rows]
+    elif row_type == 'tuple':
+        return list(rows)
+    elif row_type == 'row':
+        cls = row_class(columns)
+        return [cls(*row) for row in rows]
+
+    raise ValueError(f"row_type has to be one of {ROW_TYPES}, currently it is {row_type}")
+
+
+def cursor_columns(cursor) -> tuple[str]:
+    return tuple(column[0] for column in cursor.description)
+
+
+class StatementTimer:
+    """
+    Times a statement and counts its rows into metrics.py, tagged with
+    the query.py builder that compiled the SQL.
+    """
+    __slots__ = ('name', 'start', 'rows')
+
+    def __init__(self, query:str) -> None:
+        self.name = statement_name(query)
+        self.rows = 0
+
+    def __enter__(self) -> 'StatementTimer':
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        elapsed = time.perf_counter() - self.start
+        metrics.observe_statement(self.name, elapsed, self.rows, error=exc_type is not None)
+
+
+def changed_rows(cursor) -> bool:
+    """ Whether the last statement of the cursor wrote, a read returns rows instead. """
+    # Not lastrowid, SQLite keeps the one of an earlier INSERT on the cursor
+    return cursor.description is None and cursor.rowcount > 0
+
+
+class TimedCursor:
+    """
+    aiomysql cursor proxy that times execute and executemany. `wrote`
+    tells whether a statement changed rows, only then the transaction
+    pins the reads of the user.
+    """
+
+    def __init__(self, cursor) -> None:
+        self._cursor = cursor
+        self.wrote = False
+
+    def __getattr__(self, name:str) -> Any:
+        return getattr(self._cursor, name)
+
+    async def execute(self, query:str, values:Union[tuple, list] = ()):
+        with StatementTimer(query) as timer:
+            result = await self._cursor.execute(query, values)
+            timer.rows = self._cursor.rowcount
+        self.wrote = self.wrote or changed_rows(self._cursor)
+
+        return result
+
+    async def executemany(self, query:str, values:list[tuple]):
+        with StatementTimer(query) as timer:
+            result = await self._cursor.executemany(query, values)
+            timer.rows = self._cursor.rowcount
+        self.wrote = self.wrote or changed_rows(self._cursor)
+
+        return result
+
+
+class ConnectionPool:
+    """
+    Bounded pool of MySQL connections. Connections are created lazily
+    up to `size` and a caller waits at most `timeout` seconds for one
+    to be returned before PoolTimeout is raised.
+    """
+
+    def __init__(self, factory, size:int = POOL_SIZE, timeout:float = POOL_TIMEOUT) -> None:
+        self.factory = factory
+        self.size = size
+        self.timeout = timeout
+
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+
+        # Metrics
+        self._in_use = 0
+        self._created = 0
+        self._checkouts = 0
+        self._timeouts = 0
+        self._wait_time = 0.0
+        self._max_wait_time = 0.0
+
+    def acquire(self):
+        start = time.perf_counter()
+        if not self._slots.acquire(timeout=self.timeout):
+            with self._lock:
+                self._timeouts += 1
+            raise PoolTimeout(f"No database connection available after {self.timeout} seconds")
+        waited = time.perf_counter() - start
+
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = None
+
+        try:
+            if conn is None:
+                conn = self.factory()
+                with self._lock:
+                    self._created += 1
+            else:
+                self.check(conn)
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._in_use += 1
+            self._checkouts += 1
+            self._wait_time += waited
+            self._max_wait_time = max(self._max_wait_time, waited)
+
+        return conn
+
+    def check(self, conn) -> None:
+        # Reconnect if the server dropped the connection while idle
+        conn.ping(reconnect=True, attempts=1, delay=0)
+
+    def release(self, conn) -> None:
+        with self._lock:
+            self._in_use -= 1
+
+        self._idle.put(conn)
+        self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self) -> None:
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self.close_connection(conn)
+
+    def close_connection(self, conn) -> None:
+        if conn.is_connected():
+            conn.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            checkouts = self._checkouts
+            return {
+                'size': self.size,
+                'in_use': self._in_use,
+                'idle': self._idle.qsize(),
+                'created': self._created,
+                'checkouts': checkouts,
+                'timeouts': self._timeouts,
+                'wait_time_total': self._wait_time,
+                'wait_time_avg': self._wait_time / checkouts if checkouts else 0.0,
+                'wait_time_max': self._max_wait_time,
+            }
+
+
+class ReplicaRouter:
+    """
+    Read/write splitting for Database and AsyncDatabase. The database is
+    the primary, the fetch paths go round robin to its `replicas` and
+    everything else stays on the primary. A write pins the reads of
+    CURRENT_USER to the primary for REPLICA_PIN seconds, so users see
+    their own writes whatever the replication lag. `primary=True` reads
+    from the primary anyway.
+    """
+
+    def init_replicas(self, replicas:Sequence = ()) -> None:
+        self.replicas = list(replicas)
+        self._replica_cycle = itertools.cycle(self.replicas)
+        self.pinned = TTLCache(maxsize=REPLICA_PIN_SIZE, ttl=REPLICA_PIN)
+
+        # Metrics
+        self._primary_reads = 0
+        self._replica_reads = 0
+
+    def pin(self) -> None:
+        """ Called after a committed write, reads and writes that changed nothing don't pin. """
+        user_id = CURRENT_USER.get()
+        # Writes without a user (startup, background tasks) pin nobody,
+        # their reads would all go to the primary otherwise
+        if self.replicas and user_id is not None:
+            self.pinned.set(user_id, True)
+
+    def reader(self, primary:bool = False):
+        """ The database to read from. """
+        if not self.replicas or primary or self.pinned.get(CURRENT_USER.get()):
+            self._primary_reads += 1
+            return self
+
+        self._replica_reads += 1
+        return next(self._replica_cycle)
+
+    def replica_stats(self) -> dict:
+        return {
+            'replicas': len(self.replicas),
+            'primary_reads': self._primary_reads,
+            'replica_reads': self._replica_reads,
+            'pinned_users': len(self.pinned),
+        }
+
+
+class Database(ReplicaRouter):
+
+    def __init__(
+            self, pool_size:int = POOL_SIZE, pool_timeout:float = POOL_TIMEOUT,
+            host:str = HOST, replicas:Sequence['Database'] = ()
+        ) -> None:
+        self.host, self.port = address(host)
+        self.pool = ConnectionPool(self.create_connection, pool_size, pool_timeout)
+        self.init_replicas(replicas)
 
     def create_connection(self):
         try:
             conn = connector.connect(
-                host='localhost',
+                host=self.host,
+                port=self.port,
                 database='pomodoros',
                 user=settings.DATABASE_USER,
-                password=settings.DATABASE_PASSWORD
+                password=settings.DATABASE_PASSWORD,
+                # Pooled connections are shared between requests, so reads
+                # must not keep an old snapshot open between checkouts
+                autocommit=True,
             )
         except Error as e:
             print(f"Error while connecting to MySQL: {e}")
-        
-        cursor = conn.cursor()
+            raise
 
-        return conn, cursor
+        return conn
 
     def close_connection(self):
-        if self.conn.is_connected():
-            self.cursor.close()
-            self.conn.close()
+        self.pool.close()
+        for replica in self.replicas:
+            replica.close_connection()
+
+    def begin(self, conn) -> None:
+        conn.start_transaction()
+
+    def execute_query(self, query:str, values:Union[tuple, list[tuple]])-> int:
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                with StatementTimer(query) as timer:
+                    cursor.execute(query, values)
+                    rowcount = timer.rows = cursor.rowcount
+                wrote = changed_rows(cursor)
+            finally:
+                cursor.close()
+        if wrote:
+            self.pin()
+
+        return rowcount
+
+    def execute_many(self, query:str, values:list[tuple])-> int:
+        """ Run `query` for every values tuple in a single transaction. """
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                self.begin(conn)
+                with StatementTimer(query) as timer:
+                    cursor.executemany(query, values)
+                    rowcount = timer.rows = cursor.rowcount
+                wrote = changed_rows(cursor)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                cursor.close()
+        if wrote:
+            self.pin()
+
+        return rowcount
+
+    def fetch_all(self, query:str, values:Union[tuple, list] = (), row_type:str = 'dict', primary:bool = False)-> list:
+        return self.reader(primary)._fetch_all(query, values, row_type)
+
+    def _fetch_all(self, query:str, values:Union[tuple, list], row_type:str)-> list:
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                with StatementTimer(query) as timer:
+                    cursor.execute(query, values)
+                    rows = cursor.fetchall()
+                    timer.rows = len(rows)
+                columns = cursor_columns(cursor)
+            finally:
+                cursor.close()
+
+        return build_rows(columns, rows, row_type)
+
+    def fetch_one(self, query:str, values:Union[tuple, list] = (), row_type:str = 'dict', primary:bool = False):
+        rows = self.fetch_all(query, values, row_type, primary)
+        return rows[0] if rows else None
+
+    def pandas_query(self, query:str, params:Union[tuple, list[tuple], dict] = (), primary:bool = False)-> 'pd.DataFrame':
+        return self.reader(primary)._pandas_query(query, params)
+
+    def _pandas_query(self, query:str, params:Union[tuple, list[tuple], dict])-> 'pd.DataFrame':
+        # pandas is only needed for offline analysis, keep it out of the
+        # request path and out of worker startup
+        import pandas as pd
+
+        with self.pool.connection() as conn:
+            with StatementTimer(query) as timer:
+                df = pd.read_sql(query, conn, params=params)
+                timer.rows = len(df)
+
+        return df
+
+class WriteQueue:
+    """
+    Write-behind queue of an AsyncDatabase. Writes are queued and a
+    background task commits them in groups, one transaction for up to
+    `batch_size` writes that arrived within `max_latency` seconds of the
+    first one, so a burst of writes shares one commit instead of paying
+    one each.
 
-    def execute_query(self, query:str, values:Union[tuple, list[tuple]]):
+    A durable write waits until its group is committed and gets the
+    result of its work. The others return at once, a write that fails
+    later is sent to the error log. The queue is bounded, when it's full
+    writers wait for room. Every write runs under its own savepoint, a
+    failing one is rolled back to it and only fails itself, the rest of
+    the group is committed. A write is never run twice.
+    """
+
+    def __init__(
+            self, database:'AsyncDatabase', maxsize:int = WRITE_QUEUE_SIZE,
+            batch_size:int = WRITE_BATCH_SIZE, max_latency:float = WRITE_MAX_LATENCY
+        ) -> None:
+        self.database = database
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.max_latency = max_latency
+        # Created in the running event loop by the first write
+        self.queue: Optional[asyncio.Queue] = None
+        self._writer: Optional[asyncio.Task] = None
+
+        # Metrics
+        self._queued = 0
+        self._batches = 0
+        self._written = 0
+        self._failed = 0
+
+    async def put(self, work:Callable[[Any], Awaitable], durable:bool = True):
+        if self._writer is None:
+            self.queue = asyncio.Queue(self.maxsize)
+            # The writer commits for every user, it mustn't inherit the
+            # CURRENT_USER of the request that started it
+            self._writer = contextvars.Context().run(asyncio.create_task, self._run())
+
+        future = asyncio.get_running_loop().create_future() if durable else None
+        # The writer pins the reads of the caller's CURRENT_USER once committed
+        await self.queue.put((work, future, contextvars.copy_context()))
+        self._queued += 1
+
+        return await future if durable else None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_latency
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                await self._write(batch)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    async def _write(self, batch:list) -> None:
+        self._batches += 1
+        # (result, exception, wrote) of every write
+        outcomes = []
         try:
-            self.cursor.execute(query, values)
+            async with self.database.transaction() as cursor:
+                for work, _, _ in batch:
+                    await cursor.execute(SAVEPOINT)
+                    cursor.wrote = False
+                    try:
+                        result = await work(cursor)
+                    except Exception as e:
+                        # Raises when the error ended the whole transaction
+                        # (a deadlock), the group fails below
+                        await cursor.execute(ROLLBACK_TO_SAVEPOINT)
+                        outcomes.append((None, e, False))
+                    else:
+                        await cursor.execute(RELEASE_SAVEPOINT)
+                        outcomes.append((result, None, cursor.wrote))
         except Exception as e:
-            # This is a quick hack to solve the issue
-            # Try to solve it in a cleaner way 
+            # Rolled back, none of the writes is applied
+            self._failed += len(batch)
+            for _, future, _ in batch:
+                self._resolve(future, exception=e)
+            return
+
+        for (_, future, context), (result, exception, wrote) in zip(batch, outcomes):
+            if exception is not None:
+                self._failed += 1
+                self._resolve(future, exception=exception)
+            else:
+                self._written += 1
+                if wrote:
+                    context.run(self.database.pin)
+                self._resolve(future, result)
+
+    @staticmethod
+    def _resolve(future:Optional[asyncio.Future], result:Any = None, exception:BaseException = None) -> None:
+        if future is None:
+            if exception is not None:
+                ERROR_LOG.exception(exception, source='write-behind')
+        elif not future.done():
+            if exception is not None:
+                future.set_exception(exception)
+            else:
+                future.set_result(result)
+
+    async def flush(self) -> None:
+        """ Wait until every queued write is committed. """
+        if self.queue is not None:
+            await self.queue.join()
+
+    async def close(self) -> None:
+        if self._writer is not None:
+            await self.flush()
+            self._writer.cancel()
+            try:
+                await self._writer
+            except asyncio.CancelledError:
+                pass
+            self._writer = None
+            self.queue = None
+
+    def stats(self) -> dict:
+        return {
+            'size': self.maxsize,
+            'pending': self.queue.qsize() if self.queue else 0,
+            'queued': self._queued,
+            'batches': self._batches,
+            'written': self._written,
+            'failed': self._failed,
+            'batch_size_avg': (self._written + self._failed) / self._batches if self._batches else 0.0,
+        }
+
+
+class AsyncDatabase(ReplicaRouter):
+    """
+    asyncio counterpart of Database backed by an aiomysql pool. The pool
+    is opened on application startup, see main.py.
+    """
 
-            # Add e to some log
-            self.conn.reconnect()
-            self.cursor.execute(query, values)
+    def __init__(
+            self, pool_size:int = POOL_SIZE, pool_timeout:float = POOL_TIMEOUT,
+            write_behind:bool = WRITE_BEHIND, host:str = HOST, replicas:Sequence['AsyncDatabase'] = ()
+        ) -> None:
+        self.host, self.port = address(host)
+        self.pool_size = pool_size
+        self.pool_timeout = pool_timeout
+        self.pool: Optional[aiomysql.Pool] = None
+        # DATABASE_WRITE_BEHIND routes submit() and write() through the queue
+        self.write_behind = write_behind
+        self.writes = WriteQueue(self)
+        self.init_replicas(replicas)
 
-        self.conn.commit()
+        # Metrics
+        self._waiting = 0
+        self._checkouts = 0
+        self._timeouts = 0
+        self._wait_time = 0.0
+        self._max_wait_time = 0.0
 
-    def pandas_query(self, query:str, params:Union[tuple, list[tuple], dict] = ())-> pd.DataFrame:
+    async def create_pool(self) -> aiomysql.Pool:
+        if self.pool is None:
+            self.pool = await aiomysql.create_pool(
+                host=self.host,
+                port=self.port,
+                db='pomodoros',
+                user=settings.DATABASE_USER,
+                password=settings.DATABASE_PASSWORD,
+                minsize=1,
+                maxsize=self.pool_size,
+                autocommit=True,
+            )
+
+        return self.pool
+
+    async def close_pool(self) -> None:
+        # The queued writes are committed first
+        await self.writes.close()
+        if self.pool is not None:
+            self.pool.close()
+            await self.pool.wait_closed()
+            self.pool = None
+        for replica in self.replicas:
+            await replica.close_pool()
+
+    @asynccontextmanager
+    async def connection(self):
+        pool = await self.create_pool()
+        start = time.perf_counter()
+        self._waiting += 1
+        # The timeout can hit as the acquire completes, the connection
+        # is released then instead of lost to the pool
+        acquiring = asyncio.ensure_future(pool.acquire())
         try:
-            df = pd.read_sql(query, self.conn, params=params)
-        except Exception as e:
-            # Add e to some log
-            self.conn.reconnect()
-            df = pd.read_sql(query, self.conn, params=params)
+            conn = await asyncio.wait_for(asyncio.shield(acquiring), self.pool_timeout)
+        except asyncio.TimeoutError:
+            self._timeouts += 1
+            self._abandon(pool, acquiring)
+            raise PoolTimeout(f"No database connection available after {self.pool_timeout} seconds")
+        except BaseException:
+            self._abandon(pool, acquiring)
+            raise
+        finally:
+            self._waiting -= 1
 
+        waited = time.perf_counter() - start
+        self._checkouts += 1
+        self._wait_time += waited
+        self._max_wait_time = max(self._max_wait_time, waited)
 
-        return df
+        try:
+            yield conn
+        finally:
+            pool.release(conn)
+
+    @staticmethod
+    def _abandon(pool, acquiring:asyncio.Future) -> None:
+        """ Stop an acquire nobody waits for anymore, a connection it still returns is released. """
+        def release(acquiring:asyncio.Future) -> None:
+            if not acquiring.cancelled() and acquiring.exception() is None:
+                pool.release(acquiring.result())
+
+        acquiring.cancel()
+        acquiring.add_done_callback(release)
+
+    def stats(self) -> dict:
+        open_connections = self.pool.size if self.pool else 0
+        idle = self.pool.freesize if self.pool else 0
+        checkouts = self._checkouts
+        return {
+            'size': self.pool_size,
+            'open': open_connections,
+            'in_use': open_connections - idle,
+            'idle': idle,
+            'waiting': self._waiting,
+            'checkouts': checkouts,
+            'timeouts': self._timeouts,
+            'wait_time_total': self._wait_time,
+            'wait_time_avg': self._wait_time / checkouts if checkouts else 0.0,
+            'wait_time_max': self._max_wait_time,
+            **self.replica_stats(),
+        }
+
+    @asynccontextmanager
+    async def transaction(self):
+        """ Cursor whose statements are committed together on exit. """
+        async with self.connection() as conn:
+            await conn.begin()
+            try:
+                async with conn.cursor() as cursor:
+                    timed = TimedCursor(cursor)
+                    yield timed
+                await conn.commit()
+            except BaseException:
+                await conn.rollback()
+                raise
+        if timed.wrote:
+            self.pin()
+
+    async def execute(self, query:str, values:Union[tuple, list] = ())-> int:
+        async with self.connection() as conn:
+            async with conn.cursor() as cursor:
+                with StatementTimer(query) as timer:
+                    await cursor.execute(query, values)
+                    timer.rows = cursor.rowcount
+                rowcount = cursor.rowcount
+                wrote = changed_rows(cursor)
+        if wrote:
+            self.pin()
+
+        return rowcount
+
+    async def execute_many(self, query:str, values:list[tuple])-> int:
+        """ Run `query` for every values tuple in a single transaction. """
+        async with self.transaction() as cursor:
+            await cursor.executemany(query, values)
+            return cursor.rowcount
+
+    async def submit(self, work:Callable[[Any], Awaitable], durable:bool = True):
+        """
+        Run `await work(cursor)` in a transaction and return its result.
+        In write-behind mode the transaction is shared with other writes,
+        `work` must only use the cursor and runs under a savepoint. With
+        durable=False it returns None without waiting.
+        """
+        if self.write_behind:
+            return await self.writes.put(work, durable)
+
+        async with self.transaction() as cursor:
+            return await work(cursor)
+
+    async def write(self, query:str, values:Union[tuple, list] = (), durable:bool = True) -> Optional[int]:
+        """ execute(), through the write-behind queue when it's on. The rowcount or None when not durable. """
+        if not self.write_behind:
+            return await self.execute(query, values)
+
+        async def work(cursor):
+            await cursor.execute(query, values)
+            return cursor.rowcount
+
+        return await self.submit(work, durable)
+
+    async def fetch_all(self, query:str, values:Union[tuple, list] = (), row_type:str = 'dict', primary:bool = False)-> list:
+        return await self.reader(primary)._fetch_all(query, values, row_type)
+
+    async def _fetch_all(self, query:str, values:Union[tuple, list], row_type:str)-> list:
+        async with self.connection() as conn:
+            async with conn.cursor() as cursor:
+                with StatementTimer(query) as timer:
+                    await cursor.execute(query, values)
+                    rows = await cursor.fetchall()
+                    timer.rows = len(rows)
+                columns = cursor_columns(cursor)
+
+        return build_rows(columns, rows, row_type)
+
+    async def fetch_one(self, query:str, values:Union[tuple, list] = (), row_type:str = 'dict', primary:bool = False):
+        rows = await self.fetch_all(query, values, row_type, primary)
+        return rows[0] if rows else None
+
+    async def stream(
+            self, query:str, values:Union[tuple, list] = (), row_type:str = 'dict',
+            batch_size:int = STREAM_BATCH_SIZE, primary:bool = False
+        ):
+        """
+        Yield lists of up to `batch_size` rows read through an unbuffered
+        server-side cursor, the result set is never held in memory.
+        """
+        async for rows in self.reader(primary)._stream(query, values, row_type, batch_size):
+            yield rows
+
+    async def _stream(self, query:str, values:Union[tuple, list], row_type:str, batch_size:int):
+        async with self.connection() as conn:
+            cursor = await conn.cursor(aiomysql.SSCursor)
+            try:
+                # Only the query is timed, not the time the client takes to read it
+                with StatementTimer(query):
+                    await cursor.execute(query, values)
+                columns = cursor_columns(cursor)
+                while True:
+                    rows = await cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+
+                    yield build_rows(columns, rows, row_type)
+            except BaseException:
+                # The unread rows would have to be drained before the
+                # connection can be reused, dropping it is cheaper
+                conn.close()
+                raise
+            finally:
+                if not conn.closed:
+                    await cursor.close()
+
+
+# DATABASE_BACKEND selects the implementation, 'mysql' or 'sqlite', the
+# replicas are DATABASE_REPLICA_HOSTS or SQLITE_REPLICA_PATHS.
+# IntegrityError and DatabaseError name the exceptions of whichever
+# backend is in use, catch them with `except IntegrityError:`
+BACKEND = getattr(settings, 'DATABASE_BACKEND', 'mysql')
+
+if BACKEND == 'sqlite':
+    import sqlite3
+    from data_sqlite import AsyncSQLiteDatabase, SQLiteDatabase
+
+    from data_sqlite import REPLICA_PATHS
 
-DB = Database()
+    DB = SQLiteDatabase(replicas=[SQLiteDatabase(path) for path in REPLICA_PATHS])
+    ADB = AsyncSQLiteDatabase(replicas=[AsyncSQLiteDatabase(path) for path in REPLICA_PATHS])
+    IntegrityError = (sqlite3.IntegrityError,)
+    DatabaseError = (sqlite3.Error,)
+else:
+    DB = Database(replicas=[Database(host=host) for host in REPLICA_HOSTS])
+    ADB = AsyncDatabase(replicas=[AsyncDatabase(host=host) for host in REPLICA_HOSTS])
+    IntegrityError = (aiomysql.IntegrityError, connector.IntegrityError)
+    DatabaseError = (aiomysql.Error, connector.Error)
 
 if __name__ == "__main__":
-    pass
\ No newline at end of file
+    pass
@@ -0,0 +1,301 @@
+"""
+SQLite backend for single-node installs and tests, selected with
+DATABASE_BACKEND = 'sqlite' (see data.py).
+
+The database is a local file in WAL mode, so readers don't wait for
+the writer and no query leaves the process. SQLiteDatabase plugs a pool
+of sqlite3 connections into data.Database. AsyncSQLiteDatabase gives
+data.AsyncDatabase a pool shaped like aiomysql's whose connections run
+every call on a thread of their own executor, so all the AsyncDatabase
+methods (transactions, streaming, metrics) work unchanged.
+"""
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+import os
+import re
+import sqlite3
+import threading
+from typing import Optional, Sequence, Union
+
+from config import settings
+from data import AsyncDatabase, ConnectionPool, Database, POOL_SIZE, POOL_TIMEOUT
+
+# Constants
+PATH = getattr(settings, 'SQLITE_PATH', 'pomodoros.db')
+# Read replicas, kept in sync by whatever copies the primary file
+REPLICA_PATHS = getattr(settings, 'SQLITE_REPLICA_PATHS', ())
+SCHEMA = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations', 'sqlite_schema.sql')
+BUSY_TIMEOUT = getattr(settings, 'SQLITE_BUSY_TIMEOUT', 5000)
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    # Durable at checkpoints, WAL keeps the database consistent on a crash
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA foreign_keys=ON",
+    f"PRAGMA busy_timeout={BUSY_TIMEOUT}",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-65536",
+    "PRAGMA mmap_size=268435456",
+)
+
+
+# Columns are typed by their declaration, like MySQL a DATE column keeps
+# only the date of a datetime and a TIMESTAMP column reads a bare date
+def convert_date(value:bytes) -> date:
+    return date.fromisoformat(value[:10].decode())
+
+def convert_timestamp(value:bytes) -> datetime:
+    return datetime.fromisoformat(value.decode())
+
+sqlite3.register_adapter(date, date.isoformat)
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(" "))
+sqlite3.register_converter("DATE", convert_date)
+sqlite3.register_converter("TIMESTAMP", convert_timestamp)
+
+_schema_lock = threading.Lock()
+_schema_ready: set[str] = set()
+
+
+def match_against(against:Optional[str], *fields:Optional[str]) -> int:
+    """ Stand-in for MySQL's MATCH() AGAINST(), the number of term occurrences. """
+    terms = re.findall(r"\w+", (against or "").lower())
+    text = " ".join(field or "" for field in fields).lower()
+    return sum(text.count(term) for term in terms)
+
+
+def connect(path:str = PATH) -> sqlite3.Connection:
+    # isolation_level=None is autocommit, transactions are opened with
+    # BEGIN IMMEDIATE so a writer takes the lock before its first read
+    conn = sqlite3.connect(
+        path, isolation_level=None, check_same_thread=False,
+        detect_types=sqlite3.PARSE_DECLTYPES,
+    )
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    conn.create_function("match_against", -1, match_against, deterministic=True)
+
+    with _schema_lock:
+        if path not in _schema_ready:
+            with open(SCHEMA) as f:
+                conn.executescript(f.read())
+            _schema_ready.add(path)
+
+    return conn
+
+
+class SQLitePool(ConnectionPool):
+
+    def check(self, conn) -> None:
+        # A local file, nothing can drop the connection while idle
+        pass
+
+    def close_connection(self, conn) -> None:
+        conn.close()
+
+
+class SQLiteDatabase(Database):
+
+    def __init__(
+            self, path:str = PATH, pool_size:int = POOL_SIZE, pool_timeout:float = POOL_TIMEOUT,
+            replicas:Sequence['SQLiteDatabase'] = ()
+        ) -> None:
+        self.path = path
+        self.pool = SQLitePool(self.create_connection, pool_size, pool_timeout)
+        self.init_replicas(replicas)
+
+    def create_connection(self):
+        return connect(self.path)
+
+    def begin(self, conn) -> None:
+        conn.execute("BEGIN IMMEDIATE")
+
+
+# asyncio adapters with the parts of the aiomysql API used by AsyncDatabase
+
+class AsyncSQLiteCursor:
+
+    def __init__(self, connection:'AsyncSQLiteConnection') -> None:
+        self._connection = connection
+        self._cursor = connection.conn.cursor()
+
+    @property
+    def rowcount(self) -> int:
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self) -> int:
+        return self._cursor.lastrowid
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    async def execute(self, query:str, values:Union[tuple, list] = ()) -> int:
+        await self._connection.run(self._cursor.execute, query, tuple(values))
+        return self._cursor.rowcount
+
+    async def executemany(self, query:str, values:list) -> int:
+        await self._connection.run(self._cursor.executemany, query, [tuple(row) for row in values])
+        return self._cursor.rowcount
+
+    async def fetchone(self):
+        return await self._connection.run(self._cursor.fetchone)
+
+    async def fetchmany(self, size:int = None) -> list:
+        return await self._connection.run(self._cursor.fetchmany, size or self._cursor.arraysize)
+
+    async def fetchall(self) -> list:
+        return await self._connection.run(self._cursor.fetchall)
+
+    async def close(self) -> None:
+        self._cursor.close()
+
+
+class _CursorContext:
+    """ Like aiomysql's conn.cursor(), works with `await` and `async with`. """
+
+    def __init__(self, connection:'AsyncSQLiteConnection') -> None:
+        self._connection = connection
+        self._cursor: Optional[AsyncSQLiteCursor] = None
+
+    def __await__(self):
+        async def cursor():
+            return AsyncSQLiteCursor(self._connection)
+        return cursor().__await__()
+
+    async def __aenter__(self) -> AsyncSQLiteCursor:
+        self._cursor = AsyncSQLiteCursor(self._connection)
+        return self._cursor
+
+    async def __aexit__(self, *exc) -> None:
+        await self._cursor.close()
+
+
+class AsyncSQLiteConnection:
+
+    def __init__(self, conn:sqlite3.Connection, executor:ThreadPoolExecutor) -> None:
+        self.conn = conn
+        self.executor = executor
+        self.closed = False
+
+    async def run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, func, *args)
+
+    def cursor(self, *args) -> _CursorContext:
+        return _CursorContext(self)
+
+    async def begin(self) -> None:
+        await self.run(self.conn.execute, "BEGIN IMMEDIATE")
+
+    async def commit(self) -> None:
+        await self.run(self.conn.commit)
+
+    async def rollback(self) -> None:
+        await self.run(self.conn.rollback)
+
+    def close(self) -> None:
+        if not self.closed:
+            self.closed = True
+            self.conn.close()
+
+
+class AsyncSQLitePool:
+    """
+    Pool of up to `maxsize` connections with the acquire/release,
+    size/freesize and close/wait_closed API of aiomysql.Pool.
+    """
+
+    def __init__(self, path:str, maxsize:int) -> None:
+        self.path = path
+        self.maxsize = maxsize
+        self.executor = ThreadPoolExecutor(max_workers=maxsize, thread_name_prefix='sqlite')
+
+        self._idle: list[AsyncSQLiteConnection] = []
+        self._waiters: deque[asyncio.Future] = deque()
+        self._size = 0
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    @property
+    def freesize(self) -> int:
+        return len(self._idle)
+
+    async def acquire(self) -> AsyncSQLiteConnection:
+        if self._idle:
+            return self._idle.pop()
+
+        if self._size < self.maxsize:
+            self._size += 1
+            connecting = asyncio.get_running_loop().run_in_executor(self.executor, connect, self.path)
+            try:
+                conn = await asyncio.shield(connecting)
+            except asyncio.CancelledError:
+                # The thread still opens the connection, it's pooled then
+                connecting.add_done_callback(self._connected)
+                raise
+            except BaseException:
+                self._size -= 1
+                raise
+            return AsyncSQLiteConnection(conn, self.executor)
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            return await waiter
+        except asyncio.CancelledError:
+            # Cancelled (a pool timeout) after release() handed it a connection
+            if waiter.done() and not waiter.cancelled():
+                self.release(waiter.result())
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    def _connected(self, connecting:asyncio.Future) -> None:
+        if connecting.cancelled() or connecting.exception() is not None:
+            self._size -= 1
+            return
+
+        self.release(AsyncSQLiteConnection(connecting.result(), self.executor))
+
+    def release(self, conn:AsyncSQLiteConnection) -> None:
+        if conn.closed:
+            self._size -= 1
+            return
+
+        # Hand the connection straight to the oldest waiter still waiting
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(conn)
+                return
+
+        self._idle.append(conn)
+
+    def close(self) -> None:
+        while self._idle:
+            self._idle.pop().close()
+            self._size -= 1
+
+    async def wait_closed(self) -> None:
+        self.executor.shutdown(wait=True)
+
+
+class AsyncSQLiteDatabase(AsyncDatabase):
+
+    def __init__(
+            self, path:str = PATH, pool_size:int = POOL_SIZE, pool_timeout:float = POOL_TIMEOUT,
+            replicas:Sequence['AsyncSQLiteDatabase'] = ()
+        ) -> None:
+        super().__init__(pool_size, pool_timeout, replicas=replicas)
+        self.path = path
+
+    async def create_pool(self) -> AsyncSQLitePool:
+        if self.pool is None:
+            self.pool = AsyncSQLitePool(self.path, self.pool_size)
+
+        return self.pool
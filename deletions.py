@@ -0,0 +1,201 @@
+"""
+Background cascade deletes.
+
+Deleting a user, a recall project or the recalls of a recall project
+inserts a deletion_jobs row and returns. A task deletes the rows of the
+job table by table, children before parents so no foreign key fails:
+
+    user:           recalls -> recall_projects -> pomodoros
+                    -> pomodoro_rollups -> projects -> categories -> users
+    recall_project: recalls -> recall_projects
+    recalls:        recalls
+
+Every chunk deletes at most CHUNK_SIZE rows in a short transaction that
+also commits the job's progress, GET /deletions/{job_id} reports it.
+A job whose worker stopped (a crash, a restart) keeps its status
+'running' and stops being updated; after STALE_AFTER seconds another
+worker claims it and resumes it from the step it was on.
+"""
+import asyncio
+from datetime import datetime, timedelta
+from typing import Optional
+
+from config import settings
+from data import ADB, IntegrityError
+from error_log import ERROR_LOG
+from models import DeletionStatus, DeletionTarget
+import query as q
+import utils
+import versions
+
+# Constants
+CHUNK_SIZE = getattr(settings, 'DELETION_CHUNK_SIZE', 1000)
+# Seconds between chunks, leaves room for the other transactions
+CHUNK_PAUSE = getattr(settings, 'DELETION_CHUNK_PAUSE', 0.0)
+STALE_AFTER = getattr(settings, 'DELETION_STALE_AFTER', 60.0)
+# Times a job starts over after rows were added under a table it emptied
+MAX_RESTARTS = 3
+
+STEPS = {
+    DeletionTarget.user: (
+        'recalls', 'recall_projects', 'pomodoros', 'pomodoro_rollups', 'projects', 'categories', 'users'
+    ),
+    DeletionTarget.recall_project: ('recalls', 'recall_projects'),
+    DeletionTarget.recalls: ('recalls',),
+}
+
+
+def progress(job:dict) -> dict:
+    """ A deletion_jobs row as a models.DeletionJobResponse. """
+    tables = STEPS[DeletionTarget(job['target'])]
+    running = job['status'] == DeletionStatus.running.value
+    return {
+        **job,
+        'steps': len(tables),
+        'table': tables[job['step']] if running and job['step'] < len(tables) else None,
+    }
+
+
+class DeletionRunner:
+
+    def __init__(self) -> None:
+        # job_id -> task deleting it in this worker
+        self._tasks: dict[int, asyncio.Task] = {}
+        self._watcher: Optional[asyncio.Task] = None
+
+        # Metrics
+        self.started = 0
+        self.resumed = 0
+        self.done = 0
+        self.failed = 0
+        self.deleted = 0
+
+    async def submit(self, user_id:str, target:DeletionTarget, target_id:int = None) -> int:
+        """ Create the job and start deleting in the background, returns the job_id. """
+        now = datetime.utcnow()
+        values = (user_id, target.value, target_id, 0, 0, DeletionStatus.running.value, now, now)
+        async with ADB.transaction() as cursor:
+            await cursor.execute(q.create_deletion_job(), values)
+            job_id = cursor.lastrowid
+
+        self.started += 1
+        self._spawn({'job_id': job_id, 'user_id': user_id, 'target': target.value, 'target_id': target_id,
+            'step': 0, 'deleted': 0})
+
+        return job_id
+
+    def _spawn(self, job:dict) -> None:
+        job_id = job['job_id']
+        task = asyncio.create_task(self._run(job))
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job_id, None))
+
+    async def _run(self, job:dict) -> None:
+        job_id, user_id = job['job_id'], job['user_id']
+        target = DeletionTarget(job['target'])
+        tables = STEPS[target]
+        by_recall_project = target is not DeletionTarget.user
+        scope = (user_id, job['target_id']) if by_recall_project else (user_id,)
+        step, deleted, restarts = job['step'], job['deleted'], 0
+        # The cached user is dropped once the users row is gone
+        email = await q.get_user_email(user_id) if target is DeletionTarget.user else None
+
+        try:
+            while step < len(tables):
+                table = tables[step]
+                try:
+                    async with ADB.transaction() as cursor:
+                        await cursor.execute(q.delete_chunk(table, by_recall_project), (*scope, CHUNK_SIZE))
+                        rowcount = max(cursor.rowcount, 0)
+                        # A short chunk was the last one of the table
+                        next_step = step + 1 if rowcount < CHUNK_SIZE else step
+                        if rowcount and table in versions.TABLES:
+                            await versions.bump(cursor, user_id, table)
+
+                        status = DeletionStatus.done if next_step == len(tables) else DeletionStatus.running
+                        values = (next_step, deleted + rowcount, status.value, datetime.utcnow(), job_id)
+                        await cursor.execute(q.update_deletion_job(), values)
+                except IntegrityError:
+                    # Rows were added under a table already emptied, the
+                    # user kept writing meanwhile
+                    restarts += 1
+                    if restarts > MAX_RESTARTS:
+                        raise
+                    step = 0
+                    continue
+
+                step = next_step
+                deleted += rowcount
+                self.deleted += rowcount
+                if table == 'users' and rowcount and email is not None:
+                    utils.invalidate_user(email)
+                if CHUNK_PAUSE:
+                    await asyncio.sleep(CHUNK_PAUSE)
+
+            self.done += 1
+        except Exception as e:
+            self.failed += 1
+            ERROR_LOG.exception(e, job_id=job_id, table=tables[step] if step < len(tables) else None)
+            values = (step, deleted, DeletionStatus.failed.value, datetime.utcnow(), job_id)
+            try:
+                await ADB.execute(q.update_deletion_job(), values)
+            except Exception as e:
+                # Still 'running', it's resumed once it goes stale
+                ERROR_LOG.exception(e, job_id=job_id)
+            else:
+                # The user is found again, drop the DELETING mark
+                if email is not None:
+                    utils.invalidate_user(email)
+
+    async def resume(self) -> int:
+        """ Claim and restart the running jobs nobody updated for STALE_AFTER seconds. """
+        stale = datetime.utcnow() - timedelta(seconds=STALE_AFTER)
+        jobs = await q.get_stale_deletion_jobs(DeletionStatus.running.value, stale)
+
+        resumed = 0
+        for job in jobs:
+            if job['job_id'] in self._tasks:
+                continue
+
+            # Only one worker gets the job, the others see updated_at changed
+            values = (datetime.utcnow(), job['job_id'], DeletionStatus.running.value, job['updated_at'])
+            if await ADB.execute(q.claim_deletion_job(), values):
+                self._spawn(job)
+                resumed += 1
+
+        self.resumed += resumed
+        return resumed
+
+    async def _watch(self) -> None:
+        while True:
+            try:
+                await self.resume()
+            except Exception as e:
+                ERROR_LOG.exception(e)
+            await asyncio.sleep(STALE_AFTER)
+
+    def start(self) -> None:
+        """ Look for stopped jobs now and every STALE_AFTER seconds, on startup. """
+        if self._watcher is None:
+            self._watcher = asyncio.create_task(self._watch())
+
+    async def stop(self) -> None:
+        """ Stop the tasks on shutdown, their jobs are resumed later. """
+        tasks = [task for task in (self._watcher, *self._tasks.values()) if task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._watcher = None
+
+    def stats(self) -> dict:
+        return {
+            'running': len(self._tasks),
+            'started': self.started,
+            'resumed': self.resumed,
+            'done': self.done,
+            'failed': self.failed,
+            'deleted': self.deleted,
+        }
+
+
+DELETIONS = DeletionRunner()
@@ -0,0 +1,183 @@
+"""
+Structured error log written off the request path.
+
+app_errors.server_error only builds a record and puts it on a bounded
+queue. A QueueListener thread writes the records as JSON lines to a file
+rotated by size and by time. Identical tracebacks seen again within
+DEDUP_WINDOW seconds are counted instead of written, the next record of
+the same traceback carries the number of repeats it stands for.
+"""
+from datetime import datetime, timezone
+import hashlib
+import json
+import logging
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler
+import os
+import queue
+import threading
+import time
+import traceback
+from typing import Optional
+
+from config import settings
+
+# Constants
+LOG_FILE = getattr(settings, 'ERROR_LOG_FILE', 'server_errors.txt')
+MAX_BYTES = getattr(settings, 'ERROR_LOG_MAX_BYTES', 10 * 1024 * 1024)
+BACKUP_COUNT = getattr(settings, 'ERROR_LOG_BACKUP_COUNT', 7)
+ROTATE_WHEN = getattr(settings, 'ERROR_LOG_ROTATE_WHEN', 'midnight')
+QUEUE_SIZE = getattr(settings, 'ERROR_LOG_QUEUE_SIZE', 10000)
+DEDUP_WINDOW = getattr(settings, 'ERROR_LOG_DEDUP_WINDOW', 60.0)
+
+
+class JSONFormatter(logging.Formatter):
+
+    def format(self, record:logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'message': record.getMessage(),
+            **getattr(record, 'fields', {}),
+        }
+        return json.dumps(entry, default=str)
+
+
+class SizeTimedRotatingFileHandler(TimedRotatingFileHandler):
+    """ Rolls over at the `when` interval or once the file reaches max_bytes. """
+
+    def __init__(self, filename:str, max_bytes:int = MAX_BYTES, **kwargs) -> None:
+        super().__init__(filename, delay=True, encoding='utf-8', **kwargs)
+        self.max_bytes = max_bytes
+
+    def shouldRollover(self, record:logging.LogRecord) -> int:
+        if super().shouldRollover(record):
+            return 1
+
+        if self.max_bytes > 0:
+            if self.stream is None:
+                self.stream = self._open()
+            if self.stream.tell() >= self.max_bytes:
+                return 1
+
+        return 0
+
+    def rotation_filename(self, default_name:str) -> str:
+        # A size rollover within the interval would replace the backup of
+        # the previous one, they are numbered instead
+        name, number = default_name, 0
+        while os.path.exists(name):
+            number += 1
+            name = f"{default_name}.{number:03d}"
+
+        return name
+
+
+class DroppingQueueHandler(QueueHandler):
+    """ Drops and counts records when the queue is full, a request never waits on the log. """
+
+    def __init__(self, log_queue:queue.Queue) -> None:
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record:logging.LogRecord) -> logging.LogRecord:
+        # The record is already formatted data, skip QueueHandler's copy and formatting
+        return record
+
+    def enqueue(self, record:logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class Deduplicator:
+    """ Suppresses a traceback fingerprint seen less than `window` seconds ago. """
+
+    def __init__(self, window:float = DEDUP_WINDOW) -> None:
+        self.window = window
+        # fingerprint -> [last written time, repeats suppressed since]
+        self._seen: dict[str, list] = {}
+        self._lock = threading.Lock()
+        self.suppressed = 0
+
+    def check(self, fingerprint:str) -> Optional[int]:
+        """ None when the record has to be dropped, else the repeats it stands for. """
+        now = time.monotonic()
+        with self._lock:
+            seen = self._seen.get(fingerprint)
+            if seen is not None and now - seen[0] < self.window:
+                seen[1] += 1
+                self.suppressed += 1
+                return None
+
+            repeats = seen[1] if seen is not None else 0
+            self._seen[fingerprint] = [now, 0]
+            if len(self._seen) > QUEUE_SIZE:
+                # Forget the fingerprints outside the window
+                self._seen = {key: value for key, value in self._seen.items() if now - value[0] < self.window}
+
+            return repeats
+
+
+class ErrorLog:
+
+    def __init__(self, filename:str = LOG_FILE, queue_size:int = QUEUE_SIZE) -> None:
+        self.filename = filename
+        self.queue = queue.Queue(queue_size)
+        self.deduplicator = Deduplicator()
+
+        self.logger = logging.getLogger('pomodoro.errors')
+        self.logger.setLevel(logging.ERROR)
+        self.logger.propagate = False
+        self.queue_handler = DroppingQueueHandler(self.queue)
+        self.logger.addHandler(self.queue_handler)
+
+        self.listener: Optional[QueueListener] = None
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        with self._lock:
+            if self.listener is None:
+                handler = SizeTimedRotatingFileHandler(
+                    self.filename, when=ROTATE_WHEN, backupCount=BACKUP_COUNT
+                )
+                handler.setFormatter(JSONFormatter())
+                self.listener = QueueListener(self.queue, handler)
+                self.listener.start()
+
+    def stop(self) -> None:
+        """ Write the queued records and close the file. """
+        with self._lock:
+            if self.listener is not None:
+                self.listener.stop()
+                for handler in self.listener.handlers:
+                    handler.close()
+                self.listener = None
+
+    def exception(self, exc:BaseException, **fields) -> None:
+        lines = traceback.format_exception(type(exc), exc, exc.__traceback__)
+        trace = "".join(lines)
+        fingerprint = hashlib.sha1(trace.encode()).hexdigest()[:16]
+
+        repeats = self.deduplicator.check(fingerprint)
+        if repeats is None:
+            return
+
+        self.start()
+        fields.update({
+            'error': type(exc).__name__,
+            'fingerprint': fingerprint,
+            'repeats': repeats,
+            'traceback': trace,
+        })
+        self.logger.error(str(exc), extra={'fields': fields})
+
+    def stats(self) -> dict:
+        return {
+            'queued': self.queue.qsize(),
+            'dropped': self.queue_handler.dropped,
+            'suppressed': self.deduplicator.suppressed,
+        }
+
+
+ERROR_LOG = ErrorLog()
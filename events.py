@@ -0,0 +1,154 @@
+"""
+In-process pub/sub of per-user events, streamed to the browser as
+Server-Sent Events by GET /events/ (see routers/events.py).
+
+The routes call `publish(user_id, event, data)` after a write; the frame
+is encoded once and appended to the buffer of every connection the user
+has open on this worker. A connection is a Subscriber with a small
+deque and, while it waits, one future, so thousands of idle ones cost a
+few hundred bytes each. A subscriber that falls QUEUE_SIZE frames behind
+is dropped, its EventSource reconnects and gets a fresh snapshot.
+
+Only used from the event loop, so it needs no lock. With several
+workers an event only reaches the connections held by the worker that
+published it.
+"""
+import asyncio
+from collections import deque
+from typing import Optional
+
+from config import settings
+from models import PomodoroSessionResponse
+
+# Constants
+QUEUE_SIZE = getattr(settings, 'EVENT_QUEUE_SIZE', 32)
+HEARTBEAT = getattr(settings, 'EVENT_HEARTBEAT', 25.0)
+# Milliseconds the browser waits before reconnecting
+RETRY = getattr(settings, 'EVENT_RETRY', 3000)
+# A comment line, keeps proxies from closing an idle connection
+PING = b": ping\n\n"
+
+
+def encode(event:str, data:str) -> bytes:
+    lines = "".join(f"data: {line}\n" for line in data.splitlines() or [""])
+    return f"event: {event}\n{lines}\n".encode()
+
+
+class Subscriber:
+    __slots__ = ('user_id', 'frames', 'waiter', 'closed')
+
+    def __init__(self, user_id:str) -> None:
+        self.user_id = user_id
+        self.frames: deque[bytes] = deque()
+        self.waiter: Optional[asyncio.Future] = None
+        self.closed = False
+
+    def push(self, frame:bytes) -> bool:
+        """ Buffer the frame, False when the subscriber is too far behind. """
+        if len(self.frames) >= QUEUE_SIZE:
+            return False
+
+        self.frames.append(frame)
+        self._wake()
+        return True
+
+    def close(self) -> None:
+        self.closed = True
+        self._wake()
+
+    def _wake(self) -> None:
+        if self.waiter is not None and not self.waiter.done():
+            self.waiter.set_result(None)
+
+    async def get(self, timeout:float = HEARTBEAT) -> Optional[bytes]:
+        """ The next frame, PING after `timeout` idle seconds or None once closed. """
+        if not self.frames and not self.closed:
+            self.waiter = asyncio.get_running_loop().create_future()
+            try:
+                await asyncio.wait_for(self.waiter, timeout)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                self.waiter = None
+
+        if self.frames:
+            return self.frames.popleft()
+
+        return None if self.closed else PING
+
+
+class Broker:
+
+    def __init__(self) -> None:
+        self._subscribers: dict[str, set[Subscriber]] = {}
+
+        # Metrics
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+
+    def subscribe(self, user_id:str) -> Subscriber:
+        subscriber = Subscriber(user_id)
+        self._subscribers.setdefault(user_id, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber:Subscriber) -> None:
+        subscribers = self._subscribers.get(subscriber.user_id)
+        if subscribers is None:
+            return
+
+        subscribers.discard(subscriber)
+        if not subscribers:
+            del self._subscribers[subscriber.user_id]
+
+    def publish(self, user_id:str, event:str, data:str) -> int:
+        """ Send the event to every connection of the user, returns how many got it. """
+        self.published += 1
+        subscribers = self._subscribers.get(user_id)
+        if not subscribers:
+            return 0
+
+        frame = encode(event, data)
+        delivered = 0
+        for subscriber in list(subscribers):
+            if subscriber.push(frame):
+                delivered += 1
+            else:
+                self.dropped += 1
+                subscriber.close()
+                self.unsubscribe(subscriber)
+
+        self.delivered += delivered
+        return delivered
+
+    def close(self) -> None:
+        """ End every stream, on shutdown. """
+        for subscribers in list(self._subscribers.values()):
+            for subscriber in list(subscribers):
+                subscriber.close()
+        self._subscribers.clear()
+
+    def stats(self) -> dict:
+        return {
+            'users': len(self._subscribers),
+            'subscribers': sum(len(subscribers) for subscribers in self._subscribers.values()),
+            'published': self.published,
+            'delivered': self.delivered,
+            'dropped': self.dropped,
+        }
+
+
+BROKER = Broker()
+
+
+def publish(user_id:str, event:str, data:str) -> int:
+    return BROKER.publish(user_id, event, data)
+
+
+def timer_data(session) -> str:
+    """ A sessions.PomodoroSession as the JSON of the "timer" event. """
+    return PomodoroSessionResponse(**session.view()).json()
+
+
+def publish_timer(session) -> int:
+    return publish(session.user_id, 'timer', timer_data(session))
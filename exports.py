@@ -0,0 +1,70 @@
+"""
+Encoders for the /export endpoints.
+
+Rows arrive in batches from a server-side cursor and every batch is
+encoded into one chunk, so a whole history never sits in memory.
+"""
+import csv
+from datetime import date, datetime
+import io
+import json
+from typing import AsyncIterator, Sequence
+import zlib
+
+# Constants
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+}
+
+
+def _json_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+
+    return str(value)
+
+
+async def encode_csv(batches:AsyncIterator[list[dict]], columns:Sequence[str]) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=list(columns))
+    # Written before the first batch, an export without rows still has it
+    writer.writeheader()
+    async for rows in batches:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+async def encode_ndjson(batches:AsyncIterator[list[dict]], columns:Sequence[str]) -> AsyncIterator[bytes]:
+    async for rows in batches:
+        lines = [json.dumps(row, default=_json_default, ensure_ascii=False) for row in rows]
+        yield ("\n".join(lines) + "\n").encode()
+
+
+ENCODERS = {
+    'csv': encode_csv,
+    'ndjson': encode_ndjson,
+}
+
+
+async def gzip_chunks(chunks:AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    # wbits=31 writes the gzip header and trailer
+    compressor = zlib.compressobj(wbits=31)
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+
+    yield compressor.flush()
+
+
+def encode(
+        batches:AsyncIterator[list[dict]], format:str, columns:Sequence[str], compress:bool = False
+    ) -> AsyncIterator[bytes]:
+    chunks = ENCODERS[format](batches, columns)
+    return gzip_chunks(chunks) if compress else chunks
@@ -0,0 +1,91 @@
+"""
+Per-user cache of rendered HTMX fragments, with ETags.
+
+An entry is keyed by user, fragment name, the parameters that change
+its content and the data versions (versions.py) of the tables it's
+built from. Every write bumps the version of its table in its own
+transaction, so the old entries are never read again and age out of the
+LRU. A request whose If-None-Match holds the ETag of the cached entry is
+answered 304 with no query and no template render.
+
+The versions live in the database and every worker keeps them for
+versions.CACHE_TTL seconds. A write bumps them in its own worker at
+once, the other workers see it once their copy expires.
+"""
+import hashlib
+from typing import Awaitable, Callable, Hashable, Union
+
+from fastapi import Request, Response, status
+from fastapi.responses import HTMLResponse
+
+from cache import TTLCache
+from config import settings
+import versions
+
+# Constants
+CACHE_SIZE = getattr(settings, 'FRAGMENT_CACHE_SIZE', 4096)
+CACHE_TTL = getattr(settings, 'FRAGMENT_CACHE_TTL', 300)
+HEADERS = {
+    # Browsers keep the fragment and revalidate it on every swap
+    'Cache-Control': "private, no-cache",
+    # The same URL serves the full page or a fragment depending on these
+    'Vary': "HX-Request, HX-Current-URL, Cookie",
+}
+
+
+def etag(body:bytes) -> str:
+    return '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+
+
+def etag_matches(request:Request, tag:str) -> bool:
+    header = request.headers.get('if-none-match')
+    if not header:
+        return False
+
+    tags = [candidate.strip().removeprefix('W/') for candidate in header.split(',')]
+    return tag in tags or '*' in tags
+
+
+class FragmentCache:
+
+    def __init__(self, maxsize:int = CACHE_SIZE, ttl:float = CACHE_TTL) -> None:
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+        # Metrics
+        self.not_modified = 0
+
+    async def generation(self, user_id:str, tables:tuple[str, ...]) -> tuple[str, ...]:
+        return tuple([(await versions.cached(user_id, table)).etag for table in tables])
+
+    async def response(
+            self, request:Request, user_id:str, name:str, params:Hashable, tables:tuple[str, ...],
+            render:Callable[[], Awaitable[Union[Response, str]]]
+        ) -> Response:
+        """
+        The cached fragment, or the one returned by `render` stored for
+        the next request. `render` may raise, nothing is cached then.
+        """
+        # The versions are read before the query, a write committed
+        # meanwhile bumps them and the fragment is stored under a dead key
+        key = (user_id, name, params, await self.generation(user_id, tables))
+        entry = self.cache.get(key)
+
+        if entry is None:
+            rendered = await render()
+            body = rendered.body if isinstance(rendered, Response) else rendered.encode()
+            entry = (body, etag(body))
+            self.cache.set(key, entry)
+
+        body, tag = entry
+        headers = {**HEADERS, 'ETag': tag}
+        if etag_matches(request, tag):
+            self.not_modified += 1
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        return HTMLResponse(body, headers=headers)
+
+    def stats(self) -> dict:
+        return {**self.cache.stats(), 'not_modified': self.not_modified}
+
+
+FRAGMENTS = FragmentCache()
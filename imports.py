@@ -0,0 +1,320 @@
+"""
+Import pipeline for the /import endpoint, the reverse of exports.py.
+
+An upload is parsed lazily into (line, row) pairs: CSV or NDJSON rows of
+pomodoros and recalls (a row with a `recall` field is a recall), or the
+markdown files of a zip, one recall per file and one recall project per
+directory. Names are resolved to IDs through a lookup loaded once per
+import, missing categories, projects and recall projects are created,
+and the rows are written in chunks of one transaction each.
+"""
+import csv
+from datetime import datetime
+import gzip
+import io
+import itertools
+import json
+from pathlib import PurePosixPath
+from typing import AsyncIterator, BinaryIO, Iterator
+import zipfile
+
+from pydantic import ValidationError
+from starlette.concurrency import run_in_threadpool
+
+from config import settings
+from data import ADB, DatabaseError
+import markdown_render
+from models import PomodoroRecord, RecallRecord
+import query as q
+import rollups
+import utils
+import versions
+
+# Constants
+CHUNK_SIZE = getattr(settings, 'IMPORT_CHUNK_SIZE', 1000)
+MAX_ERRORS = 100
+FORMATS = ('csv', 'ndjson', 'zip')
+SATISFACTION_VALUES = {'good': 1, 'bad': 2, '1': 1, '2': 2}
+
+
+class InvalidUpload(ValueError):
+    pass
+
+
+def upload_format(filename:str) -> tuple[str, bool]:
+    """ (format, gzipped) of an upload, from its file name. """
+    suffixes = [suffix.lower() for suffix in PurePosixPath(filename or "").suffixes]
+    compressed = bool(suffixes) and suffixes[-1] == '.gz'
+    if compressed:
+        suffixes.pop()
+
+    extension = suffixes[-1].lstrip('.') if suffixes else ""
+    extension = 'ndjson' if extension in ('jsonl', 'json') else extension
+    if extension not in FORMATS or (compressed and extension == 'zip'):
+        raise InvalidUpload(f"Unsupported file {filename}, upload a .csv, .ndjson or .zip file")
+
+    return extension, compressed
+
+
+def read_csv(file:BinaryIO) -> Iterator[tuple[int, dict]]:
+    text = io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+    reader = csv.DictReader(text)
+    for row in reader:
+        yield reader.line_num, row
+
+
+def read_ndjson(file:BinaryIO) -> Iterator[tuple[int, dict]]:
+    text = io.TextIOWrapper(file, encoding='utf-8-sig')
+    for line_number, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            row = {'__error__': f"invalid JSON: {e}"}
+
+        yield line_number, row if isinstance(row, dict) else {'__error__': "not a JSON object"}
+
+
+def read_markdown_zip(file:BinaryIO, default_project:str) -> Iterator[tuple[int, dict]]:
+    try:
+        archive = zipfile.ZipFile(file)
+    except zipfile.BadZipFile:
+        raise InvalidUpload("The file is not a valid zip archive")
+
+    markdown = (
+        info for info in archive.infolist()
+        if not info.is_dir() and info.filename.lower().endswith('.md')
+        and not info.filename.startswith('__MACOSX/')
+    )
+    for number, info in enumerate(markdown, start=1):
+        path = PurePosixPath(info.filename)
+        recall = archive.read(info).decode('utf-8', errors='replace')
+        # The first heading is the title, the file name otherwise
+        title = next(
+            (line[2:].strip() for line in recall.splitlines() if line.startswith('# ')), path.stem
+        )
+        yield number, {
+            'project_name': path.parent.name or default_project,
+            'recall_title': title,
+            'recall': recall,
+        }
+
+
+def read_upload(file:BinaryIO, filename:str) -> Iterator[tuple[int, dict]]:
+    format, compressed = upload_format(filename)
+    if format == 'zip':
+        return read_markdown_zip(file, PurePosixPath(filename).stem)
+
+    if compressed:
+        file = gzip.GzipFile(fileobj=file, mode='rb')
+
+    return read_csv(file) if format == 'csv' else read_ndjson(file)
+
+
+def chunks(rows:Iterator, size:int = CHUNK_SIZE) -> Iterator[list]:
+    while True:
+        chunk = list(itertools.islice(rows, size))
+        if not chunk:
+            return
+
+        yield chunk
+
+
+def parse_satisfaction(value) -> int:
+    if value in (None, "", "missing", 0, "0"):
+        return None
+
+    satisfaction = SATISFACTION_VALUES.get(str(value).strip().lower())
+    if satisfaction is None:
+        raise ValueError(f"pomodoro_satisfaction has to be 'good' or 'bad', not {value!r}")
+
+    return satisfaction
+
+
+def validation_errors(error:ValidationError) -> list[str]:
+    return [f"{'.'.join(map(str, detail['loc']))}: {detail['msg']}" for detail in error.errors()]
+
+
+class Importer:
+    """
+    Writes parsed rows of a user. The name -> ID lookups are loaded once
+    and extended with the rows created by the import itself.
+    """
+
+    def __init__(self, user_id:str) -> None:
+        self.user_id = user_id
+        self.categories: dict[str, int] = {}
+        self.projects: dict[tuple[int, str], int] = {}
+        self.recall_projects: dict[str, int] = {}
+
+        # Progress
+        self.processed = 0
+        self.pomodoros = 0
+        self.recalls = 0
+        self.rejected = 0
+        self.errors: list[dict] = []
+        self._reported = 0
+
+    async def load(self) -> None:
+        values = (self.user_id,)
+        for category in await q.get_categories(values):
+            self.categories[category['category_name']] = category['category_id']
+
+        for project in await q.get_projects(values):
+            self.projects[(project['category_id'], project['project_name'])] = project['project_id']
+
+        for project in await q.get_recall_projects(values):
+            self.recall_projects[project['project_name']] = project['recall_project_id']
+
+    def progress(self, done:bool = False, error:str = None) -> dict:
+        """ Counters so far and the row errors found since the last call. """
+        errors = self.errors[self._reported:]
+        self._reported = len(self.errors)
+        progress = {
+            'processed': self.processed,
+            'pomodoros': self.pomodoros,
+            'recalls': self.recalls,
+            'rejected': self.rejected,
+            'errors': errors,
+            'done': done,
+        }
+        if error:
+            progress['error'] = error
+
+        return progress
+
+    def reject(self, line:int, errors:list[str]) -> None:
+        self.rejected += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append({'line': line, 'errors': errors})
+
+    async def _get_id(self, cursor, lookup:dict, key, query:str, values:tuple) -> int:
+        if key not in lookup:
+            await cursor.execute(query, values)
+            lookup[key] = cursor.lastrowid
+
+        return lookup[key]
+
+    def _parse(self, chunk:list[tuple[int, dict]]) -> tuple[list, list]:
+        """ Validate the rows of a chunk, (records, rejected lines). """
+        records, rejected = [], []
+        for line, row in chunk:
+            try:
+                if '__error__' in row:
+                    raise ValueError(row['__error__'])
+                elif 'recall' in row:
+                    records.append(RecallRecord(**row))
+                else:
+                    pomodoro = PomodoroRecord(**row)
+                    pomodoro_date = utils.to_local_naive(pomodoro.pomodoro_date)
+                    if pomodoro_date > datetime.today():
+                        raise ValueError("pomodoro_date is in the future")
+                    records.append((pomodoro, pomodoro_date, parse_satisfaction(row.get('pomodoro_satisfaction'))))
+            except ValidationError as e:
+                rejected.append((line, validation_errors(e)))
+            except ValueError as e:
+                rejected.append((line, [str(e)]))
+
+        return records, rejected
+
+    async def _pomodoro(self, cursor, pomodoro:PomodoroRecord, pomodoro_date:datetime, satisfaction:int) -> tuple:
+        category_id = await self._get_id(
+            cursor, self.categories, pomodoro.category_name,
+            q.create_category(), (pomodoro.category_name, self.user_id)
+        )
+        project_id = await self._get_id(
+            cursor, self.projects, (category_id, pomodoro.project_name),
+            q.create_project(), (self.user_id, category_id, pomodoro.project_name, pomodoro_date.date())
+        )
+
+        return (category_id, project_id, pomodoro.duration, pomodoro_date, satisfaction)
+
+    async def _recall(self, cursor, recall:RecallRecord, recall_html:str) -> tuple:
+        recall_project_id = await self._get_id(
+            cursor, self.recall_projects, recall.project_name,
+            q.create_recall_project(), (self.user_id, recall.project_name)
+        )
+
+        return (
+            self.user_id, recall_project_id, recall.recall_title,
+            recall.recall, recall_html, markdown_render.MARKDOWN_VERSION
+        )
+
+    async def write(self, chunk:list[tuple[int, dict]]) -> None:
+        """ Write a chunk of rows in one transaction. """
+        records, rejected = self._parse(chunk)
+        # Markdown and highlighting are slow, render before the transaction
+        # takes a connection (and the write lock on SQLite)
+        texts = [record.recall for record in records if isinstance(record, RecallRecord)]
+        rendered = iter(await run_in_threadpool(lambda: list(map(markdown_render.markdown_to_html, texts))))
+
+        # Lookup entries created by this chunk are dropped on rollback
+        lookups = (dict(self.categories), dict(self.projects), dict(self.recall_projects))
+        pomodoros, recalls = [], []
+        try:
+            async with ADB.transaction() as cursor:
+                for record in records:
+                    if isinstance(record, RecallRecord):
+                        recalls.append(await self._recall(cursor, record, next(rendered)))
+                    else:
+                        pomodoros.append(await self._pomodoro(cursor, *record))
+
+                if pomodoros:
+                    await cursor.executemany(
+                        q.create_rated_pomodoro(), [(*pomodoro, self.user_id) for pomodoro in pomodoros]
+                    )
+                    await rollups.add_pomodoros(cursor, self.user_id, pomodoros)
+
+                if recalls:
+                    await cursor.executemany(q.create_recall(), recalls)
+
+                created = [
+                    table for table, before, after in zip(
+                        ('categories', 'projects', 'recall_projects'), lookups,
+                        (self.categories, self.projects, self.recall_projects)
+                    )
+                    if len(after) > len(before)
+                ]
+                changed = [table for table in (*created, 'pomodoros' if pomodoros else None) if table in versions.TABLES]
+                if changed:
+                    await versions.bump(cursor, self.user_id, *changed)
+        except BaseException:
+            self.categories, self.projects, self.recall_projects = lookups
+            raise
+
+        self.processed += len(chunk)
+        self.pomodoros += len(pomodoros)
+        self.recalls += len(recalls)
+        for line, errors in rejected:
+            self.reject(line, errors)
+
+    async def run(self, rows:Iterator[tuple[int, dict]], chunk_size:int = CHUNK_SIZE) -> AsyncIterator[dict]:
+        """
+        Import the rows, yielding the progress after every chunk. The
+        chunks written before an error stay, the last progress tells
+        where the import stopped.
+        """
+        await self.load()
+        batches = chunks(rows, chunk_size)
+        while True:
+            try:
+                # Reading and decompressing the upload blocks, keep it off the event loop
+                chunk = await run_in_threadpool(next, batches, None)
+            except (InvalidUpload, csv.Error, UnicodeDecodeError, OSError, EOFError) as e:
+                yield self.progress(done=True, error=f"Can't read the upload: {e}")
+                return
+
+            if chunk is None:
+                break
+
+            try:
+                await self.write(chunk)
+            except DatabaseError as e:
+                yield self.progress(done=True, error=f"Import stopped after {self.processed} rows: {e}")
+                return
+
+            yield self.progress()
+
+        yield self.progress(done=True)
@@ -0,0 +1,45 @@
+"""
+Render and store recall_html for recalls written before it existed, or
+rendered with another markdown extension set. Usage:
+
+    python -m internal.backfill_recall_html [batch_size]
+
+Rows are walked by recall_id, so the command can be stopped and run
+again at any time.
+"""
+import sys
+
+from data import DB
+import query as q
+from markdown_render import markdown_to_html, MARKDOWN_VERSION
+
+# Constants
+BATCH_SIZE = 500
+
+
+def backfill(batch_size:int = BATCH_SIZE) -> int:
+    last_id = 0
+    total = 0
+    while True:
+        recalls = DB.fetch_all(
+            q.get_stale_recalls_query(), (last_id, MARKDOWN_VERSION, batch_size), row_type='tuple'
+        )
+        if not recalls:
+            break
+
+        values = [
+            (markdown_to_html(recall or ""), MARKDOWN_VERSION, recall_id)
+            for recall_id, recall in recalls
+        ]
+        DB.execute_many(q.update_recall_html(), values)
+
+        last_id = recalls[-1][0]
+        total += len(recalls)
+        print(f"Rendered {total} recalls (last recall_id {last_id})")
+
+    return total
+
+
+if __name__ == "__main__":
+    batch_size = int(sys.argv[1]) if len(sys.argv) > 1 else BATCH_SIZE
+    backfill(batch_size)
@@ -0,0 +1,348 @@
+"""
+Seed the database with synthetic users and measure the app under a
+request mix: pomodoro creation, satisfaction PUT, project names and
+recall listing. Usage:
+
+    python -m internal.benchmark seed [--users 20] [--pomodoros 2000] ...
+    python -m internal.benchmark run [--requests 5000] [--concurrency 20]
+        [--url http://127.0.0.1:8000] [--record plan.ndjson | --replay plan.ndjson]
+        [--save report.json] [--baseline report.json]
+
+`run` drives the app in-process through httpx, or a running uvicorn
+when --url is given. It reports p50/p95/p99 latency and throughput per
+route. --save writes the report. A run is compared against --baseline,
+the committed internal/benchmark_baseline.json by default (a seeded
+`--seed 1` run on the SQLite backend, save a new one after a change
+that moves the numbers on purpose), and exits with status 1 when a
+route got slower than --max-regression; --baseline "" skips it.
+--record stores the generated requests and --replay sends a stored
+sequence again.
+"""
+import argparse
+import asyncio
+from datetime import date, datetime, timedelta
+import json
+import math
+import os
+import random
+import sys
+import time
+from typing import Optional
+from uuid import uuid4
+
+from data import ADB, BACKEND
+import markdown_render
+from passwords import _hash
+from queries import PLACEHOLDER
+import query as q
+import rollups
+import utils
+
+# Constants
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+EMAIL = "bench-{}@example.com"
+EMAIL_PATTERN = "bench-%@example.com"
+PASSWORD = "benchmark-password"
+BASE_URL = "http://benchmark"
+MIX = {
+    'create_pomodoro': 30,
+    'rate_pomodoro': 20,
+    'project_names': 30,
+    'recall_listing': 20,
+}
+PERCENTILES = (50, 95, 99)
+# Latest pomodoros of every user the rating requests pick from
+RATED_POMODOROS = 100
+WORDS = (
+    "pomodoro focus break timer recall project review notes python database index query "
+    "cursor latency cache session markdown category habit learning practice summary"
+).split()
+
+
+# Seeding
+async def seed_user(
+        number:int, password:str, categories:int, projects:int,
+        pomodoros:int, recall_projects:int, recalls:int, days:int
+    ) -> None:
+    user_id = str(uuid4())
+    await ADB.execute(
+        q.signup_user(), (user_id, EMAIL.format(number), password, "Bench", str(number), None)
+    )
+
+    async with ADB.transaction() as cursor:
+        project_ids = []
+        for category in range(categories):
+            await cursor.execute(q.create_category(), (f"Category {category}", user_id))
+            category_id = cursor.lastrowid
+            for project in range(projects):
+                start = date.today() - timedelta(days=days)
+                await cursor.execute(q.create_project(), (user_id, category_id, f"Project {category}.{project}", start))
+                project_ids.append((category_id, cursor.lastrowid))
+
+        rows = []
+        now = datetime.today()
+        for _ in range(pomodoros):
+            category_id, project_id = random.choice(project_ids)
+            pomodoro_date = now - timedelta(seconds=random.randint(0, days * 86400))
+            rows.append((category_id, project_id, 25, pomodoro_date, random.choice((None, 1, 2))))
+        await cursor.executemany(q.create_rated_pomodoro(), [(*row, user_id) for row in rows])
+        await rollups.add_pomodoros(cursor, user_id, rows)
+
+        for recall_project in range(recall_projects):
+            await cursor.execute(q.create_recall_project(), (user_id, f"Recall project {recall_project}"))
+            recall_project_id = cursor.lastrowid
+            values = []
+            for recall in range(recalls):
+                text = f"# Recall {recall}\n\n" + " ".join(random.choices(WORDS, k=120))
+                values.append((
+                    user_id, recall_project_id, f"Recall {recall}", text,
+                    markdown_render.markdown_to_html(text), markdown_render.MARKDOWN_VERSION
+                ))
+            await cursor.executemany(q.create_recall(), values)
+
+
+async def seed(args) -> None:
+    existing = await ADB.fetch_one(
+        f"SELECT COUNT(*) AS `users` FROM `users` WHERE `email` LIKE {PLACEHOLDER}", (EMAIL_PATTERN,)
+    )
+    # bcrypt once, every benchmark user has the same password
+    password = _hash(PASSWORD)
+    for number in range(existing['users'], args.users):
+        await seed_user(
+            number, password, args.categories, args.projects, args.pomodoros,
+            args.recall_projects, args.recalls, args.days
+        )
+        print(f"Seeded user {number + 1}/{args.users}")
+
+
+# Request plans
+async def load_users() -> list[dict]:
+    users = await ADB.fetch_all(
+        f"SELECT `user_id`, `email` FROM `users` WHERE `email` LIKE {PLACEHOLDER} ORDER BY `email`", (EMAIL_PATTERN,)
+    )
+    if not users:
+        raise SystemExit("No benchmark users, run `python -m internal.benchmark seed` first")
+
+    for user in users:
+        values = (user['user_id'],)
+        user['category_ids'] = [category['category_id'] for category in await q.get_categories(values)]
+        user['projects'] = [(project['category_id'], project['project_id']) for project in await q.get_projects(values)]
+        user['recall_project_ids'] = [project['recall_project_id'] for project in await q.get_recall_projects(values)]
+        pomodoros = await q.get_pomodoros((user['user_id'], datetime.min), all=True, limit=RATED_POMODOROS)
+        user['pomodoro_ids'] = [pomodoro['pomodoro_id'] for pomodoro in pomodoros]
+
+    return users
+
+
+def plan_request(kind:str, user:dict) -> dict:
+    request = {'kind': kind, 'email': user['email'], 'data': None, 'headers': {}}
+    if kind == 'create_pomodoro':
+        category_id, project_id = random.choice(user['projects'])
+        request.update(method="POST", path="/pomodoros/", data={
+            'category_id': category_id, 'project_id': project_id, 'duration': 25
+        })
+    elif kind == 'rate_pomodoro':
+        request.update(
+            method="PUT", path=f"/pomodoros/{random.choice(user['pomodoro_ids'])}/satisfaction",
+            route="/pomodoros/{pomodoro_id}/satisfaction", data={'satisfaction': random.choice(("good", "bad"))},
+        )
+    elif kind == 'project_names':
+        request.update(
+            method="GET", path=f"/projects/names?category_id={random.choice(user['category_ids'])}",
+            headers={'hx-request': "true", 'hx-current-url': f"{BASE_URL}/pomodoro"},
+        )
+    elif kind == 'recall_listing':
+        request.update(
+            method="GET", path=f"/recalls/text/?recall_project_id={random.choice(user['recall_project_ids'])}",
+            headers={'hx-request': "true"},
+        )
+
+    return request
+
+
+def generate_plan(users:list[dict], requests:int) -> list[dict]:
+    kinds = random.choices(list(MIX), weights=list(MIX.values()), k=requests)
+    return [plan_request(kind, random.choice(users)) for kind in kinds]
+
+
+def route_label(request:dict) -> str:
+    return f"{request['method']} {request.get('route') or request['path'].split('?')[0]}"
+
+
+# Running
+def percentile(ordered:list[float], percent:float) -> float:
+    """ Nearest rank percentile of an already sorted list. """
+    if not ordered:
+        return 0.0
+
+    rank = max(1, math.ceil(percent / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+async def drive(client, plan:list[dict], tokens:dict[str, str], concurrency:int) -> tuple[dict, float]:
+    results: dict[str, list] = {}
+    position = iter(plan)
+
+    async def worker():
+        for request in position:
+            cookies = {'access_token': f"Bearer {tokens[request['email']]}"}
+            start = time.perf_counter()
+            try:
+                response = await client.request(
+                    request['method'], request['path'], data=request['data'],
+                    headers=request['headers'], cookies=cookies
+                )
+                # The app answers errors and auth failures with redirects
+                failed = response.status_code >= 300
+            except Exception:
+                failed = True
+            elapsed = time.perf_counter() - start
+
+            latencies, errors = results.setdefault(route_label(request), ([], [0]))
+            latencies.append(elapsed)
+            errors[0] += failed
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return results, time.perf_counter() - start
+
+
+def build_report(results:dict, wall_time:float, args) -> dict:
+    routes = {}
+    for route, (latencies, errors) in sorted(results.items()):
+        ordered = sorted(latencies)
+        routes[route] = {
+            'requests': len(ordered),
+            'errors': errors[0],
+            'throughput': len(ordered) / wall_time,
+            'mean_ms': sum(ordered) / len(ordered) * 1000,
+            **{f"p{p}_ms": percentile(ordered, p) * 1000 for p in PERCENTILES},
+        }
+
+    total = sum(route['requests'] for route in routes.values())
+    return {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'target': args.url or "in-process",
+        'backend': BACKEND,
+        'seed': args.seed,
+        'concurrency': args.concurrency,
+        'requests': total,
+        'wall_time_s': wall_time,
+        'throughput': total / wall_time if wall_time else 0.0,
+        'routes': routes,
+    }
+
+
+def print_report(report:dict, baseline:Optional[dict] = None) -> list[str]:
+    """ Print the report, returns the routes slower than the baseline. """
+    print(f"\n{report['requests']} requests in {report['wall_time_s']:.2f}s, "
+          f"{report['throughput']:.1f} req/s against {report['target']}\n")
+    header = f"{'route':<44}{'reqs':>7}{'err':>6}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+    print(header)
+    print("-" * len(header))
+
+    regressions = []
+    for route, stats in report['routes'].items():
+        print(f"{route:<44}{stats['requests']:>7}{stats['errors']:>6}{stats['throughput']:>9.1f}"
+              f"{stats['p50_ms']:>9.2f}{stats['p95_ms']:>9.2f}{stats['p99_ms']:>9.2f}")
+
+        before = (baseline or {}).get('routes', {}).get(route)
+        if before:
+            changes = {key: stats[key] / before[key] - 1 for key in ('p50_ms', 'p95_ms', 'p99_ms') if before[key]}
+            print(" " * 44 + "  vs baseline " + "  ".join(f"{key[:3]} {change:+.0%}" for key, change in changes.items()))
+            regressions.extend(
+                f"{route} {key}" for key, change in changes.items() if change > baseline.get('max_regression', 0)
+            )
+
+    return regressions
+
+
+async def run(args) -> int:
+    import httpx
+
+    if args.replay:
+        with open(args.replay) as f:
+            plan = [json.loads(line) for line in f if line.strip()]
+    else:
+        plan = generate_plan(await load_users(), args.requests)
+
+    if args.record:
+        with open(args.record, 'w') as f:
+            f.writelines(json.dumps(request) + "\n" for request in plan)
+
+    tokens = {email: utils.create_access_token({'sub': email}) for email in {r['email'] for r in plan}}
+
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=60)
+    else:
+        import main as app_main
+        await app_main.startup()
+        client = httpx.AsyncClient(app=app_main.app, base_url=BASE_URL, timeout=60)
+
+    try:
+        async with client:
+            results, wall_time = await drive(client, plan, tokens, args.concurrency)
+    finally:
+        if not args.url:
+            await app_main.shutdown()
+
+    report = build_report(results, wall_time, args)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = {**json.load(f), 'max_regression': args.max_regression}
+
+    regressions = print_report(report, baseline)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if regressions:
+        print(f"\nSlower than the baseline by more than {args.max_regression:.0%}: {', '.join(regressions)}")
+        return 1
+
+    return 0
+
+
+def parse_args(argv:list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m internal.benchmark")
+    parser.add_argument('--seed', type=int, default=None, help="random seed, for repeatable plans")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    seeding = commands.add_parser('seed', help="create the benchmark users and their data")
+    seeding.add_argument('--users', type=int, default=20)
+    seeding.add_argument('--categories', type=int, default=5, help="per user")
+    seeding.add_argument('--projects', type=int, default=4, help="per category")
+    seeding.add_argument('--pomodoros', type=int, default=2000, help="per user")
+    seeding.add_argument('--recall-projects', type=int, default=5, help="per user")
+    seeding.add_argument('--recalls', type=int, default=40, help="per recall project")
+    seeding.add_argument('--days', type=int, default=365, help="pomodoros are spread over these days")
+
+    running = commands.add_parser('run', help="send the request mix and report latencies")
+    running.add_argument('--requests', type=int, default=5000)
+    running.add_argument('--concurrency', type=int, default=20)
+    running.add_argument('--url', default=None, help="running server, in-process when missing")
+    running.add_argument('--record', default=None, help="write the generated requests to this file")
+    running.add_argument('--replay', default=None, help="send the requests stored in this file")
+    running.add_argument('--save', default=None, help="write the report as JSON")
+    running.add_argument('--baseline', default=BASELINE, help="report to compare with, \"\" for none")
+    running.add_argument('--max-regression', type=float, default=0.2, help="allowed latency increase, 0.2 is 20%%")
+
+    return parser.parse_args(argv)
+
+
+async def main(argv:list[str]) -> int:
+    args = parse_args(argv)
+    random.seed(args.seed)
+    try:
+        if args.command == 'seed':
+            await seed(args)
+            return 0
+
+        return await run(args)
+    finally:
+        await ADB.close_pool()
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(sys.argv[1:])))
@@ -0,0 +1,95 @@
+"""
+Run EXPLAIN on every statement compiled from query.py and report full
+table scans and filesorts.
+
+Plans are only meaningful on a seeded database, on near-empty tables
+MySQL prefers a full scan over any index. Usage:
+
+    python -m internal.query_plans
+
+Exits with status 1 when a statement has a full scan or a filesort.
+"""
+import re
+import sys
+
+from data import DB
+import query  # noqa: F401 (registers the query.py statements)
+import statements
+import utils  # noqa: F401 (registers utils.select_user_query)
+
+# Constants
+PLACEHOLDER = re.compile(r"`(\w+)`\s*(?:=|>=|<=|>|<)\s*%s$")
+EXPLAINABLE = ('SELECT', 'UPDATE', 'DELETE')
+FULL_SCAN_TYPES = ('ALL', 'index')
+WARNINGS = ('Using filesort', 'Using temporary')
+
+
+def get_sample() -> dict:
+    """ Values of the busiest user, used to fill every placeholder. """
+    sample = DB.fetch_one(
+        "SELECT `user_id`, COUNT(*) AS `pomodoros` FROM `pomodoros` "
+        "GROUP BY `user_id` ORDER BY `pomodoros` DESC LIMIT 1"
+    )
+    if sample is None:
+        raise SystemExit("The database has no pomodoros, seed it before checking query plans")
+
+    user_id = sample['user_id']
+    sample.update(DB.fetch_one("SELECT * FROM `users` WHERE `user_id`=%s", (user_id,)))
+    sample.update(DB.fetch_one(
+        "SELECT * FROM `pomodoros` WHERE `user_id`=%s ORDER BY `pomodoro_date` DESC LIMIT 1", (user_id,)
+    ))
+    sample.update(DB.fetch_one("SELECT * FROM `recalls` WHERE `user_id`=%s LIMIT 1", (user_id,)) or {})
+
+    return sample
+
+
+def get_values(sql:str, sample:dict) -> tuple:
+    values = []
+    for placeholder in re.finditer("%s", sql):
+        # Column compared with this placeholder, if any. Insert values,
+        # limits or full-text terms don't change the plan, any value works
+        column = PLACEHOLDER.search(sql[:placeholder.end()])
+        values.append(sample.get(column.group(1), 1) if column else 1)
+
+    return tuple(values)
+
+
+def check_plan(plan:list[dict]) -> list[str]:
+    problems = []
+    for step in plan:
+        table = step.get('table')
+        if step.get('type') in FULL_SCAN_TYPES:
+            problems.append(f"full scan on {table} (type={step['type']}, rows={step.get('rows')})")
+
+        extra = step.get('Extra') or ""
+        for warning in WARNINGS:
+            if warning in extra:
+                problems.append(f"{warning.lower()} on {table}")
+
+    return problems
+
+
+def main() -> int:
+    statements.compile_all()
+    sample = get_sample()
+
+    failures = 0
+    for name, shape, sql in statements.compiled_statements():
+        if not sql.startswith(EXPLAINABLE):
+            continue
+
+        plan = DB.fetch_all(f"EXPLAIN {sql}", get_values(sql, sample))
+        problems = check_plan(plan)
+        status = "FAIL" if problems else "ok"
+        print(f"[{status}] {name}{shape}")
+        for problem in problems:
+            print(f"    {problem}")
+
+        failures += bool(problems)
+
+    print(f"\n{failures} statement(s) with full scans or filesorts")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,53 @@
+"""
+Rebuild pomodoro_rollups from the pomodoros table, for the rows written
+before the table existed or after the rollups drifted. Usage:
+
+    python -m internal.rebuild_rollups [user_id]
+
+Without a user_id every user is rebuilt. Each user is deleted and filled
+again in one transaction, so the stats endpoint never sees half a user.
+"""
+import sys
+from typing import Optional
+
+from data import DB
+import query as q
+import rollups
+
+
+def rebuild_user(user_id:str) -> None:
+    # The periods are computed in Python by rollups.rollup_totals, the
+    # same as the incremental writes, so every backend rebuilds alike
+    with DB.pool.connection() as connection:
+        cursor = connection.cursor()
+        try:
+            DB.begin(connection)
+            cursor.execute(q.get_rollup_pomodoros(), (user_id,))
+            values = rollups.rollup_totals(user_id, cursor.fetchall())
+            cursor.execute(q.delete_pomodoro_rollups(), (user_id,))
+            if values:
+                cursor.executemany(q.add_pomodoro_rollup(), values)
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            cursor.close()
+
+
+def rebuild(user_id:Optional[str] = None) -> int:
+    if user_id is None:
+        users = DB.fetch_all("SELECT `user_id` FROM `users` ORDER BY `user_id`", row_type='tuple')
+        user_ids = [user[0] for user in users]
+    else:
+        user_ids = [user_id]
+
+    for count, user in enumerate(user_ids, start=1):
+        rebuild_user(user)
+        print(f"Rebuilt rollups of {count}/{len(user_ids)} users")
+
+    return len(user_ids)
+
+
+if __name__ == "__main__":
+    rebuild(sys.argv[1] if len(sys.argv) > 1 else None)
@@ -1,16 +1,27 @@
 import warnings 
 warnings.filterwarnings(action= 'ignore')
 
-from fastapi import FastAPI, Request, Depends
-from fastapi.responses import HTMLResponse
+from fastapi import FastAPI, Request, Depends, Header, HTTPException, status
+from fastapi.responses import HTMLResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 
 from app_errors import not_authorized, not_found, server_error
 from config import settings
+from data import ADB, DB
+from deletions import DELETIONS
+from error_log import ERROR_LOG
+from events import BROKER
+from fragments import FRAGMENTS
+import metrics
 from models import ResponseUser
-from routers import pomodoros, projects, recall_projects, recalls, users, categories
-from utils import get_current_user
+from passwords import PASSWORD_POOL
+from sessions import SESSIONS
+from routers import (
+    pomodoros, projects, recall_projects, recalls, users, categories, export, imports, events, deletions
+)
+from utils import get_current_user, USER_CACHE
+import versions
 
 templates = Jinja2Templates(directory="templates")
 
@@ -28,33 +39,78 @@ app = FastAPI(
     docs_url=None,
     redoc_url=None,
 )
+app.add_middleware(metrics.TimingMiddleware)
 app.include_router(users.router)
 app.include_router(categories.router)
 app.include_router(projects.router)
 app.include_router(pomodoros.router)
 app.include_router(recall_projects.router)
 app.include_router(recalls.router)
+app.include_router(export.router)
+app.include_router(imports.router)
+app.include_router(events.router)
+app.include_router(deletions.router)
 
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
+metrics.collector("db_pool", "database pool used by the routes", ADB.stats)
+metrics.collector("db_writes", "write-behind queue", ADB.writes.stats)
+for index, replica in enumerate(ADB.replicas):
+    metrics.collector(f"db_replica{index}_pool", f"database pool of replica {index}", replica.stats)
+metrics.collector("db_sync_pool", "database pool used by the CLI tools", DB.pool.stats)
+metrics.collector("user_cache", "get_current_user cache", USER_CACHE.stats)
+metrics.collector("fragment_cache", "HTMX fragment cache", FRAGMENTS.stats)
+metrics.collector("version_cache", "data versions kept by the worker", versions.CACHE.stats)
+metrics.collector("pomodoro_sessions", "in-memory pomodoro sessions", SESSIONS.stats)
+metrics.collector("events", "server-sent event streams", BROKER.stats)
+metrics.collector("deletions", "background deletions", DELETIONS.stats)
+metrics.collector("password_pool", "bcrypt process pool", PASSWORD_POOL.stats)
+metrics.collector("error_log", "error log queue", ERROR_LOG.stats)
+
+@app.on_event("startup")
+async def startup():
+    ERROR_LOG.start()
+    await ADB.create_pool()
+    # Resumes the deletions a stopped worker left behind
+    DELETIONS.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    # End the open event streams
+    BROKER.close()
+    await DELETIONS.stop()
+    await ADB.close_pool()
+    PASSWORD_POOL.shutdown()
+    ERROR_LOG.stop()
+
 @app.get("/", response_class=HTMLResponse)
-def home(request: Request, msg:str = None, current_user:ResponseUser = Depends(get_current_user)):
+async def home(request: Request, msg:str = None, current_user:ResponseUser = Depends(get_current_user)):
     return templates.TemplateResponse(
         "general_pages/homepage.html", {"request": request, "msg":msg}
     )
 
 @app.get('/pomodoro', response_class=HTMLResponse)
-def pomodoro(request: Request, current_user:ResponseUser = Depends(get_current_user)):
+async def pomodoro(request: Request, current_user:ResponseUser = Depends(get_current_user)):
     return templates.TemplateResponse(
         "general_pages/pomodoro.html", {'request': request}
     )
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics_page(authorization:str = Header(None)):
+    # Set METRICS_TOKEN to require "Authorization: Bearer <token>" from the scraper
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if token and authorization != f"Bearer {token}":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid metrics token")
+
+    # Given as media_type starlette appends a second charset to it
+    return Response(metrics.render(), headers={"Content-Type": metrics.CONTENT_TYPE})
+
 @app.get("/not_found", response_class=HTMLResponse)
-def not_found_page(request: Request):
+async def not_found_page(request: Request):
     return templates.TemplateResponse("general_pages/not_found.html", {"request": request})
 
 @app.get("/server_error", response_class=HTMLResponse)
-def server_error_page(request: Request):
+async def server_error_page(request: Request):
     return templates.TemplateResponse("general_pages/server_error.html", {"request": request})
 
 
@@ -0,0 +1,32 @@
+"""
+Markdown rendering of recalls, imported by query.py and the routers
+without pulling in utils.
+"""
+import hashlib
+
+import markdown as mk
+from markdown.extensions import Extension
+
+
+class EscapeHtml(Extension):
+    def extendMarkdown(self, md):
+        md.preprocessors.deregister('html_block')
+        md.inlinePatterns.deregister('html')
+
+
+MARKDOWN_EXTENSIONS = ['fenced_code', 'codehilite', 'nl2br']
+# Stored recall html is only reused when it was rendered with the same
+# extension set, changing MARKDOWN_EXTENSIONS changes the version
+MARKDOWN_VERSION = hashlib.sha1(
+    ",".join([EscapeHtml.__name__, *MARKDOWN_EXTENSIONS]).encode()
+).hexdigest()[:16]
+
+def markdown_to_html(text:str)-> str:
+    return mk.markdown(text, extensions=[EscapeHtml(), *MARKDOWN_EXTENSIONS])
+
+def recall_to_html(recall:dict)-> str:
+    if recall['recall_html'] is not None and recall['recall_html_version'] == MARKDOWN_VERSION:
+        return recall['recall_html']
+
+    # Rows not backfilled yet or rendered with another extension set
+    return markdown_to_html(recall['recall'])
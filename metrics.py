@@ -0,0 +1,229 @@
+"""
+In-process metrics in the Prometheus text exposition format.
+
+Counters, gauges and histograms are kept in memory per process and
+rendered by GET /metrics (see main.py). Values that already live
+somewhere else, like the pool or cache stats, are read at scrape time
+through collectors registered with `collector`.
+"""
+from bisect import bisect_left
+import threading
+import time
+from typing import Callable, Iterable
+from uuid import uuid4
+
+from starlette.routing import Match
+
+# Constants
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+UNMATCHED_ROUTE = "unmatched"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names:tuple, values:tuple, extra:str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _number(value:float) -> str:
+    if value == float('inf'):
+        return "+Inf"
+
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    type = "untyped"
+
+    def __init__(self, name:str, help:str, labels:tuple = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values: dict[tuple, object] = {}
+        self._lock = threading.Lock()
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, *labels, amount:float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+
+        return [f"{self.name}{_labels(self.labels, key)} {_number(value)}" for key, value in values]
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def dec(self, *labels, amount:float = 1) -> None:
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels, value:float) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name:str, help:str, labels:tuple = (), buckets:tuple = LATENCY_BUCKETS) -> None:
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, *labels, value:float) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                # Per bucket counts (not cumulative), the +Inf bucket last, then sum
+                series = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = sorted((key, list(series)) for key, series in self._values.items())
+
+        lines = []
+        for key, series in values:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float('inf')), series):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labels, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, key)} {_number(series[-1])}")
+            lines.append(f"{self.name}_count{_labels(self.labels, key)} {cumulative}")
+
+        return lines
+
+
+# Registry
+METRICS: list[Metric] = []
+COLLECTORS: list[tuple[str, str, Callable[[], dict]]] = []
+
+def register(metric:Metric) -> Metric:
+    METRICS.append(metric)
+    return metric
+
+def collector(prefix:str, help:str, stats:Callable[[], dict]) -> None:
+    """
+    Export the numeric values of a `stats()` dict at scrape time, each
+    key becomes the gauge `<prefix>_<key>`.
+    """
+    COLLECTORS.append((prefix, help, stats))
+
+
+def render() -> str:
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.header())
+        lines.extend(metric.render())
+
+    for prefix, help, stats in COLLECTORS:
+        for key, value in stats().items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+
+            name = f"{prefix}_{key}"
+            lines.extend([f"# HELP {name} {help} ({key})", f"# TYPE {name} gauge", f"{name} {_number(value)}"])
+
+    return "\n".join(lines) + "\n"
+
+
+# HTTP metrics
+HTTP_REQUESTS = register(Counter(
+    "http_requests_total", "HTTP responses by route, method and status code", ("route", "method", "status")
+))
+HTTP_LATENCY = register(Histogram(
+    "http_request_duration_seconds", "Time until the whole response was sent", ("route", "method")
+))
+HTTP_IN_FLIGHT = register(Gauge(
+    "http_requests_in_flight", "Requests being handled", ("route", "method")
+))
+
+# Database metrics, tagged with the query.py builder of the statement
+DB_LATENCY = register(Histogram(
+    "db_statement_duration_seconds", "Statement execution time", ("statement",)
+))
+DB_ROWS = register(Counter(
+    "db_statement_rows_total", "Rows returned or affected", ("statement",)
+))
+DB_ERRORS = register(Counter(
+    "db_statement_errors_total", "Statements that raised", ("statement",)
+))
+
+
+def observe_statement(name:str, elapsed:float, rows:int = 0, error:bool = False) -> None:
+    DB_LATENCY.observe(name, value=elapsed)
+    if rows and rows > 0:
+        DB_ROWS.inc(name, amount=rows)
+    if error:
+        DB_ERRORS.inc(name)
+
+
+def route_path(routes:Iterable, scope:dict) -> str:
+    """ Path template of the route that handles `scope`, keeps the label set small. """
+    for route in routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, 'path', UNMATCHED_ROUTE)
+
+    return UNMATCHED_ROUTE
+
+
+class TimingMiddleware:
+    """
+    ASGI middleware recording latency, status codes and in-flight
+    requests per route. The latency runs until the last body chunk, so
+    streaming responses are measured whole.
+
+    It also gives every request an ID (X-Request-ID, taken from the
+    request when present) and keeps it with the start time and route in
+    request.state, for the error log.
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+
+        router = scope['app'].router
+        route = route_path(router.routes, scope)
+        method = scope['method']
+        status = 500
+        start = time.perf_counter()
+
+        headers = dict(scope['headers'])
+        request_id = headers.get(b'x-request-id', b'').decode('latin-1')[:64] or uuid4().hex
+        state = scope.setdefault('state', {})
+        state.update(request_id=request_id, route=route, start_time=start)
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+                message['headers'] = [*message.get('headers', []), (b'x-request-id', request_id.encode('latin-1'))]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc(route, method)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_FLIGHT.dec(route, method)
+            HTTP_LATENCY.observe(route, method, value=time.perf_counter() - start)
+            HTTP_REQUESTS.inc(route, method, str(status))
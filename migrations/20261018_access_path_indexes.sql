@@ -0,0 +1,51 @@
+#
+# INDEXES FOR: pomodoros
+#
+
+# Latest pomodoros of a user (get_pomodoros all=True, get_latest_pomodoro)
+CREATE INDEX `ix_pomodoros_user_date`
+  ON `pomodoros` (`user_id`, `pomodoro_date`);
+
+# Pomodoros of a project, ordered by date (get_pomodoros)
+CREATE INDEX `ix_pomodoros_user_category_project_date`
+  ON `pomodoros` (`user_id`, `category_id`, `project_id`, `pomodoro_date`);
+
+
+#
+# INDEXES FOR: recalls
+#
+
+# Recalls of a recall project (get_recalls, delete_recalls)
+CREATE INDEX `ix_recalls_user_recall_project`
+  ON `recalls` (`user_id`, `recall_project_id`);
+
+
+#
+# INDEXES FOR: projects
+#
+
+# Projects of a user or of a category, ordered by start (get_projects)
+CREATE INDEX `ix_projects_user_category_start`
+  ON `projects` (`user_id`, `category_id`, `start`);
+
+CREATE INDEX `ix_projects_user_start`
+  ON `projects` (`user_id`, `start`);
+
+
+#
+# INDEXES FOR: categories
+#
+
+# Covering index for the category list, the primary key is implicitly
+# part of every InnoDB secondary index (get_categories)
+CREATE INDEX `ix_categories_user_name`
+  ON `categories` (`user_id`, `category_name`);
+
+
+#
+# INDEXES FOR: recall_projects
+#
+
+# Covering index for the recall project list (get_recall_projects)
+CREATE INDEX `ix_recall_projects_user_name`
+  ON `recall_projects` (`user_id`, `project_name`);
@@ -0,0 +1,15 @@
+#
+# TABLE STRUCTURE FOR: data_versions
+#
+
+# Version of a user's rows in a table, bumped in the transaction of every
+# write to it (versions.bump). Conditional GETs compare the ETag and
+# Last-Modified built from it instead of running the query.
+CREATE TABLE `data_versions` (
+  `user_id` varchar(50) NOT NULL,
+  `table_name` varchar(32) NOT NULL,
+  `version` BIGINT unsigned NOT NULL DEFAULT 0,
+  `modified_at` datetime(6) NOT NULL,
+  PRIMARY KEY (`user_id`, `table_name`),
+  FOREIGN KEY (`user_id`) REFERENCES users(`user_id`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=UTF8MB4;
@@ -0,0 +1,25 @@
+#
+# TABLE STRUCTURE FOR: deletion_jobs
+#
+
+# Background cascade deletes (deletions.py). A job deletes the rows under
+# a user or a recall project table by table in chunks, `step` is the
+# index of the current table and is committed with every chunk, so a
+# job is resumed where it stopped. There is no foreign key, the job of a
+# user outlives its users row.
+CREATE TABLE `deletion_jobs` (
+  `job_id` int NOT NULL AUTO_INCREMENT,
+  `user_id` varchar(50) NOT NULL,
+  `target` varchar(20) NOT NULL,
+  `target_id` int DEFAULT NULL,
+  `step` int NOT NULL DEFAULT 0,
+  `deleted` BIGINT unsigned NOT NULL DEFAULT 0,
+  `status` varchar(10) NOT NULL DEFAULT 'running',
+  `created_at` datetime(6) NOT NULL,
+  `updated_at` datetime(6) NOT NULL,
+  PRIMARY KEY (`job_id`),
+  # Running jobs left behind by a stopped worker are looked up by these
+  KEY `ix_deletion_jobs_status_updated` (`status`, `updated_at`),
+  # utils.select_user skips the users being deleted
+  KEY `ix_deletion_jobs_user` (`user_id`, `target`)
+) ENGINE=InnoDB DEFAULT CHARSET=UTF8MB4;
@@ -0,0 +1,9 @@
+#
+# SESSION COMPLETION FOR: pomodoros
+#
+
+# Written by POST /pomodoros/{pomodoro_id}/complete when the timer of the
+# session ends, NULL for pomodoros that were never completed (and for
+# the ones created before this migration)
+ALTER TABLE `pomodoros`
+  ADD COLUMN `completed_at` datetime AFTER `pomodoro_date`;
@@ -0,0 +1,21 @@
+#
+# TABLE STRUCTURE FOR: pomodoro_rollups
+#
+
+# Pomodoro totals per user, period, category and project. Kept up to date
+# by create_pomodoro and update_pomodoro_satisfaction, rebuilt from the
+# pomodoros table with:
+#   python -m internal.rebuild_rollups
+CREATE TABLE `pomodoro_rollups` (
+  `user_id` varchar(50) NOT NULL,
+  `period` ENUM('day', 'week', 'month') NOT NULL,
+  `period_start` date NOT NULL,
+  `category_id` INT unsigned NOT NULL,
+  `project_id` INT unsigned NOT NULL,
+  `minutes` INT NOT NULL DEFAULT 0,
+  `pomodoros` INT NOT NULL DEFAULT 0,
+  `good` INT NOT NULL DEFAULT 0,
+  `bad` INT NOT NULL DEFAULT 0,
+  PRIMARY KEY (`user_id`, `period`, `period_start`, `category_id`, `project_id`),
+  FOREIGN KEY (`user_id`) REFERENCES users(`user_id`)
+) ENGINE=InnoDB DEFAULT CHARSET=UTF8MB4;
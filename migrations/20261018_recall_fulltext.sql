@@ -0,0 +1,11 @@
+#
+# FULL-TEXT INDEXES FOR: recalls
+#
+
+# MATCH() column lists have to be exactly the columns of a FULLTEXT
+# index, search_recalls ranks with both (query.search_recalls_query)
+CREATE FULLTEXT INDEX `ft_recalls_title`
+  ON `recalls` (`recall_title`);
+
+CREATE FULLTEXT INDEX `ft_recalls_title_recall`
+  ON `recalls` (`recall_title`, `recall`);
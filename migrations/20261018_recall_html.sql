@@ -0,0 +1,10 @@
+#
+# PRE-RENDERED HTML FOR: recalls
+#
+
+# recall_html is filled by create_recall/update_recall, rows written
+# before this migration are filled with:
+#   python -m internal.backfill_recall_html
+ALTER TABLE `recalls`
+  ADD COLUMN `recall_html` mediumtext AFTER `recall`,
+  ADD COLUMN `recall_html_version` varchar(16) AFTER `recall_html`;
@@ -0,0 +1,127 @@
+--
+-- SCHEMA FOR: DATABASE_BACKEND = 'sqlite'
+--
+
+-- The MySQL migrations folded into one script, applied by data_sqlite
+-- on the first connection. Every statement is IF NOT EXISTS so it runs
+-- again safely on an existing file. Dates are declared DATE and
+-- TIMESTAMP for sqlite3's PARSE_DECLTYPES to return date and datetime.
+
+CREATE TABLE IF NOT EXISTS `users` (
+  `user_id` varchar(50) NOT NULL UNIQUE,
+  `email` varchar(250) NOT NULL UNIQUE,
+  `password` varchar(255) NOT NULL,
+  `first_name` varchar(100),
+  `last_name` varchar(100),
+  `birth_date` DATE,
+  PRIMARY KEY (`user_id`)
+);
+
+CREATE TABLE IF NOT EXISTS `categories` (
+  `category_id` INTEGER PRIMARY KEY AUTOINCREMENT,
+  `category_name` varchar(255) NOT NULL,
+  `user_id` varchar(50) NOT NULL REFERENCES users(`user_id`)
+);
+
+CREATE TABLE IF NOT EXISTS `projects` (
+  `project_id` INTEGER PRIMARY KEY AUTOINCREMENT,
+  `user_id` varchar(50) NOT NULL REFERENCES users(`user_id`),
+  `category_id` INTEGER NOT NULL REFERENCES categories(`category_id`),
+  `project_name` varchar(250) NOT NULL,
+  `start` DATE,
+  `end` DATE,
+  `canceled` DATE DEFAULT NULL
+);
+
+CREATE TABLE IF NOT EXISTS `pomodoros` (
+  `pomodoro_id` INTEGER PRIMARY KEY AUTOINCREMENT,
+  `user_id` varchar(50) NOT NULL REFERENCES users(`user_id`),
+  `category_id` INTEGER NOT NULL REFERENCES categories(`category_id`),
+  `project_id` INTEGER NOT NULL REFERENCES projects(`project_id`),
+  `duration` INTEGER NOT NULL,
+  `pomodoro_date` TIMESTAMP NOT NULL,
+  `completed_at` TIMESTAMP,
+  `pomodoro_satisfaction` INTEGER
+);
+
+CREATE TABLE IF NOT EXISTS `recall_projects` (
+  `recall_project_id` INTEGER PRIMARY KEY AUTOINCREMENT,
+  `user_id` varchar(50) NOT NULL REFERENCES users(`user_id`),
+  `project_name` varchar(255) NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS `recalls` (
+  `recall_id` INTEGER PRIMARY KEY AUTOINCREMENT,
+  `user_id` varchar(50) NOT NULL REFERENCES users(`user_id`),
+  `recall_project_id` INTEGER NOT NULL REFERENCES recall_projects(`recall_project_id`),
+  `recall_title` varchar(255) NOT NULL,
+  `recall` text,
+  `recall_html` text,
+  `recall_html_version` varchar(16)
+);
+
+CREATE TABLE IF NOT EXISTS `pomodoro_rollups` (
+  `user_id` varchar(50) NOT NULL REFERENCES users(`user_id`),
+  `period` varchar(5) NOT NULL CHECK (`period` IN ('day', 'week', 'month')),
+  `period_start` DATE NOT NULL,
+  `category_id` INTEGER NOT NULL,
+  `project_id` INTEGER NOT NULL,
+  `minutes` INTEGER NOT NULL DEFAULT 0,
+  `pomodoros` INTEGER NOT NULL DEFAULT 0,
+  `good` INTEGER NOT NULL DEFAULT 0,
+  `bad` INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (`user_id`, `period`, `period_start`, `category_id`, `project_id`)
+);
+
+CREATE TABLE IF NOT EXISTS `data_versions` (
+  `user_id` varchar(50) NOT NULL REFERENCES users(`user_id`) ON DELETE CASCADE,
+  `table_name` varchar(32) NOT NULL,
+  `version` INTEGER NOT NULL DEFAULT 0,
+  `modified_at` TIMESTAMP NOT NULL,
+  PRIMARY KEY (`user_id`, `table_name`)
+);
+
+-- No foreign key, the job of a user outlives its users row
+CREATE TABLE IF NOT EXISTS `deletion_jobs` (
+  `job_id` INTEGER PRIMARY KEY AUTOINCREMENT,
+  `user_id` varchar(50) NOT NULL,
+  `target` varchar(20) NOT NULL,
+  `target_id` INTEGER,
+  `step` INTEGER NOT NULL DEFAULT 0,
+  `deleted` INTEGER NOT NULL DEFAULT 0,
+  `status` varchar(10) NOT NULL DEFAULT 'running',
+  `created_at` TIMESTAMP NOT NULL,
+  `updated_at` TIMESTAMP NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS `ix_deletion_jobs_status_updated`
+  ON `deletion_jobs` (`status`, `updated_at`);
+CREATE INDEX IF NOT EXISTS `ix_deletion_jobs_user`
+  ON `deletion_jobs` (`user_id`, `target`);
+
+
+--
+-- INDEXES, see 20261018_access_path_indexes.sql
+--
+
+CREATE INDEX IF NOT EXISTS `ix_pomodoros_user_date`
+  ON `pomodoros` (`user_id`, `pomodoro_date`);
+
+CREATE INDEX IF NOT EXISTS `ix_pomodoros_user_category_project_date`
+  ON `pomodoros` (`user_id`, `category_id`, `project_id`, `pomodoro_date`);
+
+CREATE INDEX IF NOT EXISTS `ix_recalls_user_recall_project`
+  ON `recalls` (`user_id`, `recall_project_id`);
+
+CREATE INDEX IF NOT EXISTS `ix_projects_user_category_start`
+  ON `projects` (`user_id`, `category_id`, `start`);
+
+CREATE INDEX IF NOT EXISTS `ix_projects_user_start`
+  ON `projects` (`user_id`, `start`);
+
+-- The rowid is part of every SQLite index, both stay covering
+CREATE INDEX IF NOT EXISTS `ix_categories_user_name`
+  ON `categories` (`user_id`, `category_name`);
+
+CREATE INDEX IF NOT EXISTS `ix_recall_projects_user_name`
+  ON `recall_projects` (`user_id`, `project_name`);
@@ -2,7 +2,6 @@ from datetime import date, datetime
 from enum import Enum
 from typing import Optional, Union
 from uuid import UUID
-from pandas import NA
 
 from pydantic import BaseModel, Field, EmailStr, SecretStr
 
@@ -21,6 +20,39 @@ class Satisfaction(Enum):
     good = "good"
     bad = "bad"
 
+class SessionState(Enum):
+    created = "created"
+    running = "running"
+    paused = "paused"
+    completed = "completed"
+
+class SessionAction(Enum):
+    start = "start"
+    pause = "pause"
+    resume = "resume"
+    reset = "reset"
+    complete = "complete"
+
+class Period(Enum):
+    day = "day"
+    week = "week"
+    month = "month"
+
+class StatsGroup(Enum):
+    project = "project"
+    category = "category"
+    total = "total"
+
+class DeletionTarget(Enum):
+    user = "user"
+    recall_project = "recall_project"
+    recalls = "recalls"
+
+class DeletionStatus(Enum):
+    running = "running"
+    done = "done"
+    failed = "failed"
+
 # User models
 class BaseUser(BaseModel):
     email: EmailStr = Field(...)
@@ -81,6 +113,41 @@ class PomodoroResponse(PomodoroBase):
     category_name: str = NAME
     pomodoro_satisfaction: PomSatisfaction
 
+class PomodoroSessionResponse(BaseModel):
+    pomodoro_id: int = ID
+    state: SessionState = Field(...)
+    duration: int = Field(..., description="Seconds")
+    remaining: float = Field(..., description="Seconds")
+    ends_at: Optional[float] = Field(default=None, description="Unix time the timer ends, while running")
+
+class PomodoroImport(Pomodoro):
+    pomodoro_date: datetime = Field(...)
+    pomodoro_satisfaction: Optional[Satisfaction] = Field(default=None)
+
+class PomodoroRecord(PomodoroBase):
+    category_name: str = NAME
+    project_name: str = NAME
+    pomodoro_date: datetime = Field(...)
+
+class PomodoroImportResult(BaseModel):
+    index: int = Field(...)
+    created: bool = Field(...)
+    errors: list[str] = Field(default_factory=list)
+
+class PomodoroImportResponse(BaseModel):
+    created: int = Field(...)
+    rejected: int = Field(...)
+    results: list[PomodoroImportResult] = Field(...)
+
+class PomodoroStatsResponse(BaseModel):
+    period_start: date = Field(...)
+    category_id: Optional[int] = Field(default=None)
+    project_id: Optional[int] = Field(default=None)
+    minutes: int = Field(...)
+    pomodoros: int = Field(...)
+    good: int = Field(...)
+    bad: int = Field(...)
+
 
 # Recall project models
 class RecallProjectBase(BaseModel):
@@ -105,9 +172,36 @@ class RecallBase(BaseModel):
 class Recall(RecallBase):
     pass
 
+class RecallRecord(BaseModel):
+    project_name: str = NAME
+    recall_title: str = Field(..., min_length=1, max_length=255)
+    recall: str = Field(..., min_length=1)
+
 class RecallResponse(RecallBase):
     recall_id: int = ID
     project_name: str
+
+class RecallSearchResponse(BaseModel):
+    recall_id: int = ID
+    recall_project_id: int = ID
+    project_name: str
+    recall_title: str
+    snippet: str
+    score: float
+
+
+# Deletion models
+class DeletionJobResponse(BaseModel):
+    job_id: int = ID
+    target: DeletionTarget = Field(...)
+    target_id: Optional[int] = Field(default=None, description="recall_project_id")
+    status: DeletionStatus = Field(...)
+    step: int = Field(..., description="Steps done")
+    steps: int = Field(...)
+    table: Optional[str] = Field(default=None, description="Table being deleted from, while running")
+    deleted: int = Field(..., description="Rows deleted so far")
+    created_at: datetime = Field(...)
+    updated_at: datetime = Field(...)
     
     
 
@@ -0,0 +1,107 @@
+"""
+bcrypt hashing and verification on a dedicated process pool.
+
+bcrypt is slow on purpose, so it runs on its own size limited pool of
+processes behind a concurrency cap. A burst of logins queues up here as
+waiting coroutines and doesn't take request threads or the event loop.
+"""
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import time
+from typing import Callable, Optional
+
+from passlib.context import CryptContext
+
+from config import settings
+
+# Constants
+WORKERS = getattr(settings, 'PASSWORD_WORKERS', 2)
+MAX_CONCURRENCY = getattr(settings, 'PASSWORD_MAX_CONCURRENCY', WORKERS)
+
+PWD_CXT = CryptContext(schemes=['bcrypt'], deprecated='auto')
+
+
+def _hash(plain_pass:str) -> str:
+    return PWD_CXT.hash(plain_pass)
+
+def _verify(plain_pass:str, hashed_pass:str) -> bool:
+    return PWD_CXT.verify(plain_pass, hashed_pass)
+
+
+class PasswordPool:
+
+    def __init__(self, workers:int = WORKERS, max_concurrency:int = MAX_CONCURRENCY) -> None:
+        self.workers = workers
+        self.max_concurrency = max_concurrency
+        self.executor: Optional[ProcessPoolExecutor] = None
+
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+        # Metrics
+        self._waiting = 0
+        self._running = 0
+        self._completed = 0
+        self._queue_time = 0.0
+        self._max_queue_time = 0.0
+
+    def start(self) -> ProcessPoolExecutor:
+        if self.executor is None:
+            # spawn so the workers don't inherit the event loop or the
+            # open database connections of the web worker
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+
+        return self.executor
+
+    def shutdown(self) -> None:
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+
+    async def run(self, func:Callable, *args):
+        executor = self.start()
+        loop = asyncio.get_running_loop()
+
+        start = time.perf_counter()
+        self._waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self._waiting -= 1
+
+        queue_time = time.perf_counter() - start
+        self._queue_time += queue_time
+        self._max_queue_time = max(self._max_queue_time, queue_time)
+        self._running += 1
+        try:
+            return await loop.run_in_executor(executor, func, *args)
+        finally:
+            self._running -= 1
+            self._completed += 1
+            self._semaphore.release()
+
+    def stats(self) -> dict:
+        completed = self._completed
+        return {
+            'workers': self.workers,
+            'max_concurrency': self.max_concurrency,
+            'waiting': self._waiting,
+            'running': self._running,
+            'completed': completed,
+            'queue_time_total': self._queue_time,
+            'queue_time_avg': self._queue_time / completed if completed else 0.0,
+            'queue_time_max': self._max_queue_time,
+        }
+
+
+PASSWORD_POOL = PasswordPool()
+
+
+async def hash_password(plain_pass:str) -> str:
+    return await PASSWORD_POOL.run(_hash, plain_pass)
+
+async def verify_password(plain_pass:str, hashed_pass:str) -> bool:
+    return await PASSWORD_POOL.run(_verify, plain_pass, hashed_pass)
@@ -1,36 +1,172 @@
 from typing import Union
 
 from pypika import Table, MySQLQuery, Parameter, Field, Order, Criterion
+from pypika.queries import QueryBuilder
+from pypika.dialects import SQLLiteQuery, SQLLiteQueryBuilder
+from pypika.enums import Dialects
+from pypika.terms import Term, Values
+from pypika.utils import builder, format_alias_sql
+
+from config import settings
 
 # Constants
+BACKEND = getattr(settings, 'DATABASE_BACKEND', 'mysql')
 CRITERION = {
     'all': Criterion.all,
     'any': Criterion.any,
 }
 
+
+# Dialects
+
+class SQLiteQueryBuilder(SQLLiteQueryBuilder):
+    """ SQLLiteQuery builder with the ON CONFLICT DO UPDATE upsert of SQLite 3.24+ """
+
+    def __init__(self, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self._conflict_fields: list[Field] = []
+        self._conflict_updates: list[tuple[Field, Term]] = []
+
+    @builder
+    def on_conflict_update(self, conflict_fields:list[Field], field:Field, value:Term) -> None:
+        self._conflict_fields = conflict_fields
+        self._conflict_updates.append((field, value))
+
+    def get_sql(self, **kwargs) -> str:
+        sql = super().get_sql(**kwargs)
+        if not self._conflict_updates:
+            return sql
+
+        kwargs.setdefault('quote_char', self.QUOTE_CHAR)
+        fields = ",".join(field.get_sql(**kwargs) for field in self._conflict_fields)
+        updates = ",".join(
+            f"{field.get_sql(**kwargs)}={value.get_sql(**kwargs)}" for field, value in self._conflict_updates
+        )
+        return f"{sql} ON CONFLICT ({fields}) DO UPDATE SET {updates}"
+
+class SQLiteQuery(SQLLiteQuery):
+
+    @classmethod
+    def _builder(cls, **kwargs) -> SQLiteQueryBuilder:
+        return SQLiteQueryBuilder(**kwargs)
+
+class Excluded(Term):
+    """ The value a conflicting INSERT tried to write, SQLite's excluded.column """
+
+    def __init__(self, field:Field) -> None:
+        super().__init__(alias=None)
+        self.field = field
+
+    def get_sql(self, **kwargs) -> str:
+        return f"excluded.{self.field.get_sql(with_namespace=False, **kwargs)}"
+
+# The builders of this module emit the dialect of the configured backend
+Query = SQLiteQuery if BACKEND == 'sqlite' else MySQLQuery
+PLACEHOLDER = "?" if BACKEND == 'sqlite' else "%s"
+
+def placeholder()-> Parameter:
+    return Parameter(PLACEHOLDER)
+
+# Terms
+
+class MatchAgainst(Criterion):
+    """
+    MySQL full-text search, the fields have to match a FULLTEXT index.
+    Works as a condition and as a relevance score column. On SQLite it
+    is a term count computed by the match_against function.
+    """
+    def __init__(self, fields:list[Field], against:Term, alias:str = None) -> None:
+        super().__init__(alias=alias)
+        self.fields = fields
+        self.against = against
+
+    def nodes_(self):
+        yield self
+        for field in self.fields:
+            yield from field.nodes_()
+        yield from self.against.nodes_()
+
+    def get_sql(self, with_alias:bool = False, **kwargs) -> str:
+        fields = ",".join(field.get_sql(**kwargs) for field in self.fields)
+        if kwargs.get('dialect') == Dialects.SQLLITE:
+            # SQL function registered on every connection by data_sqlite
+            sql = f"match_against({self.against.get_sql(**kwargs)},{fields})"
+        else:
+            sql = f"MATCH({fields}) AGAINST ({self.against.get_sql(**kwargs)} IN NATURAL LANGUAGE MODE)"
+        if with_alias:
+            return format_alias_sql(sql, self.alias, **kwargs)
+        return sql
+
+
 # Helpers
 
 def _get_order(desc):
     return Order.desc if desc else Order.asc
 
 
+def keyset_condition(fields:list[Field], desc:bool = True)-> Criterion:
+    """
+    Rows after a cursor when ordering by `fields`, the last field has to
+    be unique. Expanded as (a < %s) OR (a = %s AND b < %s) so MySQL can
+    range scan the index. Takes a value per comparison, see keyset_values.
+    """
+    conditions = []
+    for position, field in enumerate(fields):
+        equals = [previous == placeholder() for previous in fields[:position]]
+        after = field < placeholder() if desc else field > placeholder()
+        conditions.append(Criterion.all(equals + [after]))
+
+    return Criterion.any(conditions)
+
+def keyset_values(cursor:Union[tuple, list])-> list:
+    """ Values for keyset_condition built from the cursor row. """
+    values = []
+    for position in range(len(cursor)):
+        values.extend(cursor[:position + 1])
+
+    return values
+
 def create_placeholders(amount:int)-> list[Parameter]:
-    return [Parameter("%s") for _ in range(amount)]
+    return [placeholder() for _ in range(amount)]
 
-def insert_query(table:Table, columns:list[Field])-> MySQLQuery:
+def insert_query(table:Table, columns:list[Field])-> QueryBuilder:
     placeholders = create_placeholders(len(columns))
-    query = MySQLQuery.into(table) \
+    query = Query.into(table) \
         .columns(*columns) \
         .insert(*placeholders)
     
     return query
 
+def upsert_query(
+    table:Table, columns:list[Field], increments:list[Field], keys:list[Field],
+    replacements:list[Field] = None
+    )-> QueryBuilder:
+    """
+    Insert a row or, when one with the same `keys` exists, add the
+    `increments` columns to it and overwrite the `replacements` ones.
+    """
+    query = insert_query(table, columns)
+    for column in increments:
+        if BACKEND == 'sqlite':
+            query = query.on_conflict_update(keys, column, column + Excluded(column))
+        else:
+            query = query.on_duplicate_key_update(column, column + Values(column))
+
+    for column in replacements or []:
+        if BACKEND == 'sqlite':
+            query = query.on_conflict_update(keys, column, Excluded(column))
+        else:
+            query = query.on_duplicate_key_update(column, Values(column))
+
+    return query
+
 def select_query(
     table:Table, columns:list[Field], condition:list = None, 
     distinct:bool = False, criterion:str = 'all',
-    order_by: str = None, desc:bool = True, limit:int = None
-    )-> MySQLQuery:
-    query = MySQLQuery.from_(table).select(*columns)
+    order_by: str = None, desc:bool = True, limit:int = None,
+    group_by:list[Field] = None, for_update:bool = False
+    )-> QueryBuilder:
+    query = Query.from_(table).select(*columns)
 
     if distinct:
         query = query.distinct()
@@ -41,6 +177,9 @@ def select_query(
         query = query.where(
             criterion(condition)
         )
+
+    if group_by:
+        query = query.groupby(*group_by)
     
     if order_by:
         order = _get_order(desc)
@@ -48,6 +187,10 @@ def select_query(
 
     if limit:
         query = query.limit(limit)
+
+    # SQLite has no row locks, its write transactions are serialized
+    if for_update and BACKEND != 'sqlite':
+        query = query.for_update()
     
     return query
 
@@ -56,8 +199,8 @@ def select_join_query(
     columns:list[Field], condition:tuple = None,
     criterion: str = 'all', order_by: str = None,
     desc: bool = True
-    )-> MySQLQuery:
-    query =  MySQLQuery \
+    )-> QueryBuilder:
+    query =  Query \
         .from_(from_) \
         .join(join) \
         .on_field(*on_fields) \
@@ -78,14 +221,21 @@ def select_join_query(
 
 def select_join_on_query(
     from_:Table, join_on:list[tuple[Table, tuple]], 
-    columns:list[Field], condition:list = None, order_by:str = None,
-    criterion:str = 'all'
-    )-> MySQLQuery:
-    query = MySQLQuery.from_(from_)
+    columns:list[Field], condition:list = None, order_by:Union[str, Term, list] = None,
+    criterion:str = 'all', desc:bool = True, limit:Union[int, Parameter] = None,
+    offset:Union[int, Parameter] = None, keyset:list[Field] = None
+    )-> QueryBuilder:
+    query = Query.from_(from_)
     for table, on_condition in join_on:
         query = query.join(table).on(on_condition)
 
     query = query.select(*columns)
+
+    # Page after a cursor, the keyset fields are also the ordering
+    if keyset:
+        condition = list(condition or []) + [keyset_condition(keyset, desc)]
+        order_by = keyset
+
     if condition:
         criterion = CRITERION[criterion]
         query = query.where(
@@ -93,15 +243,35 @@ def select_join_on_query(
         )
     
     if order_by:
-        query = query.orderby(order_by, order=Order.desc)
+        order = _get_order(desc)
+        if type(order_by) != list:
+            order_by = [order_by]
+        for field in order_by:
+            query = query.orderby(field, order=order)
+
+    if limit:
+        query = query.limit(limit)
+
+    if offset:
+        query = query.offset(offset)
     return query
     
 
-def delete_query(table:Table, condition:tuple)-> MySQLQuery:
-    return MySQLQuery.from_(table).delete().where(condition)
+def delete_query(table:Table, condition:tuple, limit:Union[int, Parameter] = None)-> QueryBuilder:
+    query = Query.from_(table).delete()
+    if limit is None:
+        return query.where(condition)
+
+    # SQLite has no DELETE ... LIMIT, the rows are picked by rowid
+    if BACKEND == 'sqlite':
+        rowid = Field('rowid')
+        rows = Query.from_(table).select(rowid).where(condition).limit(limit)
+        return query.where(rowid.isin(rows))
+
+    return query.where(condition).limit(limit)
     
-def update_query(table:Table, updates:Union[tuple, list[tuple]], condition:tuple)-> MySQLQuery:
-    query = MySQLQuery.update(table)
+def update_query(table:Table, updates:Union[tuple, list[tuple]], condition:tuple)-> QueryBuilder:
+    query = Query.update(table)
     if type(updates) == list:
         for update in updates:
             query = query.set(*update)
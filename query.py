@@ -1,17 +1,22 @@
-from typing import Union
+from typing import Optional, Union
 
 from fastapi import status, HTTPException
-from pandas import DataFrame
-from pypika import Tables, Parameter
+from pypika import Table, Tables, functions as fn
 
-from data import DB
+from data import ADB
+from markdown_render import markdown_to_html, MARKDOWN_VERSION
 import queries
+from statements import statement
 
 USERS, CATEGORIES, PROJECTS, POMODOROS = Tables('users', 'categories', 'projects', 'pomodoros')
 RECALL_PROJECTS, RECALLS = Tables('recall_projects', 'recalls')
+ROLLUPS = Table('pomodoro_rollups')
+VERSIONS = Table('data_versions')
+DELETION_JOBS = Table('deletion_jobs')
 
 
 # Users
+@statement()
 def signup_user()-> str:
     columns = [
         USERS.user_id, USERS.email, USERS.password,
@@ -20,27 +25,34 @@ def signup_user()-> str:
     query = queries.insert_query(USERS, columns)
     return query.get_sql()
 
-def login_user(values:tuple)-> DataFrame:
+@statement()
+def login_user_query()-> str:
     columns = [
         USERS.user_id, USERS.email, USERS.first_name,
         USERS.last_name, USERS.birth_date, USERS.password,
     ]
-    condition = [USERS.email == Parameter("%s")]
+    condition = [USERS.email == queries.placeholder()]
     query = queries.select_query(USERS, columns, condition)
 
+    return query.get_sql()
+
+async def login_user(values:tuple)-> Optional[dict]:
     # Get user that matches email
-    user = DB.pandas_query(query.get_sql(), values)
+    # From the primary, so a user can log in right after signing up
+    user = await ADB.fetch_one(login_user_query(), values, primary=True)
 
     return user
 
+@statement()
 def delete_user()-> str:
-    delete_condition = (USERS.user_id == Parameter("%s"))
+    delete_condition = (USERS.user_id == queries.placeholder())
     query = queries.delete_query(USERS, delete_condition)
-    
+
     return query.get_sql()
 
 
 # Categories
+@statement()
 def create_category()-> str:
     columns = [
         CATEGORIES.category_name, CATEGORIES.user_id
@@ -49,46 +61,61 @@ def create_category()-> str:
 
     return query.get_sql()
 
-def get_categories(values:tuple, category_id:int = None, order_by:str = "category_name", criterion='all')->DataFrame:
+@statement((False, "category_name", 'all'), (True, "category_name", 'all'), (False, "category_id", 'all'))
+def get_categories_query(by_category:bool = False, order_by:str = "category_name", criterion:str = 'all')-> str:
     columns = [CATEGORIES.category_id, CATEGORIES.category_name]
-    condition = [CATEGORIES.user_id == Parameter("%s")]
+    condition = [CATEGORIES.user_id == queries.placeholder()]
 
-    if category_id:
-        condition.append(CATEGORIES.category_id == Parameter("%s"))
+    if by_category:
+        condition.append(CATEGORIES.category_id == queries.placeholder())
 
     query = queries.select_query(CATEGORIES, columns, condition, order_by=order_by, criterion=criterion, desc=False)
-    df = DB.pandas_query(query.get_sql(), values)
 
-    return df
+    return query.get_sql()
+
+async def get_categories(values:tuple, category_id:int = None, order_by:str = "category_name", criterion='all')-> list[dict]:
+    query = get_categories_query(bool(category_id), order_by, criterion)
+    rows = await ADB.fetch_all(query, values)
 
+    return rows
+
+@statement()
 def update_category()->str:
-    updates = (CATEGORIES.category_name, Parameter('%s'))
+    updates = (CATEGORIES.category_name, queries.placeholder())
     condition = (
-        (CATEGORIES.category_id == Parameter("%s")) & (CATEGORIES.user_id == Parameter("%s"))
+        (CATEGORIES.category_id == queries.placeholder()) & (CATEGORIES.user_id == queries.placeholder())
     )
     query = queries.update_query(CATEGORIES, updates, condition)
-    
+
     return query.get_sql()
 
+@statement()
 def delete_category()-> str:
     condition = (
-        (CATEGORIES.category_id == Parameter('%s')) & (CATEGORIES.user_id == Parameter("%s"))
+        (CATEGORIES.category_id == queries.placeholder()) & (CATEGORIES.user_id == queries.placeholder())
     )
     query = queries.delete_query(CATEGORIES, condition)
 
     return query.get_sql()
 
 # Projects
+@statement()
 def create_project()-> str:
     columns = [
-        PROJECTS.user_id, PROJECTS.category_id, 
+        PROJECTS.user_id, PROJECTS.category_id,
         PROJECTS.project_name, PROJECTS.start
     ]
     query = queries.insert_query(PROJECTS, columns)
 
     return query.get_sql()
 
-def get_projects(values:tuple, project_id:int = None, category_id:int=None, order_by:str = "start", desc:bool = True)-> DataFrame:
+@statement(
+    (False, False, "start", True),
+    (True, False, "start", True),
+    (False, True, "start", True),
+    (False, False, "project_id", False),
+)
+def get_projects_query(by_project:bool = False, by_category:bool = False, order_by:str = "start", desc:bool = True)-> str:
     on_fields = ('category_id', 'user_id')
     columns = [
         PROJECTS.project_id, PROJECTS.category_id,
@@ -96,36 +123,43 @@ def get_projects(values:tuple, project_id:int = None, category_id:int=None, orde
         PROJECTS.start, PROJECTS.end, PROJECTS.canceled
     ]
     condition = [
-        PROJECTS.user_id == Parameter('%s')
+        PROJECTS.user_id == queries.placeholder()
     ]
-    if category_id:
-        condition.append(PROJECTS.category_id == Parameter("%s"))
+    if by_category:
+        condition.append(PROJECTS.category_id == queries.placeholder())
 
-    if project_id:
-        condition.append(PROJECTS.project_id == Parameter('%s'))
+    if by_project:
+        condition.append(PROJECTS.project_id == queries.placeholder())
 
     query = queries.select_join_query(
         PROJECTS, CATEGORIES, on_fields,
         columns, condition, criterion='all',
         order_by=order_by, desc=desc
     )
+
+    return query.get_sql()
+
+async def get_projects(values:tuple, project_id:int = None, category_id:int=None, order_by:str = "start", desc:bool = True)-> list[dict]:
+    query = get_projects_query(bool(project_id), bool(category_id), order_by, desc)
     # Execute query
-    df = DB.pandas_query(query.get_sql(), values)
+    rows = await ADB.fetch_all(query, values)
 
-    return df
+    return rows
 
+@statement(('end',), ('canceled',), ('project_name',))
 def update_project(column)-> str:
-    updates = (PROJECTS[column], Parameter("%s"))
+    updates = (PROJECTS[column], queries.placeholder())
     condition = (
-        (PROJECTS.project_id == Parameter("%s")) & (PROJECTS.user_id == Parameter('%s'))
+        (PROJECTS.project_id == queries.placeholder()) & (PROJECTS.user_id == queries.placeholder())
     )
     query = queries.update_query(PROJECTS, updates, condition)
 
     return query.get_sql()
 
+@statement()
 def delete_project()-> str:
     condition = (
-        (PROJECTS.project_id == Parameter('%s')) & (PROJECTS.user_id == Parameter('%s'))
+        (PROJECTS.project_id == queries.placeholder()) & (PROJECTS.user_id == queries.placeholder())
     )
     query = queries.delete_query(PROJECTS, condition)
 
@@ -133,9 +167,10 @@ def delete_project()-> str:
 
 
 # Pomodoros
+@statement()
 def create_pomodoro()-> str:
     columns = [
-        POMODOROS.category_id, POMODOROS.project_id, 
+        POMODOROS.category_id, POMODOROS.project_id,
         POMODOROS.duration, POMODOROS.pomodoro_date,
         POMODOROS.user_id
     ]
@@ -143,7 +178,19 @@ def create_pomodoro()-> str:
 
     return query.get_sql()
 
-def get_pomodoros(values:tuple, all:bool = False)-> DataFrame:
+@statement()
+def create_rated_pomodoro()-> str:
+    columns = [
+        POMODOROS.category_id, POMODOROS.project_id,
+        POMODOROS.duration, POMODOROS.pomodoro_date,
+        POMODOROS.pomodoro_satisfaction, POMODOROS.user_id
+    ]
+    query = queries.insert_query(POMODOROS, columns)
+
+    return query.get_sql()
+
+@statement((False, False), (True, False), (True, True))
+def get_pomodoros_query(all:bool = False, after_cursor:bool = False)-> str:
     join_on = [
         (PROJECTS, (POMODOROS.project_id == PROJECTS.project_id) & (POMODOROS.category_id == PROJECTS.category_id)),
         (CATEGORIES, (CATEGORIES.category_id == POMODOROS.category_id))
@@ -152,48 +199,188 @@ def get_pomodoros(values:tuple, all:bool = False)-> DataFrame:
         POMODOROS.pomodoro_id, CATEGORIES.category_name, PROJECTS.project_name, POMODOROS.pomodoro_date,
         POMODOROS.duration, POMODOROS.pomodoro_satisfaction
     ]
-    # Get latest pomodoros for specific user
+    # Get latest pomodoros for specific user, a page at a time
     if all:
         condition = [
-            POMODOROS.user_id == Parameter("%s"),
-            POMODOROS.pomodoro_date >= Parameter("%s")
+            POMODOROS.user_id == queries.placeholder(),
+            POMODOROS.pomodoro_date >= queries.placeholder()
         ]
+        order_by = [POMODOROS.pomodoro_date, POMODOROS.pomodoro_id]
+        query = queries.select_join_on_query(
+            POMODOROS, join_on, columns, condition, order_by,
+            limit=queries.placeholder(), keyset=order_by if after_cursor else None
+        )
     # Get an specific pomodoro
     else:
         condition = [
-            POMODOROS.user_id == Parameter("%s"),
-            POMODOROS.category_id == Parameter("%s"),
-            POMODOROS.project_id == Parameter("%s"),
+            POMODOROS.user_id == queries.placeholder(),
+            POMODOROS.category_id == queries.placeholder(),
+            POMODOROS.project_id == queries.placeholder(),
         ]
-    query = queries.select_join_on_query(
-        POMODOROS, join_on, columns, condition, 'pomodoro_date'
-    )
-    df = DB.pandas_query(query.get_sql(), values)
+        query = queries.select_join_on_query(
+            POMODOROS, join_on, columns, condition, 'pomodoro_date'
+        )
+
+    return query.get_sql()
+
+async def get_pomodoros(values:tuple, all:bool = False, cursor:tuple = None, limit:int = None)-> list[dict]:
+    """
+    With all=True returns `limit` pomodoros older than `cursor`, a
+    (pomodoro_date, pomodoro_id) pair taken from the last row of the
+    previous page.
+    """
+    if all:
+        values = [*values, *queries.keyset_values(cursor or ()), limit]
+
+    query = get_pomodoros_query(all, bool(cursor))
+    rows = await ADB.fetch_all(query, values)
 
-    return df
+    return rows
 
+@statement()
 def update_pomodoro_satisfaction()-> str:
-    updates = (POMODOROS.pomodoro_satisfaction, Parameter('%s'))
+    updates = (POMODOROS.pomodoro_satisfaction, queries.placeholder())
+    condition = (
+        (POMODOROS.pomodoro_id == queries.placeholder()) & (POMODOROS.user_id == queries.placeholder())
+    )
+    query = queries.update_query(POMODOROS, updates, condition)
+
+    return query.get_sql()
+
+@statement()
+def complete_pomodoro()-> str:
+    updates = (POMODOROS.completed_at, queries.placeholder())
     condition = (
-        (POMODOROS.pomodoro_id == Parameter("%s")) & (POMODOROS.user_id == Parameter('%s'))
+        (POMODOROS.pomodoro_id == queries.placeholder()) & (POMODOROS.user_id == queries.placeholder())
+        & POMODOROS.completed_at.isnull()
     )
     query = queries.update_query(POMODOROS, updates, condition)
 
     return query.get_sql()
 
-def get_latest_pomodoro(values:tuple)-> str:
-    columns = [POMODOROS.pomodoro_id]
+@statement()
+def get_pomodoro_session_query()-> str:
+    columns = [POMODOROS.pomodoro_id, POMODOROS.duration, POMODOROS.completed_at]
     condition = [
-        POMODOROS.user_id == Parameter("%s")
+        POMODOROS.pomodoro_id == queries.placeholder(),
+        POMODOROS.user_id == queries.placeholder(),
     ]
-    query = queries.select_query(POMODOROS, columns=columns, condition=condition, order_by="pomodoro_date", limit=1)
-    df = DB.pandas_query(query.get_sql(), values)
+    query = queries.select_query(POMODOROS, columns=columns, condition=condition)
 
-    return df
+    return query.get_sql()
+
+async def get_pomodoro_session(user_id:str, pomodoro_id:int)-> Optional[dict]:
+    """ The row a lost session is opened again from, by primary key. """
+    pomodoro = await ADB.fetch_one(get_pomodoro_session_query(), (pomodoro_id, user_id))
+
+    return pomodoro
+
+
+@statement()
+def get_rated_pomodoro()-> str:
+    columns = [
+        POMODOROS.category_id, POMODOROS.project_id,
+        POMODOROS.pomodoro_date, POMODOROS.pomodoro_satisfaction
+    ]
+    condition = [
+        POMODOROS.pomodoro_id == queries.placeholder(),
+        POMODOROS.user_id == queries.placeholder(),
+    ]
+    # Lock the row so concurrent ratings adjust the rollups one at a time
+    query = queries.select_query(POMODOROS, columns, condition, for_update=True)
+
+    return query.get_sql()
+
+
+# Pomodoro rollups
+@statement()
+def add_pomodoro_rollup()-> str:
+    columns = [
+        ROLLUPS.user_id, ROLLUPS.period, ROLLUPS.period_start,
+        ROLLUPS.category_id, ROLLUPS.project_id,
+        ROLLUPS.minutes, ROLLUPS.pomodoros, ROLLUPS.good, ROLLUPS.bad
+    ]
+    increments = [ROLLUPS.minutes, ROLLUPS.pomodoros, ROLLUPS.good, ROLLUPS.bad]
+    keys = [ROLLUPS.user_id, ROLLUPS.period, ROLLUPS.period_start, ROLLUPS.category_id, ROLLUPS.project_id]
+    query = queries.upsert_query(ROLLUPS, columns, increments, keys)
+
+    return query.get_sql()
+
+@statement()
+def get_rollup_pomodoros()-> str:
+    """ The pomodoros of a user as rollups.rollup_totals input. """
+    columns = [
+        POMODOROS.category_id, POMODOROS.project_id, POMODOROS.duration,
+        POMODOROS.pomodoro_date, POMODOROS.pomodoro_satisfaction
+    ]
+    query = queries.select_query(POMODOROS, columns, [POMODOROS.user_id == queries.placeholder()])
+
+    return query.get_sql()
+
+@statement()
+def delete_pomodoro_rollups()-> str:
+    delete_condition = (ROLLUPS.user_id == queries.placeholder())
+    query = queries.delete_query(ROLLUPS, delete_condition)
+
+    return query.get_sql()
+
+@statement(
+    ('project', False, False),
+    ('category', False, False),
+    ('total', False, False),
+    ('project', True, False),
+    ('project', True, True),
+)
+def get_pomodoro_stats_query(group_by:str = 'project', by_category:bool = False, by_project:bool = False)-> str:
+    group_columns = {
+        'project': [ROLLUPS.period_start, ROLLUPS.category_id, ROLLUPS.project_id],
+        'category': [ROLLUPS.period_start, ROLLUPS.category_id],
+        'total': [ROLLUPS.period_start],
+    }[group_by]
+    columns = [
+        *group_columns,
+        fn.Sum(ROLLUPS.minutes).as_('minutes'),
+        fn.Sum(ROLLUPS.pomodoros).as_('pomodoros'),
+        fn.Sum(ROLLUPS.good).as_('good'),
+        fn.Sum(ROLLUPS.bad).as_('bad'),
+    ]
+    condition = [
+        ROLLUPS.user_id == queries.placeholder(),
+        ROLLUPS.period == queries.placeholder(),
+        ROLLUPS.period_start >= queries.placeholder(),
+        ROLLUPS.period_start <= queries.placeholder(),
+    ]
+    if by_category:
+        condition.append(ROLLUPS.category_id == queries.placeholder())
+
+    if by_project:
+        condition.append(ROLLUPS.project_id == queries.placeholder())
+
+    query = queries.select_query(
+        ROLLUPS, columns, condition, group_by=group_columns,
+        order_by="period_start", desc=False
+    )
+
+    return query.get_sql()
+
+async def get_pomodoro_stats(
+        user_id:str, period:str, start, end, group_by:str = 'project',
+        category_id:int = None, project_id:int = None
+    )-> list[dict]:
+    values = [user_id, period, start, end]
+    if category_id:
+        values.append(category_id)
+    if project_id:
+        values.append(project_id)
+
+    query = get_pomodoro_stats_query(group_by, bool(category_id), bool(project_id))
+    rows = await ADB.fetch_all(query, values)
+
+    return rows
 
 
-    
 # Recall Projects
+@statement()
 def create_recall_project()-> str:
 
     columns = [RECALL_PROJECTS.user_id, RECALL_PROJECTS.project_name]
@@ -201,112 +388,391 @@ def create_recall_project()-> str:
 
     return query.get_sql()
 
-def get_recall_projects(values:Union[tuple, list], order_by:str = "project_name", desc=False)-> DataFrame:
+@statement((False, "project_name", False), (True, "project_name", False), (False, "recall_project_id", False))
+def get_recall_projects_query(by_recall_project:bool = False, order_by:str = "project_name", desc:bool = False)-> str:
     columns = [RECALL_PROJECTS.recall_project_id, RECALL_PROJECTS.project_name]
 
-    if type(values) == list:
+    if by_recall_project:
         condition = [
-            RECALL_PROJECTS.user_id == Parameter('%s'), 
-            RECALL_PROJECTS.recall_project_id == Parameter("%s")
+            RECALL_PROJECTS.user_id == queries.placeholder(),
+            RECALL_PROJECTS.recall_project_id == queries.placeholder()
         ]
     else:
-        condition = [RECALL_PROJECTS.user_id == Parameter('%s')]
+        condition = [RECALL_PROJECTS.user_id == queries.placeholder()]
     query = queries.select_query(RECALL_PROJECTS, columns, condition, order_by=order_by, desc=desc)
+
+    return query.get_sql()
+
+async def get_recall_projects(values:Union[tuple, list], order_by:str = "project_name", desc=False)-> list[dict]:
+    query = get_recall_projects_query(type(values) == list, order_by, desc)
     # Execute query
-    df = DB.pandas_query(query.get_sql(), values)
+    rows = await ADB.fetch_all(query, values)
 
-    return df
+    return rows
 
+@statement()
 def update_recall_project_name()-> str:
-    updates = (RECALL_PROJECTS.project_name, Parameter('%s'))
+    updates = (RECALL_PROJECTS.project_name, queries.placeholder())
     condition = (
-        (RECALL_PROJECTS.user_id == Parameter('%s')) & (RECALL_PROJECTS.recall_project_id == Parameter("%s"))
+        (RECALL_PROJECTS.user_id == queries.placeholder()) & (RECALL_PROJECTS.recall_project_id == queries.placeholder())
         )
     query = queries.update_query(RECALL_PROJECTS, updates, condition)
 
     return query.get_sql()
-    
+
+@statement()
 def delete_recall_project()-> str:
     condition = (
-        (RECALL_PROJECTS.recall_project_id == Parameter('%s')) & (RECALL_PROJECTS.user_id == Parameter('%s'))
+        (RECALL_PROJECTS.recall_project_id == queries.placeholder()) & (RECALL_PROJECTS.user_id == queries.placeholder())
     )
     query = queries.delete_query(RECALL_PROJECTS, condition)
 
     return query.get_sql()
-    
+
 
 # Recalls
+@statement()
 def create_recall()-> str:
     columns = [
-        RECALLS.user_id, RECALLS.recall_project_id, 
-        RECALLS.recall_title, RECALLS.recall
+        RECALLS.user_id, RECALLS.recall_project_id,
+        RECALLS.recall_title, RECALLS.recall,
+        RECALLS.recall_html, RECALLS.recall_html_version
     ]
     query = queries.insert_query(RECALLS, columns)
 
     return query.get_sql()
 
-def get_recalls(values:tuple, recall_id:int = None)-> DataFrame:
+@statement((False, False), (False, True), (True, False))
+def get_recalls_query(by_recall:bool = False, after_cursor:bool = False)-> str:
     join_on = [
         (RECALL_PROJECTS, (RECALLS.user_id == RECALL_PROJECTS.user_id) & (RECALLS.recall_project_id == RECALL_PROJECTS.recall_project_id))
     ]
     columns = [
-        RECALLS.recall_id, RECALL_PROJECTS.recall_project_id, 
-        RECALL_PROJECTS.project_name, RECALLS.recall_title, RECALLS.recall
+        RECALLS.recall_id, RECALL_PROJECTS.recall_project_id,
+        RECALL_PROJECTS.project_name, RECALLS.recall_title, RECALLS.recall,
+        RECALLS.recall_html, RECALLS.recall_html_version
         ]
 
-    condition = [RECALLS.user_id == Parameter("%s")]
+    condition = [RECALLS.user_id == queries.placeholder()]
 
-    if recall_id:
-        condition.append(RECALLS.recall_id == Parameter("%s"))
+    if by_recall:
+        condition.append(RECALLS.recall_id == queries.placeholder())
+        query = queries.select_join_on_query(RECALLS, join_on, columns, condition)
+    # Recalls of a recall project, a page at a time
     else:
-        condition.append(RECALLS.recall_project_id == Parameter("%s"))
+        condition.append(RECALLS.recall_project_id == queries.placeholder())
+        order_by = [RECALLS.recall_id]
+        query = queries.select_join_on_query(
+            RECALLS, join_on, columns, condition, order_by, desc=False,
+            limit=queries.placeholder(), keyset=order_by if after_cursor else None
+        )
+
+    return query.get_sql()
 
-    query = queries.select_join_on_query(RECALLS, join_on, columns, condition)
+async def get_recalls(values:tuple, recall_id:int = None, cursor:int = None, limit:int = None)-> list[dict]:
+    """
+    Without recall_id returns `limit` recalls of the recall project
+    after the `cursor` recall_id.
+    """
+    if not recall_id:
+        values = [*values, *queries.keyset_values((cursor,) if cursor else ()), limit]
 
+    query = get_recalls_query(bool(recall_id), bool(cursor))
     # Execute query
-    df = DB.pandas_query(query.get_sql(), values)
+    rows = await ADB.fetch_all(query, values)
 
-    return df
+    return rows
 
-def update_recall(recall_id:int, recall_title:str, recall:str, user_id:str)-> tuple[str, tuple]:
+@statement()
+def search_recalls_query()-> str:
+    join_on = [
+        (RECALL_PROJECTS, (RECALLS.user_id == RECALL_PROJECTS.user_id) & (RECALLS.recall_project_id == RECALL_PROJECTS.recall_project_id))
+    ]
+    # Title matches weigh twice as much as body matches
+    score = (
+        queries.MatchAgainst([RECALLS.recall_title], queries.placeholder()) * 2
+        + queries.MatchAgainst([RECALLS.recall_title, RECALLS.recall], queries.placeholder())
+    ).as_('score')
+    columns = [
+        RECALLS.recall_id, RECALL_PROJECTS.recall_project_id,
+        RECALL_PROJECTS.project_name, RECALLS.recall_title, RECALLS.recall,
+        score
+    ]
+    condition = [
+        RECALLS.user_id == queries.placeholder(),
+        queries.MatchAgainst([RECALLS.recall_title, RECALLS.recall], queries.placeholder()),
+    ]
+    query = queries.select_join_on_query(
+        RECALLS, join_on, columns, condition, order_by=[score, RECALLS.recall_id],
+        limit=queries.placeholder(), offset=queries.placeholder()
+    )
+
+    return query.get_sql()
+
+async def search_recalls(user_id:str, terms:str, limit:int, offset:int = 0)-> list[dict]:
+    values = (terms, terms, user_id, terms, limit, offset)
+    rows = await ADB.fetch_all(search_recalls_query(), values)
+
+    return rows
+
+@statement((True, False), (False, True), (True, True))
+def update_recall_query(update_recall:bool, update_title:bool)-> str:
     updates = []
+    if update_recall:
+        updates.append((RECALL_PROJECTS.recall, queries.placeholder()))
+        updates.append((RECALLS.recall_html, queries.placeholder()))
+        updates.append((RECALLS.recall_html_version, queries.placeholder()))
+    if update_title:
+        updates.append((RECALL_PROJECTS.recall_title, queries.placeholder()))
+
+    condition = (
+        (RECALLS.user_id == queries.placeholder()) & (RECALLS.recall_id == queries.placeholder())
+    )
+    query = queries.update_query(RECALLS, updates, condition)
+
+    return query.get_sql()
+
+def update_recall(recall_id:int, recall_title:str, recall:str, user_id:str)-> tuple[str, tuple]:
     values = []
     if recall:
-        updates.append((RECALL_PROJECTS.recall, Parameter("%s")))
         values.append(recall)
+        values.append(markdown_to_html(recall))
+        values.append(MARKDOWN_VERSION)
     if recall_title:
-        updates.append((RECALL_PROJECTS.recall_title, Parameter("%s")))
         values.append(recall_title)
 
-    if not updates:
+    if not values:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"A recall title or a recall should be pass to update",
             )
 
-    condition = (
-        (RECALLS.user_id == Parameter("%s")) & (RECALLS.recall_id == Parameter("%s"))
-    )
-
     values.append(user_id)
     values.append(recall_id)
 
+    query = update_recall_query(bool(recall), bool(recall_title))
+
+    return query, values
+
+@statement()
+def get_stale_recalls_query()-> str:
+    columns = [RECALLS.recall_id, RECALLS.recall]
+    condition = [
+        RECALLS.recall_id > queries.placeholder(),
+        RECALLS.recall_html_version.isnull() | (RECALLS.recall_html_version != queries.placeholder()),
+    ]
+    query = queries.select_query(RECALLS, columns, condition, order_by="recall_id", desc=False, limit=queries.placeholder())
+
+    return query.get_sql()
+
+@statement()
+def update_recall_html()-> str:
+    updates = [
+        (RECALLS.recall_html, queries.placeholder()),
+        (RECALLS.recall_html_version, queries.placeholder()),
+    ]
+    condition = (RECALLS.recall_id == queries.placeholder())
     query = queries.update_query(RECALLS, updates, condition)
 
-    return query.get_sql(), values
+    return query.get_sql()
 
+@statement()
 def delete_recall()-> str:
     condition = (
-        (RECALLS.recall_id == Parameter('%s')) & (RECALLS.user_id == Parameter('%s'))
+        (RECALLS.recall_id == queries.placeholder()) & (RECALLS.user_id == queries.placeholder())
     )
     query = queries.delete_query(RECALLS, condition)
 
     return query.get_sql()
 
+@statement()
 def delete_recalls()-> str:
     condition = (
-        (RECALLS.recall_project_id == Parameter('%s')) & (RECALLS.user_id == Parameter('%s'))
+        (RECALLS.recall_project_id == queries.placeholder()) & (RECALLS.user_id == queries.placeholder())
     )
     query = queries.delete_query(RECALLS, condition)
 
-    return query.get_sql()
\ No newline at end of file
+    return query.get_sql()
+
+
+# Data versions
+@statement()
+def bump_data_version()-> str:
+    columns = [VERSIONS.user_id, VERSIONS.table_name, VERSIONS.version, VERSIONS.modified_at]
+    keys = [VERSIONS.user_id, VERSIONS.table_name]
+    query = queries.upsert_query(VERSIONS, columns, [VERSIONS.version], keys, [VERSIONS.modified_at])
+
+    return query.get_sql()
+
+@statement()
+def get_data_version_query()-> str:
+    columns = [VERSIONS.version, VERSIONS.modified_at]
+    condition = [
+        VERSIONS.user_id == queries.placeholder(),
+        VERSIONS.table_name == queries.placeholder(),
+    ]
+    query = queries.select_query(VERSIONS, columns, condition)
+
+    return query.get_sql()
+
+async def get_data_version(user_id:str, table:str)-> Optional[dict]:
+    return await ADB.fetch_one(get_data_version_query(), (user_id, table))
+
+
+# Deletions
+# Tables emptied by deletions.py, the ones with a recall_project_id can
+# be scoped to a recall project
+DELETION_TABLES = {
+    table.get_table_name(): table
+    for table in (RECALLS, RECALL_PROJECTS, POMODOROS, ROLLUPS, PROJECTS, CATEGORIES, USERS)
+}
+DELETION_SHAPES = (
+    *((table, False) for table in DELETION_TABLES),
+    ('recalls', True), ('recall_projects', True),
+)
+DELETION_JOB_COLUMNS = [
+    DELETION_JOBS.job_id, DELETION_JOBS.user_id, DELETION_JOBS.target, DELETION_JOBS.target_id,
+    DELETION_JOBS.step, DELETION_JOBS.deleted, DELETION_JOBS.status,
+    DELETION_JOBS.created_at, DELETION_JOBS.updated_at,
+]
+
+@statement(*DELETION_SHAPES)
+def delete_chunk(table:str, by_recall_project:bool)-> str:
+    """ Deletes up to a limit of the user's rows, optionally of a recall project. """
+    table = DELETION_TABLES[table]
+    condition = (table.user_id == queries.placeholder())
+    if by_recall_project:
+        condition &= (table.recall_project_id == queries.placeholder())
+    query = queries.delete_query(table, condition, limit=queries.placeholder())
+
+    return query.get_sql()
+
+@statement()
+def create_deletion_job()-> str:
+    columns = DELETION_JOB_COLUMNS[1:]
+    query = queries.insert_query(DELETION_JOBS, columns)
+
+    return query.get_sql()
+
+@statement()
+def update_deletion_job()-> str:
+    updates = [
+        (DELETION_JOBS.step, queries.placeholder()),
+        (DELETION_JOBS.deleted, queries.placeholder()),
+        (DELETION_JOBS.status, queries.placeholder()),
+        (DELETION_JOBS.updated_at, queries.placeholder()),
+    ]
+    condition = (DELETION_JOBS.job_id == queries.placeholder())
+    query = queries.update_query(DELETION_JOBS, updates, condition)
+
+    return query.get_sql()
+
+@statement()
+def claim_deletion_job()-> str:
+    """ Takes over a job only while updated_at still holds the value that was read. """
+    updates = (DELETION_JOBS.updated_at, queries.placeholder())
+    condition = (
+        (DELETION_JOBS.job_id == queries.placeholder())
+        & (DELETION_JOBS.status == queries.placeholder())
+        & (DELETION_JOBS.updated_at == queries.placeholder())
+    )
+    query = queries.update_query(DELETION_JOBS, updates, condition)
+
+    return query.get_sql()
+
+@statement()
+def get_deletion_job_query()-> str:
+    condition = [
+        DELETION_JOBS.job_id == queries.placeholder(),
+        DELETION_JOBS.user_id == queries.placeholder(),
+    ]
+    query = queries.select_query(DELETION_JOBS, DELETION_JOB_COLUMNS, condition)
+
+    return query.get_sql()
+
+async def get_deletion_job(user_id:str, job_id:int)-> Optional[dict]:
+    return await ADB.fetch_one(get_deletion_job_query(), (job_id, user_id), primary=True)
+
+@statement()
+def get_stale_deletion_jobs_query()-> str:
+    condition = [
+        DELETION_JOBS.status == queries.placeholder(),
+        DELETION_JOBS.updated_at < queries.placeholder(),
+    ]
+    query = queries.select_query(DELETION_JOBS, DELETION_JOB_COLUMNS, condition, order_by="job_id", desc=False)
+
+    return query.get_sql()
+
+async def get_stale_deletion_jobs(status:str, updated_before)-> list[dict]:
+    return await ADB.fetch_all(get_stale_deletion_jobs_query(), (status, updated_before), primary=True)
+
+@statement()
+def get_user_email_query()-> str:
+    condition = [USERS.user_id == queries.placeholder()]
+    query = queries.select_query(USERS, [USERS.email], condition)
+
+    return query.get_sql()
+
+async def get_user_email(user_id:str)-> Optional[str]:
+    row = await ADB.fetch_one(get_user_email_query(), (user_id,), primary=True)
+    return row['email'] if row else None
+
+
+# Exports
+@statement()
+def export_pomodoros_query()-> str:
+    join_on = [
+        (PROJECTS, (POMODOROS.project_id == PROJECTS.project_id) & (POMODOROS.category_id == PROJECTS.category_id)),
+        (CATEGORIES, (CATEGORIES.category_id == POMODOROS.category_id))
+    ]
+    columns = [
+        POMODOROS.pomodoro_id, POMODOROS.category_id, CATEGORIES.category_name,
+        POMODOROS.project_id, PROJECTS.project_name, POMODOROS.pomodoro_date,
+        POMODOROS.duration, POMODOROS.pomodoro_satisfaction
+    ]
+    condition = [POMODOROS.user_id == queries.placeholder()]
+    query = queries.select_join_on_query(POMODOROS, join_on, columns, condition, [POMODOROS.pomodoro_id], desc=False)
+
+    return query.get_sql()
+
+@statement()
+def export_recalls_query()-> str:
+    join_on = [
+        (RECALL_PROJECTS, (RECALLS.user_id == RECALL_PROJECTS.user_id) & (RECALLS.recall_project_id == RECALL_PROJECTS.recall_project_id))
+    ]
+    columns = [
+        RECALLS.recall_id, RECALLS.recall_project_id, RECALL_PROJECTS.project_name,
+        RECALLS.recall_title, RECALLS.recall
+    ]
+    condition = [RECALLS.user_id == queries.placeholder()]
+    query = queries.select_join_on_query(RECALLS, join_on, columns, condition, [RECALLS.recall_id], desc=False)
+
+    return query.get_sql()
+
+# Exportable table -> statement, every statement only takes the user_id
+EXPORTS = {
+    'categories': lambda: get_categories_query(False, "category_id", 'all'),
+    'projects': lambda: get_projects_query(False, False, "project_id", False),
+    'pomodoros': export_pomodoros_query,
+    'recall_projects': lambda: get_recall_projects_query(False, "recall_project_id", False),
+    'recalls': export_recalls_query,
+}
+# The columns of every export statement, for the CSV header of an
+# export without rows
+EXPORT_COLUMNS = {
+    'categories': ('category_id', 'category_name'),
+    'projects': (
+        'project_id', 'category_id', 'category_name', 'project_name', 'start', 'end', 'canceled'
+    ),
+    'pomodoros': (
+        'pomodoro_id', 'category_id', 'category_name', 'project_id', 'project_name',
+        'pomodoro_date', 'duration', 'pomodoro_satisfaction'
+    ),
+    'recall_projects': ('recall_project_id', 'project_name'),
+    'recalls': ('recall_id', 'recall_project_id', 'project_name', 'recall_title', 'recall'),
+}
+
+async def export_rows(table:str, user_id:str):
+    """ Every row of `table` owned by the user, streamed in batches. """
+    async for rows in ADB.stream(EXPORTS[table](), (user_id,)):
+        yield rows
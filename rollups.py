@@ -0,0 +1,96 @@
+"""
+Incremental maintenance of the pomodoro_rollups summary table.
+
+Every pomodoro counts in one row per period (day, week and month). The
+functions take the cursor of an open transaction, so the rollups commit
+or roll back together with the pomodoro write.
+"""
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+import query as q
+
+# Constants
+PERIODS = ('day', 'week', 'month')
+SATISFACTION_COLUMNS = {1: 'good', 2: 'bad'}
+
+
+def period_starts(moment:datetime) -> list[tuple[str, date]]:
+    day = moment.date() if isinstance(moment, datetime) else moment
+    return [
+        ('day', day),
+        ('week', day - timedelta(days=day.weekday())),
+        ('month', day.replace(day=1)),
+    ]
+
+
+def rollup_values(
+        user_id:str, category_id:int, project_id:int, pomodoro_date:datetime,
+        minutes:int = 0, pomodoros:int = 0, good:int = 0, bad:int = 0
+    ) -> list[tuple]:
+    return [
+        (user_id, period, period_start, category_id, project_id, minutes, pomodoros, good, bad)
+        for period, period_start in period_starts(pomodoro_date)
+    ]
+
+
+def satisfaction_deltas(old:Optional[int], new:Optional[int]) -> dict:
+    deltas = {'good': 0, 'bad': 0}
+    if old in SATISFACTION_COLUMNS:
+        deltas[SATISFACTION_COLUMNS[old]] -= 1
+    if new in SATISFACTION_COLUMNS:
+        deltas[SATISFACTION_COLUMNS[new]] += 1
+
+    return deltas
+
+
+async def add_pomodoro(
+        cursor, user_id:str, category_id:int, project_id:int,
+        duration:int, pomodoro_date:datetime, satisfaction:Optional[int] = None
+    ) -> None:
+    await add_pomodoros(cursor, user_id, [(category_id, project_id, duration, pomodoro_date, satisfaction)])
+
+
+async def add_pomodoros(cursor, user_id:str, pomodoros:list[tuple]) -> None:
+    """
+    Count many pomodoros, given as (category_id, project_id, duration,
+    pomodoro_date, satisfaction) tuples. They are summed per rollup row
+    first, so a batch costs one upsert per row it touches.
+    """
+    values = rollup_totals(user_id, pomodoros)
+    if values:
+        await cursor.executemany(q.add_pomodoro_rollup(), values)
+
+
+def rollup_totals(user_id:str, pomodoros:list[tuple]) -> list[tuple]:
+    """ add_pomodoro_rollup values of the pomodoros, one per rollup row. """
+    totals = defaultdict(lambda: [0, 0, 0, 0])
+    for category_id, project_id, duration, pomodoro_date, satisfaction in pomodoros:
+        deltas = satisfaction_deltas(None, satisfaction)
+        for period, period_start in period_starts(pomodoro_date):
+            total = totals[(period, period_start, category_id, project_id)]
+            total[0] += duration
+            total[1] += 1
+            total[2] += deltas['good']
+            total[3] += deltas['bad']
+
+    return [(user_id, *key, *total) for key, total in totals.items()]
+
+
+async def rate_pomodoro(cursor, user_id:str, pomodoro_id:int, satisfaction:int) -> bool:
+    """ Rate a pomodoro and move its rollup counts, False if it does not exist. """
+    await cursor.execute(q.get_rated_pomodoro(), (pomodoro_id, user_id))
+    pomodoro = await cursor.fetchone()
+    if pomodoro is None:
+        return False
+
+    category_id, project_id, pomodoro_date, previous = pomodoro
+    await cursor.execute(q.update_pomodoro_satisfaction(), (satisfaction, pomodoro_id, user_id))
+
+    deltas = satisfaction_deltas(previous, satisfaction)
+    if any(deltas.values()):
+        values = rollup_values(user_id, category_id, project_id, pomodoro_date, **deltas)
+        await cursor.executemany(q.add_pomodoro_rollup(), values)
+
+    return True
@@ -1,13 +1,15 @@
 from typing import Optional
 
-from fastapi import APIRouter, status, Depends, HTTPException, Request, Header, Form
+from fastapi import APIRouter, status, Depends, HTTPException, Request, Response, Header, Form
 from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
 
 from models import CategoryResponse, ResponseUser
-from data import DB
+from data import ADB
+from fragments import FRAGMENTS
 import query as q
 from utils import get_current_user, get_categories_list
+import versions
 
 templates = Jinja2Templates(directory="templates")
 
@@ -22,13 +24,15 @@ router = APIRouter(
     response_class=HTMLResponse,
     summary="Category creation"
 )
-def create_category(request:Request, category_name:str = Form(...), current_user:ResponseUser = Depends(get_current_user)):
+async def create_category(request:Request, category_name:str = Form(...), current_user:ResponseUser = Depends(get_current_user)):
     user_id = current_user['user_id']
     values = (category_name, user_id)
     query = q.create_category()
-    DB.execute_query(query, values)
+    async with ADB.transaction() as cursor:
+        await cursor.execute(query, values)
+        await versions.bump(cursor, user_id, 'categories')
 
-    categories = get_categories_list(user_id)
+    categories = await get_categories_list(user_id)
     context = {
         'request': request,
         'categories': categories
@@ -42,17 +46,22 @@ def create_category(request:Request, category_name:str = Form(...), current_user
     status_code=status.HTTP_200_OK,
     summary="Get categories"
 )
-def get_categories(request:Request, current_user:ResponseUser = Depends(get_current_user), hx_request: Optional[str] = Header(None)):
+async def get_categories(request:Request, current_user:ResponseUser = Depends(get_current_user), hx_request: Optional[str] = Header(None)):
     user_id = current_user['user_id']
-    categories = get_categories_list(user_id)
-    context = {
-        'request': request,
-        'categories': categories
-    }
+
+    async def render(template:str):
+        categories = await get_categories_list(user_id)
+        context = {
+            'request': request,
+            'categories': categories
+        }
+        return templates.TemplateResponse(template, context=context)
 
     if hx_request:
-        return templates.TemplateResponse("components/categories.html", context=context)
-    return templates.TemplateResponse("general_pages/categories.html", context=context)
+        return await FRAGMENTS.response(
+            request, user_id, "categories", (), ('categories',), lambda: render("components/categories.html")
+        )
+    return await render("general_pages/categories.html")
 
 
 
@@ -63,16 +72,21 @@ def get_categories(request:Request, current_user:ResponseUser = Depends(get_curr
     summary="Get category"
 )
 
-def get_category(category_id:int, current_user:ResponseUser = Depends(get_current_user)):
+async def get_category(request:Request, response:Response, category_id:int, current_user:ResponseUser = Depends(get_current_user)):
     user_id = current_user['user_id']
+    version = await versions.current(user_id, 'categories')
+    if versions.is_fresh(request, version):
+        return versions.not_modified(version)
+    response.headers.update(version.headers())
+
     values = (user_id, category_id)
-    df = q.get_categories(values, category_id)
+    categories = await q.get_categories(values, category_id)
 
-    if df.empty:
+    if not categories:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="This category does not exists"
         )
-    category = df.to_dict('records')[0]
+    category = categories[0]
     return category
 
 
@@ -82,11 +96,13 @@ def get_category(category_id:int, current_user:ResponseUser = Depends(get_curren
     status_code=status.HTTP_200_OK,
     summary="Update category"
 )
-def update_category(request: Request, category_id:int, category_name:str = Form(...), current_user:ResponseUser = Depends(get_current_user)):
+async def update_category(request: Request, category_id:int, category_name:str = Form(...), current_user:ResponseUser = Depends(get_current_user)):
     user_id = current_user['user_id']
     values = (category_name, category_id, user_id)
     query = q.update_category()
-    DB.execute_query(query, values)
+    async with ADB.transaction() as cursor:
+        await cursor.execute(query, values)
+        await versions.bump(cursor, user_id, 'categories')
 
     context = {
         "request": request,
@@ -104,11 +120,13 @@ def update_category(request: Request, category_id:int, category_name:str = Form(
     summary="Delete category",
     response_class=HTMLResponse
 )
-def delete_category(category_id:int, current_user:ResponseUser = Depends(get_current_user)):
+async def delete_category(category_id:int, current_user:ResponseUser = Depends(get_current_user)):
     user_id = current_user['user_id']
     values = (category_id, user_id)
     query = q.delete_category()
-    DB.execute_query(query, values)
+    async with ADB.transaction() as cursor:
+        await cursor.execute(query, values)
+        await versions.bump(cursor, user_id, 'categories')
 
     return "<tr></tr>"
 
@@ -117,14 +135,14 @@ def delete_category(category_id:int, current_user:ResponseUser = Depends(get_cur
     include_in_schema=False,
     response_class=HTMLResponse
 )
-def edit_recall_project(category_id:int, request:Request, 
+async def edit_recall_project(category_id:int, request:Request, 
     current_user:ResponseUser = Depends(get_current_user)
     ):
     user_id = current_user['user_id']
     values = [user_id, category_id]
-    df = q.get_categories(values, category_id)
+    categories = await q.get_categories(values, category_id)
 
-    category = df.to_dict('records')[0]
+    category = categories[0]
     context = {
         "request": request,
         "category": category
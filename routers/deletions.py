@@ -0,0 +1,33 @@
+from fastapi import APIRouter, status, Depends, HTTPException
+
+from deletions import progress
+from models import DeletionJobResponse, ResponseUser
+import query as q
+from utils import get_current_user
+
+router = APIRouter(
+    prefix='/deletions',
+    tags=["Deletions"]
+)
+
+
+@router.get(
+    path="/{job_id}",
+    response_model=DeletionJobResponse,
+    status_code=status.HTTP_200_OK,
+    summary="Progress of a deletion"
+)
+async def get_deletion(job_id:int, current_user:ResponseUser = Depends(get_current_user)):
+    """
+    Progress of a background delete started by DELETE /users/,
+    /recall_projects/{id} or /recalls/recall-project/{id}: the step it's
+    on out of `steps`, the table being emptied and the rows deleted so
+    far. A deleted user can't authenticate anymore to see the last one.
+    """
+    job = await q.get_deletion_job(current_user['user_id'], job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="This deletion does not exist"
+        )
+
+    return progress(job)
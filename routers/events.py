@@ -0,0 +1,55 @@
+from fastapi import APIRouter, status, Depends
+from fastapi.responses import StreamingResponse
+
+import events
+from events import BROKER
+from models import ResponseUser
+from sessions import SESSIONS
+from utils import get_current_user
+
+router = APIRouter(
+    prefix='/events',
+    tags=["Events"]
+)
+
+
+async def stream(user_id:str):
+    # Subscribed before the snapshot is taken, no event falls in between
+    subscriber = BROKER.subscribe(user_id)
+    # Starlette cancels the generator when the client disconnects
+    try:
+        yield f"retry: {events.RETRY}\n\n".encode()
+        session = SESSIONS.current(user_id)
+        if session is not None:
+            yield events.encode('timer', events.timer_data(session))
+
+        while True:
+            frame = await subscriber.get()
+            if frame is None:
+                break
+            yield frame
+    finally:
+        BROKER.unsubscribe(subscriber)
+
+
+@router.get(
+    path="/",
+    response_class=StreamingResponse,
+    status_code=status.HTTP_200_OK,
+    summary="Stream the user's events"
+)
+async def get_events(current_user:ResponseUser = Depends(get_current_user)):
+    """
+    Server-Sent Events of the user: "timer" with the session of the
+    pomodoro when it's started, paused, resumed, reset or completed,
+    "pomodoro-created" and "pomodoro-rated". The stream starts with the
+    current session, so a reconnecting client catches up.
+    """
+    user_id = current_user['user_id']
+    headers = {
+        'Cache-Control': "no-cache",
+        # nginx would buffer the stream otherwise
+        'X-Accel-Buffering': "no",
+    }
+
+    return StreamingResponse(stream(user_id), media_type="text/event-stream", headers=headers)
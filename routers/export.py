@@ -0,0 +1,47 @@
+from enum import Enum
+
+from fastapi import APIRouter, status, Depends
+from fastapi.responses import StreamingResponse
+
+import exports
+from models import ResponseUser
+import query as q
+from utils import get_current_user
+
+router = APIRouter(
+    prefix='/export',
+    tags=["Export"]
+)
+
+ExportTable = Enum('ExportTable', {table: table for table in q.EXPORTS})
+ExportFormat = Enum('ExportFormat', {format: format for format in exports.FORMATS})
+
+
+@router.get(
+    path="/{table}",
+    response_class=StreamingResponse,
+    status_code=status.HTTP_200_OK,
+    summary="Export a table"
+)
+async def export_table(
+        table:ExportTable,
+        format:ExportFormat = ExportFormat.csv,
+        gzip:bool = False,
+        current_user:ResponseUser = Depends(get_current_user)
+    ):
+    """
+    Download every row of `table` owned by the user as CSV or NDJSON,
+    optionally gzipped. Rows are streamed from a server-side cursor.
+    """
+    user_id = current_user['user_id']
+    media_type, extension = exports.FORMATS[format.value]
+    filename = f"{table.value}.{extension}"
+    if gzip:
+        media_type = "application/gzip"
+        filename += ".gz"
+
+    batches = q.export_rows(table.value, user_id)
+    chunks = exports.encode(batches, format.value, q.EXPORT_COLUMNS[table.value], compress=gzip)
+    headers = {'Content-Disposition': f'attachment; filename="{filename}"'}
+
+    return StreamingResponse(chunks, media_type=media_type, headers=headers)
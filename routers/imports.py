@@ -0,0 +1,49 @@
+import json
+
+from fastapi import APIRouter, status, Depends, File, HTTPException, UploadFile
+from fastapi.responses import StreamingResponse
+
+import imports
+from models import ResponseUser
+from utils import get_current_user
+
+router = APIRouter(
+    prefix='/import',
+    tags=["Import"]
+)
+
+
+@router.post(
+    path="/",
+    response_class=StreamingResponse,
+    status_code=status.HTTP_200_OK,
+    summary="Import pomodoros and recalls"
+)
+async def import_file(
+        file:UploadFile = File(...),
+        current_user:ResponseUser = Depends(get_current_user)
+    ):
+    """
+    Import a .csv or .ndjson file (optionally .gz) of pomodoros and
+    recalls, like the ones from /export, or a .zip of markdown files
+    with a recall project per directory. Categories, projects and recall
+    projects are matched by name and created when missing.
+
+    The response streams one JSON line of progress per written chunk,
+    the last one has `done` set.
+    """
+    try:
+        rows = imports.read_upload(file.file, file.filename)
+    except imports.InvalidUpload as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    importer = imports.Importer(current_user['user_id'])
+
+    async def progress_lines():
+        try:
+            async for progress in importer.run(rows):
+                yield json.dumps(progress) + "\n"
+        finally:
+            await file.close()
+
+    return StreamingResponse(progress_lines(), media_type="application/x-ndjson")
@@ -1,14 +1,30 @@
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+import json
 import random
+from typing import Optional
 
-from fastapi import APIRouter, status, Depends, HTTPException, Form, Request
+from fastapi import APIRouter, status, Body, Depends, HTTPException, Form, Request, Response, Header, Query
 from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
+from pydantic import ValidationError
 
-from models import PomodoroResponse, ResponseUser, Satisfaction
-from data import DB
+from models import (
+    PomodoroImport, PomodoroImportResponse, PomodoroImportResult, PomodoroResponse,
+    PomodoroSessionResponse, PomodoroStatsResponse, Period, ResponseUser, Satisfaction,
+    SessionAction, SessionState, StatsGroup
+)
+from config import settings
+from data import ADB
+import events
 import query as q
-from utils import get_current_user, get_satisfaction_int
+import rollups
+from sessions import SESSIONS, PomodoroSession, SessionError
+from utils import get_current_user, get_satisfaction_int, get_satisfaction_name, to_local_naive
+import versions
+
+# Constants
+PAGE_SIZE = 50
+BATCH_LIMIT = getattr(settings, 'POMODORO_BATCH_LIMIT', 10000)
 
 templates = Jinja2Templates(directory="templates")
 
@@ -25,19 +41,30 @@ router = APIRouter(
     status_code=status.HTTP_200_OK,
     include_in_schema=False
 )
-def get_pomodoros_home(request:Request, current_user:ResponseUser = Depends(get_current_user)):
+async def get_pomodoros_home(request:Request, before_date:Optional[datetime] = None,
+        before_id:Optional[int] = None, current_user:ResponseUser = Depends(get_current_user),
+        hx_request: Optional[str] = Header(None)
+    ):
     user_id = current_user['user_id']
 
     previous_30_days = datetime.today() - timedelta(days=30)
     values = (user_id, previous_30_days)
-    df = q.get_pomodoros(values, all=True)
+    cursor = (before_date, before_id) if before_date and before_id else None
+    # One extra row tells if there is a next page
+    pomodoros = await q.get_pomodoros(values, all=True, cursor=cursor, limit=PAGE_SIZE + 1)
+    last_pomodoro = pomodoros[PAGE_SIZE - 1] if len(pomodoros) > PAGE_SIZE else None
+    pomodoros = pomodoros[:PAGE_SIZE]
+    for pomodoro in pomodoros:
+        pomodoro['pomodoro_satisfaction'] = get_satisfaction_name(pomodoro['pomodoro_satisfaction'])
 
-    pomodoros = df.to_dict('records')
     context = {
         'request': request,
-        'pomodoros': pomodoros
+        'pomodoros': pomodoros,
+        'last_pomodoro': last_pomodoro,
     }
 
+    if hx_request and cursor:
+        return templates.TemplateResponse("components/pomodoros_rows.html", context=context)
     return templates.TemplateResponse("general_pages/pomodoros.html", context=context)
 
 @router.post(
@@ -46,7 +73,7 @@ def get_pomodoros_home(request:Request, current_user:ResponseUser = Depends(get_
     summary="Create pomodoro",
     response_class=HTMLResponse
 )
-def create_pomodoro(
+async def create_pomodoro(
         category_id:int = Form(...),
         project_id:int = Form(...),
         duration:int = Form(...),
@@ -60,32 +87,177 @@ def create_pomodoro(
     )
     query = q.create_pomodoro()
 
-    # Execute query
-    DB.execute_query(query, values)
+    # Execute query, the rollups are updated in the same transaction
+    async def insert(cursor) -> int:
+        await cursor.execute(query, values)
+        pomodoro_id = cursor.lastrowid
+        await rollups.add_pomodoro(cursor, user_id, category_id, project_id, duration, pomodoro_date)
+        await versions.bump(cursor, user_id, 'pomodoros')
+        return pomodoro_id
+
+    # Everyone starts a pomodoro at the top of the hour, the inserts
+    # share commits in write-behind mode
+    pomodoro_id = await ADB.submit(insert)
+
+    # The timer drives the session with the pomodoro_id
+    session = SESSIONS.open(pomodoro_id, user_id, duration * 60)
+    # The user's other devices take the new pomodoro for their timer
+    events.publish(user_id, 'pomodoro-created', events.timer_data(session))
 
     color = "#{:06x}".format(random.randint(0, 0xFFFFFF))
 
-    return f'<h3 style="color:{color};" id="placeholder">Pomodoro created, Start the timer</h3>'
+    return (
+        f'<h3 style="color:{color};" id="placeholder" data-pomodoro-id="{pomodoro_id}" '
+        f'data-duration="{duration * 60}">Pomodoro created, Start the timer</h3>'
+    )
+
+
+@router.post(
+    path="/batch",
+    response_model=PomodoroImportResponse,
+    status_code=status.HTTP_200_OK,
+    summary="Create many pomodoros"
+)
+async def create_pomodoros(
+        pomodoros:list[dict] = Body(...),
+        current_user:ResponseUser = Depends(get_current_user)
+    ):
+    """
+    Create pomodoros recorded elsewhere, with their own pomodoro_date and
+    optional satisfaction. Every item is validated on its own, the valid
+    ones are written in a single transaction and the response tells the
+    result of each item by its index.
+    """
+    if len(pomodoros) > BATCH_LIMIT:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"A batch can have up to {BATCH_LIMIT} pomodoros"
+        )
+
+    user_id = current_user['user_id']
+    # Project ID -> category ID of the user projects
+    projects = await q.get_projects((user_id,))
+    project_categories = {project['project_id']: project['category_id'] for project in projects}
+    now = datetime.today()
+
+    results = []
+    rows = []
+    for index, item in enumerate(pomodoros):
+        try:
+            pomodoro = PomodoroImport(**item)
+            pomodoro_date = to_local_naive(pomodoro.pomodoro_date)
+        except ValidationError as e:
+            errors = [f"{'.'.join(map(str, error['loc']))}: {error['msg']}" for error in e.errors()]
+            results.append(PomodoroImportResult(index=index, created=False, errors=errors))
+            continue
+
+        if project_categories.get(pomodoro.project_id) != pomodoro.category_id:
+            errors = ["project not found in this category"]
+        elif pomodoro_date > now:
+            errors = ["pomodoro_date is in the future"]
+        else:
+            errors = []
+
+        if errors:
+            results.append(PomodoroImportResult(index=index, created=False, errors=errors))
+            continue
+
+        satisfaction = pomodoro.pomodoro_satisfaction
+        satisfaction = get_satisfaction_int(satisfaction.value) if satisfaction else None
+        rows.append((
+            pomodoro.category_id, pomodoro.project_id, pomodoro.duration,
+            pomodoro_date, satisfaction
+        ))
+        results.append(PomodoroImportResult(index=index, created=True))
+
+    # executemany sends the inserts as multi-row statements
+    if rows:
+        async with ADB.transaction() as cursor:
+            await cursor.executemany(q.create_rated_pomodoro(), [(*row, user_id) for row in rows])
+            await rollups.add_pomodoros(cursor, user_id, rows)
+            await versions.bump(cursor, user_id, 'pomodoros')
+
+    return PomodoroImportResponse(created=len(rows), rejected=len(pomodoros) - len(rows), results=results)
+
+
+async def get_session(user_id:str, pomodoro_id:int) -> PomodoroSession:
+    """ The session of the pomodoro, opened again from its row when it was lost. """
+    session = SESSIONS.get(user_id, pomodoro_id)
+    if session is None:
+        pomodoro = await q.get_pomodoro_session(user_id, pomodoro_id)
+        if pomodoro is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND, detail="This pomodoro does not exist"
+            )
+
+        state = SessionState.created if pomodoro['completed_at'] is None else SessionState.completed
+        session = SESSIONS.open(pomodoro_id, user_id, pomodoro['duration'] * 60, state)
+
+    return session
+
+@router.post(
+    path="/{pomodoro_id}/{action}",
+    response_model=PomodoroSessionResponse,
+    status_code=status.HTTP_200_OK,
+    summary="Start, pause, resume or complete a pomodoro"
+)
+async def update_pomodoro_session(pomodoro_id:int, action:SessionAction, current_user:ResponseUser = Depends(get_current_user)):
+    user_id = current_user['user_id']
+    session = await get_session(user_id, pomodoro_id)
+
+    # No await between the check and the transition, of two concurrent
+    # requests on the session only one moves it
+    try:
+        SESSIONS.transition(session, action.value)
+    except SessionError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
 
+    if action is SessionAction.complete:
+        # The only state that is stored, it's acknowledged once committed
+        try:
+            await ADB.write(q.complete_pomodoro(), (datetime.today(), pomodoro_id, user_id))
+        except BaseException:
+            # Opened again from its row, which isn't completed
+            SESSIONS.close(pomodoro_id)
+            raise
+
+    events.publish_timer(session)
+
+    return session.view()
 
 @router.put(
-    path="/",
+    path="/{pomodoro_id}/satisfaction",
     status_code=status.HTTP_200_OK,
     summary="Measure pomodoro satisfaction",
     response_class=HTMLResponse,
 )
-def update_pomodoro_satisfaction(request: Request, satisfaction:Satisfaction = Form(...), current_user:ResponseUser = Depends(get_current_user)):
+async def update_pomodoro_satisfaction(pomodoro_id:int, satisfaction:Satisfaction = Form(...), current_user:ResponseUser = Depends(get_current_user)):
     user_id = current_user['user_id']
-    values = (user_id,)
-    df = q.get_latest_pomodoro(values)
-    pomodoro = df.to_dict('records')[0]
+    session = SESSIONS.get(user_id, pomodoro_id)
+    if session is not None and session.state in (SessionState.running, SessionState.paused):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT, detail="The pomodoro is still running"
+        )
 
     satisfaction = get_satisfaction_int(satisfaction.value)
-    values = (satisfaction, pomodoro['pomodoro_id'], user_id)
-    query = q.update_pomodoro_satisfaction()
 
-    # Execute query
-    DB.execute_query(query, values)
+    # Execute query, the rollups are updated in the same transaction
+    async def rate(cursor) -> bool:
+        rated = await rollups.rate_pomodoro(cursor, user_id, pomodoro_id, satisfaction)
+        if rated:
+            await versions.bump(cursor, user_id, 'pomodoros')
+        return rated
+
+    rated = await ADB.submit(rate)
+
+    if not rated:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="This pomodoro does not exist"
+        )
+
+    # Rating ends the session
+    SESSIONS.close(pomodoro_id)
+    events.publish(user_id, 'pomodoro-rated', json.dumps({'pomodoro_id': pomodoro_id}))
 
     return '<p id="pomodoro-confirmation">Sent</p>'
 
@@ -96,29 +268,71 @@ def update_pomodoro_satisfaction(request: Request, satisfaction:Satisfaction = F
     response_class=HTMLResponse,
     include_in_schema=False,
 )
-def get_satisfaction_modal(request:Request, current_user:ResponseUser = Depends(get_current_user)):
+async def get_satisfaction_modal(request:Request, current_user:ResponseUser = Depends(get_current_user)):
     return '<div id="pomodoro-confirmation"></div>'
 
+@router.get(
+    path="/stats",
+    response_model=list[PomodoroStatsResponse],
+    status_code=status.HTTP_200_OK,
+    summary="Pomodoro statistics"
+)
+async def get_pomodoro_stats(
+        start:date = Query(...),
+        end:date = Query(...),
+        period:Period = Query(Period.day),
+        group_by:StatsGroup = Query(StatsGroup.project),
+        category_id:Optional[int] = Query(None, gt=0),
+        project_id:Optional[int] = Query(None, gt=0),
+        current_user:ResponseUser = Depends(get_current_user)
+    ):
+    """
+    Minutes, pomodoros and good/bad ratings per day, week or month read
+    from the rollup table. Weeks start on monday, the periods that
+    contain `start` and `end` are included whole.
+    """
+    if start > end:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="start has to be before end"
+        )
+
+    # Rows are keyed by the first day of their period, a start in the
+    # middle of one would leave it out
+    start = dict(rollups.period_starts(start))[period.value]
+    user_id = current_user['user_id']
+    stats = await q.get_pomodoro_stats(
+        user_id, period.value, start, end, group_by.value,
+        category_id=category_id, project_id=project_id
+    )
+
+    return stats
+
 @router.get(
     path="/{category_id}/{project_id}",
     response_model=list[PomodoroResponse],
     status_code=status.HTTP_200_OK,
     summary="Get pomodoros in a project"
 )
-def get_pomodoro(category_id:int, project_id:int, current_user:ResponseUser = Depends(get_current_user)):
+async def get_pomodoro(request:Request, response:Response, category_id:int, project_id:int,
+        current_user:ResponseUser = Depends(get_current_user)
+    ):
     user_id = current_user['user_id']
+    version = await versions.current(user_id, 'pomodoros')
+    if versions.is_fresh(request, version):
+        return versions.not_modified(version)
+    response.headers.update(version.headers())
+
     values = (user_id, category_id, project_id)
 
-    df = q.get_pomodoros(values)
-    if df.empty:
+    pomodoros = await q.get_pomodoros(values)
+    if not pomodoros:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="There are not pomodoros for this project"
         )
 
     # Satisfaction
-    df.pomodoro_satisfaction.fillna("", inplace=True)
-    satisfaction = {0: "missing", 1: "good", 2: "bad"}
-    df.pomodoro_satisfaction.replace(satisfaction, inplace=True)
+    for pomodoro in pomodoros:
+        pomodoro['pomodoro_satisfaction'] = get_satisfaction_name(pomodoro['pomodoro_satisfaction'])
 
-    return df.to_dict('records')
+    return pomodoros
 
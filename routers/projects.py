@@ -6,9 +6,11 @@ from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
 
 from models import ResponseUser
-from data import DB
+from data import ADB
+from fragments import FRAGMENTS
 import query as q
-from utils import get_current_user, get_current_endpoint, get_categories_list
+from utils import get_current_user, get_current_endpoint, get_categories_list, fill_missing
+import versions
 
 templates = Jinja2Templates(directory="templates")
 
@@ -25,7 +27,7 @@ router = APIRouter(
     status_code=status.HTTP_201_CREATED,
     summary="Create project"
 )
-def create_project(request:Request, category_id:int = Form(...), 
+async def create_project(request:Request, category_id:int = Form(...), 
         project_name:str = Form(...), current_user:ResponseUser = Depends(get_current_user)
     ):
     user_id = current_user['user_id']
@@ -34,10 +36,12 @@ def create_project(request:Request, category_id:int = Form(...),
     query = q.create_project()
 
     # Execute query
-    DB.execute_query(query, values)
+    async with ADB.transaction() as cursor:
+        await cursor.execute(query, values)
+        await versions.bump(cursor, user_id, 'projects')
 
     # Get categories
-    categories = get_categories_list(user_id)
+    categories = await get_categories_list(user_id)
     context = {
         'request': request,
         'categories': categories
@@ -52,7 +56,7 @@ def create_project(request:Request, category_id:int = Form(...),
     response_class=HTMLResponse,
     include_in_schema=False
 )
-def get_projects(request: Request, current_user:ResponseUser = Depends(get_current_user)):
+async def get_projects(request: Request, current_user:ResponseUser = Depends(get_current_user)):
     return templates.TemplateResponse("/general_pages/projects.html", {"request": request})
 
 @router.delete(
@@ -61,13 +65,15 @@ def get_projects(request: Request, current_user:ResponseUser = Depends(get_curre
     summary="Delete project",
     response_class=HTMLResponse
 )
-def delete_project(request: Request, project_id:int = Path(...), current_user:ResponseUser = Depends(get_current_user)):
+async def delete_project(request: Request, project_id:int = Path(...), current_user:ResponseUser = Depends(get_current_user)):
     user_id = current_user['user_id']
     values = (project_id, user_id)
     query = q.delete_project()
     
     # Execute query
-    DB.execute_query(query, values)
+    async with ADB.transaction() as cursor:
+        await cursor.execute(query, values)
+        await versions.bump(cursor, user_id, 'projects')
 
     return "<tr></tr>"
 
@@ -77,14 +83,18 @@ def delete_project(request: Request, project_id:int = Path(...), current_user:Re
     status_code=status.HTTP_200_OK,
     summary="Finish a project"
 )
-def update_project(category_id:int, project_id:int, current_user:ResponseUser = Depends(get_current_user)):
+async def update_project(category_id:int, project_id:int, current_user:ResponseUser = Depends(get_current_user)):
     user_id = current_user['user_id']
     end = datetime.today().date()
-    values = (end, category_id, project_id, user_id)
+    values = (end, project_id, user_id)
     query = q.update_project('end')
 
     # Execute query
-    DB.execute_query(query, values)
+    async def update(cursor) -> None:
+        await cursor.execute(query, values)
+        await versions.bump(cursor, user_id, 'projects')
+
+    await ADB.submit(update)
 
     return {
         'Detail': f"The end date for project {project_id} has been updated to {end}"
@@ -95,14 +105,18 @@ def update_project(category_id:int, project_id:int, current_user:ResponseUser =
     status_code=status.HTTP_200_OK,
     summary="Cancel a project"
 )
-def update_project(category_id:int, project_id:int, current_user:ResponseUser = Depends(get_current_user)):
+async def update_project(category_id:int, project_id:int, current_user:ResponseUser = Depends(get_current_user)):
     user_id = current_user['user_id']
     canceled = datetime.today().date()
-    values = (canceled, category_id, project_id, user_id)
+    values = (canceled, project_id, user_id)
     query = q.update_project('canceled')
     
     # Execute query
-    DB.execute_query(query, values)
+    async def update(cursor) -> None:
+        await cursor.execute(query, values)
+        await versions.bump(cursor, user_id, 'projects')
+
+    await ADB.submit(update)
 
     return {
         'Detail': f"The canceled date for project {project_id} has been updated to {canceled}"
@@ -114,20 +128,21 @@ def update_project(category_id:int, project_id:int, current_user:ResponseUser =
     status_code=status.HTTP_200_OK,
     summary="Cancel a project"
 )
-def update_project(request: Request, project_id:int = Path(...,), new_project_name:str = Form(...), current_user:ResponseUser = Depends(get_current_user)):
+async def update_project(request: Request, project_id:int = Path(...,), new_project_name:str = Form(...), current_user:ResponseUser = Depends(get_current_user)):
     user_id = current_user['user_id']
     values = (new_project_name, project_id, user_id)
     query = q.update_project('project_name')
     
     # Execute query
-    DB.execute_query(query, values)
+    async with ADB.transaction() as cursor:
+        await cursor.execute(query, values)
+        await versions.bump(cursor, user_id, 'projects')
 
     # Get project with new data
     values = [user_id, project_id]
-    df = q.get_projects(values, project_id=project_id)
+    projects = await q.get_projects(values, project_id=project_id)
 
-    df.fillna("", inplace=True)
-    project = df.to_dict('records')[0]
+    project = fill_missing(projects)[0]
     context = {
         "request": request,
         "project": project
@@ -142,27 +157,32 @@ def update_project(request: Request, project_id:int = Path(...,), new_project_na
     summary="Get projects",
     response_class=HTMLResponse
 )
-def get_projects_names(request: Request, category_id:int = Query(...), current_user:ResponseUser = Depends(get_current_user)):
+async def get_projects_names(request: Request, category_id:int = Query(...), current_user:ResponseUser = Depends(get_current_user)):
     user_id = current_user['user_id']
-    values = (user_id, category_id)
-    df = q.get_projects(values, category_id=category_id)
-    if df.empty:
-        return '<select id="project-names" name="project_id"></select>'
-    df.fillna("", inplace=True)
-    projects = df.to_dict('records')
-    context = {
-        'request': request,
-        'projects': projects
-    }
     current_url = request.headers.get('hx-current-url')
     endpoint = get_current_endpoint(current_url)
 
-    if endpoint == "pomodoro":
-        return templates.TemplateResponse("/components/projects.html", context=context)
-    elif endpoint == "projects":
-        return templates.TemplateResponse("/components/projects_table.html", context=context)
-    else:
-        raise ValueError(f"Current url is {endpoint}, it does not match pomodoro or projects")
+    async def render():
+        values = (user_id, category_id)
+        projects = await q.get_projects(values, category_id=category_id)
+        if not projects:
+            return '<select id="project-names" name="project_id"></select>'
+        projects = fill_missing(projects)
+        context = {
+            'request': request,
+            'projects': projects
+        }
+
+        if endpoint == "pomodoro":
+            return templates.TemplateResponse("/components/projects.html", context=context)
+        elif endpoint == "projects":
+            return templates.TemplateResponse("/components/projects_table.html", context=context)
+        else:
+            raise ValueError(f"Current url is {endpoint}, it does not match pomodoro or projects")
+
+    return await FRAGMENTS.response(
+        request, user_id, "projects", (endpoint, category_id), ('projects',), render
+    )
     
 
 @router.get(
@@ -170,15 +190,14 @@ def get_projects_names(request: Request, category_id:int = Query(...), current_u
     include_in_schema=False,
     response_class=HTMLResponse
 )
-def edit_recall_project(request:Request, project_id:int = Path(...,), 
+async def edit_recall_project(request:Request, project_id:int = Path(...,), 
     current_user:ResponseUser = Depends(get_current_user)
     ):
     user_id = current_user['user_id']
     values = [user_id, project_id]
-    df = q.get_projects(values, project_id=project_id)
+    projects = await q.get_projects(values, project_id=project_id)
 
-    df.fillna("", inplace=True)
-    project = df.to_dict('records')[0]
+    project = fill_missing(projects)[0]
     context = {
         "request": request,
         "project": project
@@ -192,11 +211,11 @@ def edit_recall_project(request:Request, project_id:int = Path(...,),
     status_code=status.HTTP_200_OK,
     summary="Create project"
 )
-def create_project_form(request:Request, current_user:ResponseUser = Depends(get_current_user)
+async def create_project_form(request:Request, current_user:ResponseUser = Depends(get_current_user)
     ):
     user_id = current_user['user_id']
     # Get categories
-    categories = get_categories_list(user_id)
+    categories = await get_categories_list(user_id)
     context = {
         'request': request,
         'categories': categories
@@ -1,14 +1,16 @@
 from typing import Optional
 
-from fastapi import APIRouter, status, Depends, HTTPException, Form, Request, Header
+from fastapi import APIRouter, status, Depends, HTTPException, Form, Request, Response, Header
 from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
-from mysql.connector.errors import IntegrityError
 
-from models import RecallProjectResponse, ResponseUser
-from data import DB
+from models import DeletionTarget, RecallProjectResponse, ResponseUser
+from data import ADB, IntegrityError
+from deletions import DELETIONS
+from fragments import FRAGMENTS
 import query as q
 from utils import get_current_user, get_current_endpoint
+import versions
 
 
 templates = Jinja2Templates(directory="templates")
@@ -24,7 +26,7 @@ router = APIRouter(
     status_code=status.HTTP_201_CREATED,
     summary="Create a recall project"
 )
-def create_recall_project(
+async def create_recall_project(
     request: Request,
     project_name: str = Form(...),
     current_user:ResponseUser = Depends(get_current_user),
@@ -34,21 +36,22 @@ def create_recall_project(
     query = q.create_recall_project()
 
     try:
-        DB.execute_query(query, values)
+        async with ADB.transaction() as cursor:
+            await cursor.execute(query, values)
+            await versions.bump(cursor, user_id, 'recall_projects')
     except IntegrityError:
         # Show this as an error/warning in the template
         return "Project name already exists"
 
     # Get recall projects and return them
     values = (user_id,)
-    df = q.get_recall_projects(values)
+    projects = await q.get_recall_projects(values)
 
-    if df.empty:
+    if not projects:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail=f"The user {user_id} does not have recall projects"
         )
 
-    projects = df.to_dict('records')
     context = {
         "request": request,
         "projects": projects
@@ -63,31 +66,42 @@ def create_recall_project(
     status_code=status.HTTP_200_OK,
     summary="Get recall project names",
 )
-def get_recall_projects(request: Request, current_user:ResponseUser = Depends(get_current_user), hx_request: Optional[str] = Header(None)):
+async def get_recall_projects(request: Request, current_user:ResponseUser = Depends(get_current_user), hx_request: Optional[str] = Header(None)):
     user_id = current_user['user_id']
-    values = (user_id,)
-    df = q.get_recall_projects(values)
 
-    if df.empty:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail=f"The user {user_id} does not have recall projects"
-        )
+    async def render(template:str, recalls_endpoint:bool = False):
+        values = (user_id,)
+        projects = await q.get_recall_projects(values)
 
-    projects = df.to_dict('records')
-    context = {
-        "request": request,
-        "projects": projects
-    }
+        if not projects:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND, detail=f"The user {user_id} does not have recall projects"
+            )
+
+        context = {
+            "request": request,
+            "projects": projects
+        }
+        if recalls_endpoint:
+            context.update({"recalls_endpoint": True})
+
+        return templates.TemplateResponse(template, context=context)
 
     if hx_request:
         current_url = request.headers.get('hx-current-url')
-        endpoint = get_current_endpoint(current_url)
+        recalls_endpoint = get_current_endpoint(current_url) == "recalls"
 
-        if endpoint == "recalls":
-            context.update({"recalls_endpoint": True})
-            
-        return templates.TemplateResponse('components/recall_projects.html', context=context)
-    return templates.TemplateResponse("general_pages/recall_projects.html", context=context)
+        return await FRAGMENTS.response(
+            request, user_id, "recall_projects", recalls_endpoint, ('recall_projects',),
+            lambda: render('components/recall_projects.html', recalls_endpoint)
+        )
+
+    version = await versions.current(user_id, 'recall_projects')
+    if versions.is_fresh(request, version):
+        return versions.not_modified(version)
+    response = await render("general_pages/recall_projects.html")
+    response.headers.update(version.headers())
+    return response
 
 @router.put(
     path="/{recall_project_id}",
@@ -95,7 +109,7 @@ def get_recall_projects(request: Request, current_user:ResponseUser = Depends(ge
     status_code=status.HTTP_200_OK,
     summary="Update a recall project"
 )
-def update_recall_project_name(
+async def update_recall_project_name(
     recall_project_id:int, request:Request, project_name:str = Form(...), 
     current_user:ResponseUser = Depends(get_current_user)):
     
@@ -104,7 +118,9 @@ def update_recall_project_name(
     query = q.update_recall_project_name()
     
     # Execute query
-    DB.execute_query(query, values)
+    async with ADB.transaction() as cursor:
+        await cursor.execute(query, values)
+        await versions.bump(cursor, user_id, 'recall_projects')
 
     context = {
         "request": request,
@@ -119,20 +135,24 @@ def update_recall_project_name(
 
 @router.delete(
     path="/{recall_project_id}",
-    status_code=status.HTTP_200_OK,
+    status_code=status.HTTP_202_ACCEPTED,
     summary="Delete a recall project",
     response_class=HTMLResponse
 )
-def get_recall_project_names(
-    recall_project_id:int,
+async def get_recall_project_names(
+    recall_project_id:int, response:Response,
     current_user:ResponseUser = Depends(get_current_user)):
 
     user_id = current_user['user_id']
-    values = (recall_project_id, user_id)
-    query = q.delete_recall_project()
-    
-    # Execute query
-    DB.execute_query(query, values)
+    if not await q.get_recall_projects([user_id, recall_project_id]):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="This recall project does not exist"
+        )
+
+    # Its recalls go first, in the background, the job bumps the version
+    # of recall_projects when it deletes the row
+    job_id = await DELETIONS.submit(user_id, DeletionTarget.recall_project, recall_project_id)
+    response.headers['Location'] = f"/deletions/{job_id}"
 
     return "<tr></tr>"
 
@@ -141,14 +161,14 @@ def get_recall_project_names(
     include_in_schema=False,
     response_class=HTMLResponse
 )
-def edit_recall_project(recall_project_id:int, request:Request, 
+async def edit_recall_project(recall_project_id:int, request:Request, 
     current_user:ResponseUser = Depends(get_current_user), hx_request: Optional[str] = Header(None)
     ):
     user_id = current_user['user_id']
     values = [user_id, recall_project_id]
-    df = q.get_recall_projects(values)
+    recall_projects = await q.get_recall_projects(values)
 
-    recall_project = df.to_dict('records')[0]
+    recall_project = recall_projects[0]
     context = {
         "request": request,
         "recall_project": recall_project
@@ -160,5 +180,5 @@ def edit_recall_project(recall_project_id:int, request:Request,
     path="/create_recall_project",
     include_in_schema=False
 )
-def create_recall_project_form(request:Request):
+async def create_recall_project_form(request:Request):
     return templates.TemplateResponse("components/create_recall_project.html", {"request": request})
\ No newline at end of file
@@ -1,16 +1,20 @@
 from typing import Optional
 
-from fastapi import APIRouter, Query, status, Depends, HTTPException, Form, Request, Header
+from fastapi import APIRouter, Query, status, Depends, HTTPException, Form, Request, Response, Header
 from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
 
-from models import RecallResponse, ResponseUser
-from data import DB
+from models import DeletionTarget, RecallResponse, RecallSearchResponse, ResponseUser
+from data import ADB
+from deletions import DELETIONS
 import query as q
-from utils import get_current_user, markdown_to_html
+from markdown_render import markdown_to_html, recall_to_html, MARKDOWN_VERSION
+from utils import get_current_user, search_terms, highlight, highlight_snippet
 
 # Constants
 NORMAL_FORM = Form(..., max_length=255, min_length=1, example="Test")
+PAGE_SIZE = 20
+SEARCH_PAGE_SIZE = 20
 
 templates = Jinja2Templates(directory="templates")
 
@@ -27,11 +31,49 @@ router = APIRouter(
     status_code=status.HTTP_200_OK,
     include_in_schema=False
 )
-def get_recalls_home(request:Request, current_user:ResponseUser = Depends(get_current_user)):
+async def get_recalls_home(request:Request, current_user:ResponseUser = Depends(get_current_user)):
     return templates.TemplateResponse("general_pages/recalls.html", {"request": request})
 
 
-# CREATE AN ENDPOINT THAT SEARCHES BY TEXT
+@router.get(
+    path="/search",
+    response_model=list[RecallSearchResponse],
+    status_code=status.HTTP_200_OK,
+    summary="Search recalls by text"
+)
+async def search_recalls(request:Request, text:str = Query(..., min_length=1, max_length=255),
+        page:int = Query(1, ge=1), current_user:ResponseUser = Depends(get_current_user),
+        hx_request: Optional[str] = Header(None)
+    ):
+    user_id = current_user['user_id']
+    offset = (page - 1) * SEARCH_PAGE_SIZE
+    # One extra row tells if there is a next page
+    rows = await q.search_recalls(user_id, text, SEARCH_PAGE_SIZE + 1, offset)
+    has_more = len(rows) > SEARCH_PAGE_SIZE
+
+    terms = search_terms(text)
+    recalls = [
+        {
+            'recall_id': row['recall_id'],
+            'recall_project_id': row['recall_project_id'],
+            'project_name': row['project_name'],
+            'recall_title': highlight(row['recall_title'], terms),
+            'snippet': highlight_snippet(row['recall'], terms),
+            'score': row['score'],
+        }
+        for row in rows[:SEARCH_PAGE_SIZE]
+    ]
+
+    if hx_request:
+        context = {
+            'request': request,
+            'recalls': recalls,
+            'text': text,
+            'page': page,
+            'has_more': has_more,
+        }
+        return templates.TemplateResponse("components/recall_search.html", context=context)
+    return recalls
 
 
 @router.put(
@@ -39,7 +81,7 @@ def get_recalls_home(request:Request, current_user:ResponseUser = Depends(get_cu
     status_code=status.HTTP_200_OK,
     summary="Update a recall"
 )
-def update_recalls(request: Request, recall_id:int, 
+async def update_recalls(request: Request, recall_id:int, 
         recall_title:str = Form(), recall:str = Form(), 
         current_user:ResponseUser = Depends(get_current_user)
     ):
@@ -47,13 +89,13 @@ def update_recalls(request: Request, recall_id:int,
     query, values = q.update_recall(recall_id, recall_title, recall, user_id)
 
     # Execute query
-    DB.execute_query(query, tuple(values))
+    await ADB.execute(query, tuple(values))
 
     values = [user_id, recall_id]
-    df = q.get_recalls(values, recall_id)
+    recalls = await q.get_recalls(values, recall_id)
 
-    df['recall'] = df.recall.apply(markdown_to_html)
-    recall = df.to_dict('records')[0]
+    recall = recalls[0]
+    recall['recall'] = recall_to_html(recall)
     context = {
         "request": request,
         "recall": recall
@@ -67,12 +109,12 @@ def update_recalls(request: Request, recall_id:int,
     status_code=status.HTTP_200_OK,
     summary="Delete a recall"
 )
-def delete_recall(recall_id:int, current_user:ResponseUser = Depends(get_current_user)):
+async def delete_recall(recall_id:int, current_user:ResponseUser = Depends(get_current_user)):
     user_id = current_user['user_id']
     values = (recall_id, user_id)
     query = q.delete_recall()
     
-    DB.execute_query(query, values)
+    await ADB.execute(query, values)
 
     return {
         'Detail': f"Recall {recall_id} was deleted"
@@ -83,14 +125,14 @@ def delete_recall(recall_id:int, current_user:ResponseUser = Depends(get_current
     include_in_schema=False,
     response_class=HTMLResponse
 )
-def edit_recall_project(request:Request, recall_id:int, 
+async def edit_recall_project(request:Request, recall_id:int, 
     current_user:ResponseUser = Depends(get_current_user)
     ):
     user_id = current_user['user_id']
     values = [user_id, recall_id]
-    df = q.get_recalls(values, recall_id)
+    recalls = await q.get_recalls(values, recall_id)
 
-    recall = df.to_dict('records')[0]
+    recall = recalls[0]
     context = {
         "request": request,
         "recall": recall
@@ -105,23 +147,30 @@ def edit_recall_project(request:Request, recall_id:int,
     status_code=status.HTTP_200_OK,
     summary="Get recalls in a recall project"
 )
-def get_recalls(request:Request, recall_project_id: int, current_user:ResponseUser = Depends(get_current_user), hx_request: Optional[str] = Header(None)):
+async def get_recalls(request:Request, recall_project_id: int, after_id:Optional[int] = None, current_user:ResponseUser = Depends(get_current_user), hx_request: Optional[str] = Header(None)):
     user_id = current_user['user_id']
     values = (user_id, recall_project_id)
-    df = q.get_recalls(values)
+    # One extra row tells if there is a next page
+    recalls = await q.get_recalls(values, cursor=after_id, limit=PAGE_SIZE + 1)
 
-    if df.empty:
+    if not recalls and not after_id:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail=f"The user {user_id} does not have recalls for recall_project_id {recall_project_id}"
         )
 
-    df['recall'] = df.recall.apply(markdown_to_html)
-    recalls = df.to_dict('records')
+    last_recall = recalls[PAGE_SIZE - 1] if len(recalls) > PAGE_SIZE else None
+    recalls = recalls[:PAGE_SIZE]
+    for recall in recalls:
+        recall['recall'] = recall_to_html(recall)
     context = {
         'request': request,
-        'recalls': recalls
+        'recalls': recalls,
+        'recall_project_id': recall_project_id,
+        'last_recall': last_recall,
     }
 
+    if hx_request and after_id:
+        return templates.TemplateResponse("components/recall_items.html", context=context)
     if hx_request:
         return templates.TemplateResponse("components/recalls.html", context=context)
     return templates.TemplateResponse("general_pages/recalls.html", context=context)
@@ -132,7 +181,7 @@ def get_recalls(request:Request, recall_project_id: int, current_user:ResponseUs
     summary="Recall creation",
     include_in_schema=False
 )
-def create_recall(request: Request, current_user:ResponseUser = Depends(get_current_user)):
+async def create_recall(request: Request, current_user:ResponseUser = Depends(get_current_user)):
     return templates.TemplateResponse("general_pages/create_recall.html", {"request": request})
 
 @router.post(
@@ -140,7 +189,7 @@ def create_recall(request: Request, current_user:ResponseUser = Depends(get_curr
     status_code=status.HTTP_201_CREATED,
     summary="Recall creation"
 )
-def create_recall(
+async def create_recall(
     request: Request,
     recall_project_id: int = Form(...),
     recall_title: str = Form(..., min_length=1, max_length=255),
@@ -149,30 +198,35 @@ def create_recall(
     ):
 
     user_id = current_user['user_id']
-    values = (user_id, recall_project_id, recall_title, recall)
+    recall_html = markdown_to_html(recall)
+    values = (user_id, recall_project_id, recall_title, recall, recall_html, MARKDOWN_VERSION)
     query = q.create_recall()
     
     # Execute query
-    DB.execute_query(query, values)
+    await ADB.execute(query, values)
 
     return templates.TemplateResponse("general_pages/create_recall.html", {"request": request})
 
 
 @router.delete(
     path="/recall-project/{recall_project_id}",
-    status_code=status.HTTP_200_OK,
+    status_code=status.HTTP_202_ACCEPTED,
     summary="Delete all the recalls in a recall project"
 )
-def delete_recalls(recall_project_id:int, current_user:ResponseUser = Depends(get_current_user)):
+async def delete_recalls(recall_project_id:int, response:Response, current_user:ResponseUser = Depends(get_current_user)):
     user_id = current_user['user_id']
-    values = (recall_project_id, user_id)
-    query = q.delete_recalls()
-    
-    # Execute query
-    DB.execute_query(query, values)
+    if not await q.get_recall_projects([user_id, recall_project_id]):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="This recall project does not exist"
+        )
+
+    # In chunks in the background
+    job_id = await DELETIONS.submit(user_id, DeletionTarget.recalls, recall_project_id)
+    response.headers['Location'] = f"/deletions/{job_id}"
 
     return {
-        'Detail': f"Delete all recalls in project {recall_project_id}"
+        'Detail': f"Deleting all recalls in project {recall_project_id}",
+        'job_id': job_id,
     }
 
 
@@ -6,18 +6,15 @@ from fastapi import APIRouter, Request, Depends, status, Form, Response
 from fastapi.responses import RedirectResponse
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.templating import Jinja2Templates
-from mysql.connector.errors import IntegrityError
-from passlib.context import CryptContext
 from pydantic import EmailStr, SecretStr
 
 from config import settings
-from data import DB
-from models import ResponseUser, Token
+from data import ADB, IntegrityError
+from deletions import DELETIONS
+from models import DeletionTarget, ResponseUser, Token
 import query as q
-from utils import verify_password, create_access_token, get_current_user
-
-# Constants
-PWD_CXT = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from passwords import hash_password, verify_password
+from utils import create_access_token, get_current_user, mark_deleting
 
 templates = Jinja2Templates(directory="templates")
 router = APIRouter(prefix="/users", tags=["Users"])
@@ -27,7 +24,7 @@ router = APIRouter(prefix="/users", tags=["Users"])
 @router.get(
     path="/signup", summary="User registration", include_in_schema=False
 )
-def register(request: Request):
+async def register(request: Request):
     return templates.TemplateResponse("users/signup.html", {"request": request})
 
 
@@ -35,7 +32,7 @@ def register(request: Request):
 @router.post(
     path="/signup", status_code=status.HTTP_201_CREATED, summary="User registration"
 )
-def signup(
+async def signup(
     request: Request,
     email: EmailStr = Form(...),
     first_name: str = Form(..., min_length=1, max_length=255),
@@ -44,14 +41,14 @@ def signup(
     password: SecretStr = Form(..., min_length=8),
 ):
     # Get values
-    hashed_passw = PWD_CXT.hash(password.get_secret_value())
+    hashed_passw = await hash_password(password.get_secret_value())
     user_id = uuid4()
     values = (str(user_id), email, hashed_passw, first_name, last_name, birth_date)
 
     query = q.signup_user()
 
     try:
-        DB.execute_query(query, values)
+        await ADB.execute(query, values)
         return RedirectResponse(
                 "/?msg=Successfully-Registered", status_code=status.HTTP_302_FOUND
             ) 
@@ -65,7 +62,7 @@ def signup(
     summary="User login",
     include_in_schema=False
 )
-def login(request: Request):
+async def login(request: Request):
     return templates.TemplateResponse("auth/login.html", {"request": request})
 
 
@@ -76,22 +73,21 @@ def login(request: Request):
     response_model=Token,
     include_in_schema=False
 )
-def login_for_token(response: Response, request: Request, auth_data: OAuth2PasswordRequestForm = Depends()):
+async def login_for_token(response: Response, request: Request, auth_data: OAuth2PasswordRequestForm = Depends()):
     # Get email and password from request
     errors = []
     email = auth_data.username
     password = auth_data.password
     values = (email,)
 
-    user = q.login_user(values)
+    user = await q.login_user(values)
 
-    if user.empty:
+    if user is None:
         errors.append("Email does not exists")
         return templates.TemplateResponse("auth/login.html", context={"request": request, "errors": errors})
 
-    user = user.to_dict("records")[0]
     # Confirm password
-    if not verify_password(password, user["password"]):
+    if not await verify_password(password, user["password"]):
         errors.append("Wrong password")
         return templates.TemplateResponse("auth/login.html", context={"request": request, "errors": errors})
 
@@ -108,8 +104,8 @@ def login_for_token(response: Response, request: Request, auth_data: OAuth2Passw
     status_code=status.HTTP_200_OK,
     summary="User login",
 )
-def login(response: Response, request: Request, auth_data: OAuth2PasswordRequestForm = Depends()):
-    res = login_for_token(response, request, auth_data)
+async def login(response: Response, request: Request, auth_data: OAuth2PasswordRequestForm = Depends()):
+    res = await login_for_token(response, request, auth_data)
     
     if type(res) == dict:
         response = templates.TemplateResponse("general_pages/homepage.html", context={"request": request})
@@ -126,16 +122,20 @@ def login(response: Response, request: Request, auth_data: OAuth2PasswordRequest
 
 @router.delete(
     path="/",
-    status_code=status.HTTP_200_OK,
+    status_code=status.HTTP_202_ACCEPTED,
     summary="Delete logged user",
     tags=["Users"],
 )
-def delete_user(current_user: ResponseUser = Depends(get_current_user)):
+async def delete_user(response: Response, current_user: ResponseUser = Depends(get_current_user)):
+    """
+    Delete the user with all their rows in the background, follow the
+    progress at the Location header until the job is done. The user
+    can't authenticate anymore from now on.
+    """
     user_id = current_user['user_id']
-    values = (user_id,)
-    query = q.delete_user()
-
-    DB.execute_query(query, values)
+    job_id = await DELETIONS.submit(user_id, DeletionTarget.user)
+    mark_deleting(current_user['email'])
 
-    return {"Detail": "User {user_id} was deleted"}
+    response.headers['Location'] = f"/deletions/{job_id}"
+    return {"Detail": f"User {user_id} is being deleted", "job_id": job_id}
 
@@ -0,0 +1,174 @@
+"""
+In-memory table of running pomodoro sessions.
+
+POST /pomodoros/ inserts the pomodoro and opens a session under its
+pomodoro_id. The timer state moves through
+
+    created -> running <-> paused -> completed
+
+and reset takes an unfinished session back to created. The state lives
+in memory only, completing a session writes its completed_at and rating
+it closes it. A session lost to a restart or to expiry is opened again
+from its row the next time it's addressed.
+"""
+from collections import OrderedDict
+import time
+from typing import Optional
+
+from config import settings
+from models import SessionState
+
+# Constants
+MAX_SESSIONS = getattr(settings, 'POMODORO_MAX_SESSIONS', 100000)
+SESSION_TTL = getattr(settings, 'POMODORO_SESSION_TTL', 6 * 60 * 60)
+
+TRANSITIONS = {
+    'start': ((SessionState.created,), SessionState.running),
+    'pause': ((SessionState.running,), SessionState.paused),
+    'resume': ((SessionState.paused,), SessionState.running),
+    'reset': ((SessionState.created, SessionState.running, SessionState.paused), SessionState.created),
+    # From created too, the session of a running timer may have been lost
+    'complete': ((SessionState.created, SessionState.running, SessionState.paused), SessionState.completed),
+}
+
+
+class SessionError(ValueError):
+    """ A transition that isn't allowed from the current state. """
+
+
+class PomodoroSession:
+    __slots__ = ('pomodoro_id', 'user_id', 'duration', 'state', 'elapsed', 'resumed_at', 'updated_at')
+
+    def __init__(self, pomodoro_id:int, user_id:str, duration:int) -> None:
+        self.pomodoro_id = pomodoro_id
+        self.user_id = user_id
+        # Seconds
+        self.duration = duration
+        self.state = SessionState.created
+        # Seconds run before the last start or resume
+        self.elapsed = 0.0
+        # Wall clock, devices compare it with their own
+        self.resumed_at: Optional[float] = None
+        self.updated_at = time.monotonic()
+
+    def remaining(self, now:float = None) -> float:
+        if self.state is SessionState.completed:
+            return 0.0
+
+        elapsed = self.elapsed
+        if self.state is SessionState.running:
+            elapsed += (now or time.time()) - self.resumed_at
+
+        return max(0.0, self.duration - elapsed)
+
+    def view(self) -> dict:
+        now = time.time()
+        remaining = self.remaining(now)
+        return {
+            'pomodoro_id': self.pomodoro_id,
+            'state': self.state,
+            'duration': self.duration,
+            'remaining': round(remaining, 3),
+            'ends_at': now + remaining if self.state is SessionState.running else None,
+        }
+
+
+class SessionTable:
+    """
+    Sessions by pomodoro_id, least recently used first. Only used from
+    the event loop, so it needs no lock.
+    """
+
+    def __init__(self, maxsize:int = MAX_SESSIONS, ttl:float = SESSION_TTL) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._sessions: OrderedDict[int, PomodoroSession] = OrderedDict()
+        # user_id -> pomodoro_id of the last session opened
+        self._current: dict[str, int] = {}
+
+        # Metrics
+        self.opened = 0
+        self.completed = 0
+        self.expired = 0
+
+    def _expire(self) -> None:
+        deadline = time.monotonic() - self.ttl
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if session.updated_at > deadline and len(self._sessions) <= self.maxsize:
+                break
+            self._remove(session.pomodoro_id)
+            self.expired += 1
+
+    def open(
+            self, pomodoro_id:int, user_id:str, duration:int, state:SessionState = SessionState.created
+        ) -> PomodoroSession:
+        session = PomodoroSession(pomodoro_id, user_id, duration)
+        session.state = state
+        self._sessions[pomodoro_id] = session
+        self._current[user_id] = pomodoro_id
+        self.opened += 1
+        self._expire()
+
+        return session
+
+    def get(self, user_id:str, pomodoro_id:int) -> Optional[PomodoroSession]:
+        session = self._sessions.get(pomodoro_id)
+        if session is None or session.user_id != user_id:
+            return None
+
+        return session
+
+    def current(self, user_id:str) -> Optional[PomodoroSession]:
+        """ The session the user opened last, while it's open. """
+        pomodoro_id = self._current.get(user_id)
+        return self.get(user_id, pomodoro_id) if pomodoro_id is not None else None
+
+    def check(self, session:PomodoroSession, action:str) -> None:
+        sources, _ = TRANSITIONS[action]
+        if session.state not in sources:
+            raise SessionError(f"Can't {action} a {session.state.value} pomodoro")
+
+    def transition(self, session:PomodoroSession, action:str) -> PomodoroSession:
+        self.check(session, action)
+        _, target = TRANSITIONS[action]
+
+        now = time.time()
+        if session.state is SessionState.running:
+            session.elapsed += now - session.resumed_at
+            session.resumed_at = None
+        if target is SessionState.running:
+            session.resumed_at = now
+        elif target is SessionState.created:
+            session.elapsed = 0.0
+
+        session.state = target
+        session.updated_at = time.monotonic()
+        self._sessions.move_to_end(session.pomodoro_id)
+        if target is SessionState.completed:
+            self.completed += 1
+
+        return session
+
+    def _remove(self, pomodoro_id:int) -> None:
+        session = self._sessions.pop(pomodoro_id, None)
+        if session is not None and self._current.get(session.user_id) == pomodoro_id:
+            del self._current[session.user_id]
+
+    def close(self, pomodoro_id:int) -> None:
+        self._remove(pomodoro_id)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def stats(self) -> dict:
+        return {
+            'size': len(self._sessions),
+            'maxsize': self.maxsize,
+            'opened': self.opened,
+            'completed': self.completed,
+            'expired': self.expired,
+        }
+
+
+SESSIONS = SessionTable()
@@ -0,0 +1,73 @@
+"""
+Registry of compiled SQL statements.
+
+The builders in query.py only depend on the shape of a statement (which
+filters are present, which column is updated...), never on the values,
+so the PyPika AST is built and rendered once per shape and the SQL
+string is reused for every request afterwards.
+"""
+from functools import wraps
+from typing import Callable
+
+# (builder name, shape) -> SQL
+STATEMENTS: dict[tuple[str, tuple], str] = {}
+
+# builder name -> (builder, declared shapes)
+BUILDERS: dict[str, tuple[Callable, tuple[tuple]]] = {}
+
+# SQL -> builder name, to tag the statements run by data.py
+NAMES: dict[str, str] = {}
+
+# Tag of the statements that weren't built by a registered builder
+UNKNOWN = "other"
+
+
+def _builder_name(builder:Callable) -> str:
+    module = builder.__module__.split('.')[-1]
+    return f"{module}.{builder.__name__}"
+
+
+def statement(*shapes:tuple):
+    """
+    Cache the SQL returned by a builder keyed by its arguments.
+    `shapes` lists the argument tuples the app uses, so every variant
+    can be compiled up front with compile_all().
+    """
+    def decorator(builder:Callable[..., str]) -> Callable[..., str]:
+        name = _builder_name(builder)
+
+        @wraps(builder)
+        def wrapper(*args) -> str:
+            key = (name, args)
+            sql = STATEMENTS.get(key)
+            if sql is None:
+                sql = builder(*args)
+                STATEMENTS[key] = sql
+                NAMES[sql] = name
+
+            return sql
+
+        BUILDERS[name] = (wrapper, shapes or ((),))
+        return wrapper
+
+    return decorator
+
+
+def compile_all() -> None:
+    for builder, shapes in list(BUILDERS.values()):
+        for shape in shapes:
+            builder(*shape)
+
+
+def compiled_statements() -> list[tuple[str, tuple, str]]:
+    """ Every compiled statement as (builder name, shape, sql), for auditing. """
+    return [(name, shape, sql) for (name, shape), sql in sorted(STATEMENTS.items(), key=lambda item: repr(item[0]))]
+
+
+def statement_name(sql:str) -> str:
+    return NAMES.get(sql, UNKNOWN)
+
+
+def clear() -> None:
+    STATEMENTS.clear()
+    NAMES.clear()
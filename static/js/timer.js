@@ -40,11 +40,47 @@ const findTimeString = () => {
   return minutes + seconds;
 };
 
-// Function to start Countdown
-const startTimer = () => {
+// Pomodoro created by the form or on another device, its session is kept by the server
+var pomodoroId;
+const currentPomodoro = () => pomodoroId;
+
+document.body.addEventListener("htmx:afterSwap", () => {
+  const created = document.querySelector("[data-pomodoro-id]");
+  if (created) {
+    pomodoroId = created.dataset.pomodoroId;
+  }
+});
+
+// Session state of the current pomodoro as {state, remaining, ...}
+var session;
+
+// Send a session action, start, pause, resume, reset or complete
+const sendAction = async (action) => {
+  const pomodoroId = currentPomodoro();
+  if (!pomodoroId) {
+    return undefined;
+  }
+  const response = await fetch(`/pomodoros/${pomodoroId}/${action}`, { method: "POST" });
+  if (!response.ok) {
+    return undefined;
+  }
+  session = await response.json();
+  return session;
+};
+
+// Take the remaining time from the server
+const syncTime = (state) => {
+  if (state) {
+    countDownTime = Math.max(Math.round(state.remaining), 0);
+    renderTime();
+  }
+};
+
+// Function to run the countdown locally
+const runTimer = () => {
   if (isStopped) {
     isStopped = false;
-    timerID = setInterval(runCountDown, 500);
+    timerID = setInterval(runCountDown, 1000);
   }
 };
 
@@ -56,13 +92,88 @@ const stopTimer = () => {
   }
 };
 
+// Function to start Countdown
+const startTimer = async () => {
+  if (!isStopped) {
+    return;
+  }
+  const paused = session && session.pomodoro_id == currentPomodoro() && session.state === "paused";
+  syncTime(await sendAction(paused ? "resume" : "start"));
+  runTimer();
+};
+
+// Function to pause Countdown
+const pauseTimer = async () => {
+  if (isStopped) {
+    return;
+  }
+  stopTimer();
+  syncTime(await sendAction("pause"));
+};
+
 // Function to reset Countdown
-const resetTimer = () => {
+const resetTimer = async () => {
   stopTimer();
   countDownTime = defaultValue;
   renderTime();
+  syncTime(await sendAction("reset"));
+};
+
+// The rating modal rates the pomodoro that just ended
+const prepareRating = (pomodoroId) => {
+  const sendButton = document.getElementById("send-satisfaction");
+  sendButton.setAttribute("hx-put", `/pomodoros/${pomodoroId}/satisfaction`);
+  htmx.process(sendButton);
 };
 
+// Apply a session pushed by the server, the user may drive the timer
+// from another device. Nothing is sent back, the server already has it
+const applySession = (state) => {
+  // A page opened after the pomodoro was created picks it up
+  if (!currentPomodoro() && state.state !== "completed") {
+    pomodoroId = String(state.pomodoro_id);
+  }
+  if (state.pomodoro_id != currentPomodoro()) {
+    return;
+  }
+  session = state;
+  if (state.state === "running") {
+    syncTime(state);
+    runTimer();
+  } else if (state.state === "completed") {
+    stopTimer();
+    countDownTime = defaultValue;
+    renderTime();
+    prepareRating(state.pomodoro_id);
+    pomodoroModal.show();
+  } else {
+    stopTimer();
+    syncTime(state);
+  }
+};
+
+// Events of the user from every device, no polling
+const events = new EventSource("/events/");
+
+events.addEventListener("pomodoro-created", (event) => {
+  const state = JSON.parse(event.data);
+  pomodoroId = String(state.pomodoro_id);
+  stopTimer();
+  session = state;
+  syncTime(state);
+});
+
+events.addEventListener("timer", (event) => {
+  applySession(JSON.parse(event.data));
+});
+
+events.addEventListener("pomodoro-rated", (event) => {
+  const rated = JSON.parse(event.data);
+  if (rated.pomodoro_id == currentPomodoro()) {
+    pomodoroModal.hide();
+  }
+});
+
 // Initialize alarm sound
 timeoutAudio.src = "http://soundbible.com/grab.php?id=1501&type=wav";
 timeoutAudio.load();
@@ -73,7 +184,7 @@ timeoutAudio.load();
 // Attach onclick event to buttons
 startAction.onclick = startTimer;
 resetAction.onclick = resetTimer;
-stopAction.onclick = stopTimer;
+stopAction.onclick = pauseTimer;
 
 // Function to display coundown on screen
 const renderTime = () => {
@@ -91,13 +202,18 @@ const runCountDown = () => {
   renderTime();
 
   // timeout on zero
-  if (countDownTime === 0) {
+  if (countDownTime <= 0) {
     stopTimer();
     // Play alarm on timeout
     timeoutAudio.play();
     countDownTime = defaultValue;
 
-    //Show modal to grade pomodoro
-    pomodoroModal.show()
+    const pomodoroId = currentPomodoro();
+    if (pomodoroId) {
+      sendAction("complete");
+      //Show modal to grade pomodoro
+      prepareRating(pomodoroId);
+      pomodoroModal.show();
+    }
   }
 };
\ No newline at end of file
@@ -0,0 +1,88 @@
+"""
+The tests run against the SQLite backend on a temporary database. The
+settings are installed as the `config` module before any module of the
+app is imported, the backend is chosen at import time.
+"""
+import asyncio
+from datetime import date
+import os
+import sys
+import tempfile
+import types
+import uuid
+
+from fastapi.testclient import TestClient
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DIRECTORY = tempfile.mkdtemp(prefix='pomodoro-tests-')
+
+
+class Settings:
+    PROJECT_NAME = "Pomodoro"
+    PROJECT_VERSION = "test"
+    DATABASE_USER = ""
+    DATABASE_PASSWORD = ""
+    SECRET_KEY = "test-secret"
+    ALGORITHM = "HS256"
+    ACCESS_TOKEN_EXPIRE_MINUTES = 30
+    ENV = "TEST"
+    DATABASE_BACKEND = 'sqlite'
+    SQLITE_PATH = os.path.join(DIRECTORY, 'pomodoros.db')
+    ERROR_LOG_FILE = os.path.join(DIRECTORY, 'errors.txt')
+
+
+config = types.ModuleType('config')
+config.settings = Settings()
+sys.modules['config'] = config
+sys.path.insert(0, ROOT)
+
+from data import ADB  # noqa: E402
+import query as q  # noqa: E402
+
+
+@pytest.fixture
+def run():
+    """ Run a coroutine in a new event loop, the pool is closed after it. """
+    def run(coroutine):
+        async def main():
+            try:
+                return await coroutine
+            finally:
+                await ADB.close_pool()
+
+        return asyncio.run(main())
+
+    return run
+
+
+@pytest.fixture
+def user(run) -> dict:
+    """ A new user with a category and a project. """
+    async def create() -> dict:
+        user_id = str(uuid.uuid4())
+        values = (user_id, f"{user_id}@example.com", "", "Test", "User", date(1990, 1, 1))
+        await ADB.execute(q.signup_user(), values)
+
+        async with ADB.transaction() as cursor:
+            await cursor.execute(q.create_category(), ("Work", user_id))
+            category_id = cursor.lastrowid
+            await cursor.execute(q.create_project(), (user_id, category_id, "Project", date.today()))
+            project_id = cursor.lastrowid
+
+        return {'user_id': user_id, 'category_id': category_id, 'project_id': project_id}
+
+    return run(create())
+
+
+@pytest.fixture
+def client(user, monkeypatch):
+    """ A client of the app logged in as `user`, the app finds its templates from the root. """
+    monkeypatch.chdir(ROOT)
+    import main
+    from utils import create_access_token
+
+    with TestClient(main.app) as client:
+        token = create_access_token({'sub': f"{user['user_id']}@example.com"})
+        client.cookies.set('access_token', f"Bearer {token}")
+        yield client
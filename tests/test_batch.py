@@ -0,0 +1,40 @@
+from routers import pomodoros
+
+
+def pomodoro(user:dict, **fields) -> dict:
+    return {
+        'category_id': user['category_id'], 'project_id': user['project_id'], 'duration': 25,
+        'pomodoro_date': "2026-10-14T09:30:00", **fields
+    }
+
+
+def test_every_item_is_validated_on_its_own(client, user):
+    items = [
+        pomodoro(user, pomodoro_satisfaction="good"),
+        pomodoro(user, duration=10),
+        pomodoro(user, project_id=user['project_id'] + 1000),
+        pomodoro(user, pomodoro_date="2999-01-01T00:00:00"),
+        pomodoro(user),
+    ]
+
+    response = client.post("/pomodoros/batch", json=items)
+    stats = client.get("/pomodoros/stats", params={'period': 'day', 'start': "2026-10-14", 'end': "2026-10-14"})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert (body['created'], body['rejected']) == (2, 3)
+    assert [result['created'] for result in body['results']] == [True, False, False, False, True]
+    assert body['results'][1]['errors'][0].startswith("duration")
+    assert body['results'][2]['errors'] == ["project not found in this category"]
+    assert body['results'][3]['errors'] == ["pomodoro_date is in the future"]
+    # The rollups count the created ones
+    assert [(row['pomodoros'], row['good']) for row in stats.json()] == [(2, 1)]
+
+
+def test_too_large_batches_are_refused(client, user, monkeypatch):
+    monkeypatch.setattr(pomodoros, 'BATCH_LIMIT', 2)
+
+    response = client.post("/pomodoros/batch", json=[pomodoro(user)] * 3)
+
+    assert response.status_code == 413
+    assert response.json()['detail'] == "A batch can have up to 2 pomodoros"
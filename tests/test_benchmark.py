@@ -0,0 +1,57 @@
+import asyncio
+import json
+import os
+
+from internal import benchmark
+
+
+def load(filename:str) -> dict:
+    with open(filename) as f:
+        return json.load(f)
+
+
+def test_percentile_is_nearest_rank():
+    ordered = [float(value) for value in range(1, 101)]
+
+    assert benchmark.percentile(ordered, 50) == 50.0
+    assert benchmark.percentile(ordered, 99) == 99.0
+    assert benchmark.percentile([7.0], 95) == 7.0
+    assert benchmark.percentile([], 50) == 0.0
+
+
+def test_runs_compare_with_the_committed_baseline():
+    args = benchmark.parse_args(['run'])
+    baseline = load(args.baseline)
+
+    assert args.baseline == benchmark.BASELINE
+    assert benchmark.parse_args(['run', '--baseline', ""]).baseline == ""
+    # Every route of the request mix has numbers to compare with
+    assert len(baseline['routes']) == len(benchmark.MIX)
+
+
+def test_slower_routes_are_regressions(capsys):
+    stats = {'requests': 10, 'errors': 0, 'throughput': 1.0, 'p50_ms': 10.0, 'p95_ms': 20.0, 'p99_ms': 30.0}
+    report = {
+        'requests': 20, 'wall_time_s': 1.0, 'throughput': 20.0, 'target': "in-process",
+        'routes': {'GET /a': stats, 'GET /b': {**stats, 'p99_ms': 60.0}},
+    }
+    baseline = {'routes': {'GET /a': stats, 'GET /b': stats}, 'max_regression': 0.2}
+
+    assert benchmark.print_report(report, baseline) == ["GET /b p99_ms"]
+    assert "p99 +100%" in capsys.readouterr().out
+    assert benchmark.print_report(report) == []
+
+
+def test_seeded_run_saves_a_report(tmp_path, monkeypatch):
+    monkeypatch.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    saved = tmp_path / "report.json"
+    seeding = ['--seed', '1', 'seed', '--users', '2', '--pomodoros', '20', '--recalls', '2']
+    running = ['--seed', '1', 'run', '--requests', '40', '--concurrency', '4', '--save', str(saved), '--baseline', ""]
+
+    assert asyncio.run(benchmark.main(seeding)) == 0
+    assert asyncio.run(benchmark.main(running)) == 0
+
+    report = json.loads(saved.read_text())
+    assert report['requests'] == 40 and report['backend'] == 'sqlite' and report['seed'] == 1
+    assert set(report['routes']) <= set(load(benchmark.BASELINE)['routes'])
+    assert sum(route['errors'] for route in report['routes'].values()) == 0
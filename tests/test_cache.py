@@ -0,0 +1,82 @@
+import time
+
+from fastapi import HTTPException, Request
+import pytest
+
+from cache import TTLCache
+import utils
+
+
+def test_entries_expire_after_the_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(time, 'monotonic', lambda: now[0])
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2, ttl=5)
+
+    now[0] += 10
+    assert (cache.get('a'), cache.get('b', "expired")) == (1, "expired")
+    now[0] += 60
+    assert cache.get('a') is None
+    assert cache.stats() == {'size': 0, 'maxsize': 10, 'hits': 1, 'misses': 2, 'evictions': 0}
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TTLCache(maxsize=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+
+    assert (cache.get('a'), cache.get('b'), cache.get('c')) == (1, None, 3)
+    assert cache.stats()['evictions'] == 1
+
+
+def current_user(run, email:str) -> dict:
+    token = utils.create_access_token({'sub': email})
+    request = Request({'type': 'http', 'method': 'GET', 'path': '/', 'headers': []})
+    return run(utils.get_current_user(request, token))
+
+
+@pytest.fixture
+def lookups(monkeypatch) -> list:
+    lookups = []
+    select_user = utils.select_user
+
+    async def counted_select_user(email:str):
+        lookups.append(email)
+        return await select_user(email)
+
+    monkeypatch.setattr(utils, 'select_user', counted_select_user)
+    return lookups
+
+
+def test_current_user_is_looked_up_once(run, user, lookups):
+    email = f"{user['user_id']}@example.com"
+
+    first = current_user(run, email)
+    first['first_name'] = "Changed"
+    second = current_user(run, email)
+
+    assert lookups == [email]
+    # The handlers' copies don't change the cached user
+    assert second['user_id'] == user['user_id'] and second['first_name'] == "Test"
+
+    utils.invalidate_user(email)
+    current_user(run, email)
+    assert lookups == [email, email]
+
+
+def test_unknown_and_deleting_users_are_rejected(run, user, lookups):
+    email = f"{user['user_id']}@example.com"
+
+    with pytest.raises(HTTPException) as unknown:
+        current_user(run, "nobody@example.com")
+    utils.mark_deleting(email)
+    with pytest.raises(HTTPException) as deleting:
+        current_user(run, email)
+
+    assert unknown.value.status_code == deleting.value.status_code == 401
+    # A miss isn't cached, the user being deleted isn't looked up
+    assert lookups == ["nobody@example.com"]
+    utils.invalidate_user(email)
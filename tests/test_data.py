@@ -0,0 +1,132 @@
+import asyncio
+
+import pytest
+
+import data
+from data import ADB, AsyncDatabase, DB, PoolTimeout
+import query as q
+
+
+class SlowPool:
+    """
+    A pool whose acquire completes even when it's cancelled, like a
+    connect that finishes as the timeout hits.
+    """
+
+    size = freesize = 1
+
+    def __init__(self) -> None:
+        self.released = []
+
+    async def acquire(self):
+        try:
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            pass
+        return "connection"
+
+    def release(self, conn) -> None:
+        self.released.append(conn)
+
+
+def slow_database(pool_timeout:float = 0.01) -> AsyncDatabase:
+    database = AsyncDatabase(pool_timeout=pool_timeout)
+    database.pool = SlowPool()
+    return database
+
+
+def test_connection_acquired_at_the_timeout_is_released():
+    database = slow_database()
+
+    async def scenario():
+        with pytest.raises(PoolTimeout):
+            async with database.connection():
+                pass
+        await asyncio.sleep(0)
+
+    asyncio.run(scenario())
+
+    assert database.pool.released == ["connection"]
+    assert database.stats()['timeouts'] == 1 and database.stats()['waiting'] == 0
+
+
+def test_connection_acquired_by_a_cancelled_task_is_released():
+    database = slow_database(pool_timeout=1)
+
+    async def use():
+        async with database.connection():
+            pass
+
+    async def scenario():
+        task = asyncio.create_task(use())
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await asyncio.sleep(0)
+
+    asyncio.run(scenario())
+
+    assert database.pool.released == ["connection"]
+
+
+def test_pool_serves_again_after_a_timeout(run):
+    database = data.ADB
+    pool_timeout = database.pool_timeout
+
+    async def scenario():
+        database.pool_timeout = 0.01
+        try:
+            pool = await database.create_pool()
+            # Every connection in use, the next acquire times out
+            held = [await pool.acquire() for _ in range(pool.maxsize)]
+            with pytest.raises(PoolTimeout):
+                async with database.connection():
+                    pass
+            for conn in held:
+                pool.release(conn)
+            return await database.fetch_one("SELECT 1 AS one")
+        finally:
+            database.pool_timeout = pool_timeout
+
+    assert run(scenario()) == {'one': 1}
+
+
+def test_build_rows_of_every_row_type():
+    columns = ('category_id', 'category_name')
+    rows = [(1, "Work"), (2, "Study")]
+
+    assert data.build_rows(columns, rows) == [
+        {'category_id': 1, 'category_name': "Work"}, {'category_id': 2, 'category_name': "Study"}
+    ]
+    assert data.build_rows(columns, rows, 'tuple') == rows
+
+    first, second = data.build_rows(columns, rows, 'row')
+    assert (first.category_id, first['category_name']) == (1, "Work")
+    assert tuple(second) == (2, "Study") and second.keys() == columns
+    assert second.as_dict() == {'category_id': 2, 'category_name': "Study"}
+    # One class per column set
+    assert type(first) is data.row_class(columns)
+
+    with pytest.raises(ValueError):
+        data.build_rows(columns, rows, 'frame')
+
+
+def test_fetch_rows_without_pandas(run, user):
+    values = (user['user_id'],)
+
+    async def fetch():
+        return (
+            await ADB.fetch_all(q.get_categories_query(), values),
+            await ADB.fetch_one(q.get_categories_query(), values, row_type='row'),
+            await ADB.fetch_one(q.get_categories_query(), ("nobody",)),
+        )
+
+    rows, row, missing = run(fetch())
+
+    assert [category['category_name'] for category in rows] == ["Work"]
+    assert row.category_id == user['category_id'] and row.category_name == "Work"
+    assert missing is None
+    # The CLI tools' synchronous path returns the same rows
+    assert DB.fetch_all(q.get_categories_query(), values) == rows
+    assert DB.fetch_one(q.get_categories_query(), values, row_type='tuple') == tuple(rows[0].values())
@@ -0,0 +1,72 @@
+import asyncio
+from datetime import date, datetime
+
+import pytest
+
+from data_sqlite import AsyncSQLiteDatabase, AsyncSQLitePool, match_against
+
+
+def test_match_against_counts_term_occurrences():
+    assert match_against("yield generator", "Generators", "a generator can yield, yield!") == 4
+    assert match_against(None, "text") == 0
+    assert match_against("text", None) == 0
+
+
+def test_released_connection_goes_to_the_waiter(tmp_path):
+    async def scenario():
+        pool = AsyncSQLitePool(str(tmp_path / "pool.db"), 1)
+        conn = await pool.acquire()
+        waiting = asyncio.create_task(pool.acquire())
+        await asyncio.sleep(0)
+        pool.release(conn)
+        handed = await waiting
+        pool.release(handed)
+        pool.close()
+        await pool.wait_closed()
+        return conn, handed, pool.size
+
+    conn, handed, size = asyncio.run(scenario())
+
+    assert handed is conn and size == 0
+
+
+def test_cancelled_waiter_returns_the_connection(tmp_path):
+    async def scenario():
+        pool = AsyncSQLitePool(str(tmp_path / "pool.db"), 1)
+        conn = await pool.acquire()
+        waiting = asyncio.create_task(pool.acquire())
+        await asyncio.sleep(0)
+        # Handed the connection, then cancelled before it runs again
+        pool.release(conn)
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        stats = pool.size, pool.freesize
+        pool.close()
+        await pool.wait_closed()
+        return stats
+
+    assert asyncio.run(scenario()) == (1, 1)
+
+
+def test_transactions_roll_back_and_columns_keep_their_types(tmp_path):
+    database = AsyncSQLiteDatabase(str(tmp_path / "typed.db"), pool_size=2)
+
+    async def scenario():
+        await database.execute(
+            "INSERT INTO `users` (`user_id`, `email`, `password`, `first_name`, `last_name`, `birth_date`) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            ("u1", "u1@example.com", "", "A", "B", datetime(1990, 1, 2, 3, 4))
+        )
+        with pytest.raises(RuntimeError):
+            async with database.transaction() as cursor:
+                await cursor.execute("DELETE FROM `users` WHERE `user_id` = ?", ("u1",))
+                raise RuntimeError()
+
+        try:
+            return await database.fetch_one("SELECT `birth_date` FROM `users` WHERE `user_id` = ?", ("u1",))
+        finally:
+            await database.close_pool()
+
+    # The DATE column keeps only the date, like MySQL
+    assert asyncio.run(scenario()) == {'birth_date': date(1990, 1, 2)}
@@ -0,0 +1,210 @@
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+from data import ADB
+import deletions
+from deletions import DeletionRunner
+from models import DeletionStatus, DeletionTarget
+import query as q
+import rollups
+import utils
+
+TABLES = ('recalls', 'recall_projects', 'pomodoros', 'pomodoro_rollups', 'projects', 'categories', 'users')
+
+
+async def add_rows(user:dict, recalls:int = 5) -> int:
+    user_id = user['user_id']
+    async with ADB.transaction() as cursor:
+        await cursor.execute(q.create_recall_project(), (user_id, "Python"))
+        recall_project_id = cursor.lastrowid
+        for number in range(recalls):
+            await cursor.execute(
+                q.create_recall(), (user_id, recall_project_id, f"Recall {number}", "text", "<p>text</p>", "v")
+            )
+
+        pomodoro_date = datetime(2026, 10, 14, 9, 30)
+        values = (user['category_id'], user['project_id'], 25, pomodoro_date, user_id)
+        for _ in range(3):
+            await cursor.execute(q.create_pomodoro(), values)
+            await rollups.add_pomodoro(cursor, user_id, user['category_id'], user['project_id'], 25, pomodoro_date)
+
+    return recall_project_id
+
+
+async def counts(user_id:str) -> dict:
+    return {
+        table: (await ADB.fetch_one(f"SELECT COUNT(*) AS n FROM {table} WHERE user_id = ?", (user_id,)))['n']
+        for table in TABLES
+    }
+
+
+async def delete(runner:DeletionRunner, user_id:str, target:DeletionTarget, target_id:int = None) -> dict:
+    job_id = await runner.submit(user_id, target, target_id)
+    await asyncio.gather(*list(runner._tasks.values()))
+    return await q.get_deletion_job(user_id, job_id)
+
+
+def test_delete_a_user_in_chunks(run, user, monkeypatch):
+    monkeypatch.setattr(deletions, 'CHUNK_SIZE', 2)
+    runner = DeletionRunner()
+
+    async def scenario():
+        await add_rows(user)
+        before = await counts(user['user_id'])
+        job = await delete(runner, user['user_id'], DeletionTarget.user)
+        return before, job, await counts(user['user_id'])
+
+    before, job, after = run(scenario())
+
+    assert job['status'] == DeletionStatus.done.value
+    assert job['step'] == len(TABLES)
+    assert job['deleted'] == sum(before.values())
+    assert after == dict.fromkeys(TABLES, 0)
+    assert deletions.progress(job)['table'] is None
+
+
+def test_delete_a_recall_project_keeps_the_rest(run, user):
+    runner = DeletionRunner()
+
+    async def scenario():
+        recall_project_id = await add_rows(user)
+        job = await delete(runner, user['user_id'], DeletionTarget.recall_project, recall_project_id)
+        return job, await counts(user['user_id'])
+
+    job, after = run(scenario())
+
+    assert job['status'] == DeletionStatus.done.value
+    assert job['deleted'] == 6
+    assert after['recalls'] == after['recall_projects'] == 0
+    assert after['pomodoros'] == 3 and after['users'] == 1
+
+
+class LateRecallCursor:
+    """
+    Inserts a recall right after the recalls of the recall project are
+    deleted, in the same transaction, as if the user kept writing. The
+    recall project can't be deleted then.
+    """
+
+    def __init__(self, cursor, calls:list, times:int) -> None:
+        self._cursor = cursor
+        self._calls = calls
+        self._times = times
+
+    def __getattr__(self, name:str):
+        return getattr(self._cursor, name)
+
+    async def execute(self, query:str, values = ()):
+        result = await self._cursor.execute(query, values)
+        # The runner reads the rowcount of the delete
+        self.rowcount = self._cursor.rowcount
+        if query == q.delete_chunk('recalls', True):
+            self._calls.append(values)
+            if len(self._calls) <= self._times:
+                user_id, recall_project_id, _ = values
+                await self._cursor.execute(
+                    q.create_recall(), (user_id, recall_project_id, "Late", "text", "<p>text</p>", "v")
+                )
+
+        return result
+
+
+def add_recall_while_deleting(monkeypatch, times:int) -> list:
+    calls = []
+    transaction = ADB.transaction
+
+    @asynccontextmanager
+    async def late_recall_transaction():
+        async with transaction() as cursor:
+            yield LateRecallCursor(cursor, calls, times)
+
+    monkeypatch.setattr(ADB, 'transaction', late_recall_transaction)
+    return calls
+
+
+def test_integrity_error_restarts_the_job(run, user, monkeypatch):
+    calls = add_recall_while_deleting(monkeypatch, times=1)
+    runner = DeletionRunner()
+
+    async def scenario():
+        recall_project_id = await add_rows(user)
+        job = await delete(runner, user['user_id'], DeletionTarget.recall_project, recall_project_id)
+        return job, await counts(user['user_id'])
+
+    job, after = run(scenario())
+
+    # recalls was emptied twice, before and after the restart
+    assert len(calls) == 2
+    assert job['status'] == DeletionStatus.done.value
+    assert after['recalls'] == after['recall_projects'] == 0
+    assert runner.stats()['done'] == 1
+
+
+def test_job_fails_after_too_many_restarts(run, user, monkeypatch):
+    add_recall_while_deleting(monkeypatch, times=deletions.MAX_RESTARTS + 1)
+    runner = DeletionRunner()
+
+    async def scenario():
+        recall_project_id = await add_rows(user)
+        job = await delete(runner, user['user_id'], DeletionTarget.recall_project, recall_project_id)
+        return job, await counts(user['user_id'])
+
+    job, after = run(scenario())
+
+    assert job['status'] == DeletionStatus.failed.value
+    # Stopped on recall_projects, the late recall is still there
+    assert job['step'] == 1
+    assert after['recall_projects'] == 1 and after['recalls'] == 1
+    assert runner.stats()['failed'] == 1
+
+
+def test_resume_a_stale_job(run, user, monkeypatch):
+    monkeypatch.setattr(deletions, 'STALE_AFTER', 0)
+    runner = DeletionRunner()
+
+    async def scenario():
+        recall_project_id = await add_rows(user)
+        # Left by a worker that stopped after emptying recalls
+        updated_at = datetime(2026, 1, 1)
+        values = (
+            user['user_id'], DeletionTarget.recalls.value, recall_project_id, 0, 0,
+            DeletionStatus.running.value, updated_at, updated_at
+        )
+        async with ADB.transaction() as cursor:
+            await cursor.execute(q.create_deletion_job(), values)
+            job_id = cursor.lastrowid
+
+        resumed = await runner.resume()
+        await asyncio.gather(*list(runner._tasks.values()))
+        return resumed, await q.get_deletion_job(user['user_id'], job_id), await counts(user['user_id'])
+
+    resumed, job, after = run(scenario())
+
+    assert resumed >= 1
+    assert job['status'] == DeletionStatus.done.value
+    assert after['recalls'] == 0
+
+
+def test_failed_user_deletion_lets_the_user_log_in(run, user, monkeypatch):
+    delete_chunk = q.delete_chunk
+    # pomodoros can't be deleted, the job fails halfway
+    monkeypatch.setattr(q, 'delete_chunk', lambda table, by_recall_project: (
+        "DELETE FROM missing_table" if table == 'pomodoros' else delete_chunk(table, by_recall_project)
+    ))
+    runner = DeletionRunner()
+    email = f"{user['user_id']}@example.com"
+
+    async def scenario():
+        await add_rows(user)
+        job_id = await runner.submit(user['user_id'], DeletionTarget.user)
+        utils.mark_deleting(email)
+        assert await utils.select_user(email) is None
+        await asyncio.gather(*list(runner._tasks.values()))
+        return await q.get_deletion_job(user['user_id'], job_id), await utils.select_user(email)
+
+    job, found = run(scenario())
+
+    assert job['status'] == DeletionStatus.failed.value
+    assert found['user_id'] == user['user_id']
+    assert utils.USER_CACHE.get(email) is not utils.DELETING
@@ -0,0 +1,76 @@
+import json
+import logging
+import os
+import queue
+import time
+
+import pytest
+
+import error_log
+from error_log import DroppingQueueHandler, ErrorLog, SizeTimedRotatingFileHandler
+
+
+@pytest.fixture
+def log(tmp_path):
+    log = ErrorLog(str(tmp_path / "errors.txt"))
+    yield log
+    log.stop()
+    # The loggers are shared by name
+    log.logger.removeHandler(log.queue_handler)
+
+
+def fail(message:str) -> ValueError:
+    try:
+        raise ValueError(message)
+    except ValueError as e:
+        return e
+
+
+def records(log:ErrorLog) -> list[dict]:
+    log.stop()
+    with open(log.filename) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_repeated_tracebacks_are_counted(log, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, 'monotonic', lambda: now[0])
+
+    for _ in range(3):
+        log.exception(fail("same"), request_id="r1")
+    log.exception(fail("other"))
+    now[0] += error_log.DEDUP_WINDOW + 1
+    log.exception(fail("same"))
+
+    written = records(log)
+    assert [(record['message'], record['repeats']) for record in written] == [("same", 0), ("other", 0), ("same", 2)]
+    assert written[0]['request_id'] == "r1" and written[0]['error'] == "ValueError"
+    assert "raise ValueError(message)" in written[0]['traceback']
+    assert log.stats()['suppressed'] == 2
+
+
+def test_file_rolls_over_at_max_bytes(tmp_path):
+    filename = str(tmp_path / "errors.txt")
+    handler = SizeTimedRotatingFileHandler(filename, max_bytes=100, when='midnight', backupCount=2)
+    record = logging.LogRecord('errors', logging.ERROR, __file__, 1, "x" * 60, None, None)
+    try:
+        for _ in range(5):
+            handler.handle(record)
+    finally:
+        handler.close()
+
+    # Two size rollovers on the same day, neither backup replaced the other
+    files = sorted(os.listdir(tmp_path))
+    assert len(files) == 3 and files[0] == "errors.txt" and files[2] == files[1] + ".001"
+    lines = [line for name in files for line in (tmp_path / name).read_text().splitlines()]
+    assert len(lines) == 5
+
+
+def test_full_queue_drops_records():
+    handler = DroppingQueueHandler(queue.Queue(1))
+    record = logging.LogRecord('errors', logging.ERROR, __file__, 1, "boom", None, None)
+
+    handler.handle(record)
+    handler.handle(record)
+
+    assert handler.queue.qsize() == 1 and handler.dropped == 1
@@ -0,0 +1,76 @@
+import asyncio
+import json
+
+import events
+from events import BROKER, Broker
+
+
+def test_frames_are_server_sent_events():
+    assert events.encode("timer", '{"a": 1}') == b'event: timer\ndata: {"a": 1}\n\n'
+    assert events.encode("html", "<li>\n</li>") == b"event: html\ndata: <li>\ndata: </li>\n\n"
+    assert events.encode("ping", "") == b"event: ping\ndata: \n\n"
+
+
+def test_events_reach_every_connection_of_the_user():
+    broker = Broker()
+
+    async def scenario():
+        phone, laptop = broker.subscribe("u1"), broker.subscribe("u1")
+        other = broker.subscribe("u2")
+        waiting = asyncio.create_task(phone.get())
+        await asyncio.sleep(0)
+
+        delivered = broker.publish("u1", "timer", "started")
+        return delivered, await waiting, await laptop.get(), await other.get(timeout=0)
+
+    delivered, phone, laptop, other = asyncio.run(scenario())
+
+    assert delivered == 2
+    assert phone == laptop == b"event: timer\ndata: started\n\n"
+    # Nothing for another user, an idle connection gets a ping
+    assert other == events.PING
+
+
+def test_lagging_subscriber_is_dropped(monkeypatch):
+    monkeypatch.setattr(events, 'QUEUE_SIZE', 2)
+    broker = Broker()
+    subscriber = broker.subscribe("u1")
+
+    counts = [broker.publish("u1", "timer", str(number)) for number in range(3)]
+
+    async def drain():
+        return [await subscriber.get() for _ in range(3)]
+
+    assert counts == [1, 1, 0]
+    # The buffered frames are still sent, then the stream ends
+    assert asyncio.run(drain()) == [events.encode("timer", "0"), events.encode("timer", "1"), None]
+    assert broker.stats() == {'users': 0, 'subscribers': 0, 'published': 3, 'delivered': 2, 'dropped': 1}
+
+
+def test_close_ends_the_streams():
+    broker = Broker()
+    subscriber = broker.subscribe("u1")
+
+    async def scenario():
+        waiting = asyncio.create_task(subscriber.get())
+        await asyncio.sleep(0)
+        broker.close()
+        return await waiting
+
+    assert asyncio.run(scenario()) is None
+    assert broker.publish("u1", "timer", "late") == 0
+
+
+def test_created_pomodoro_is_published(client, user):
+    subscriber = BROKER.subscribe(user['user_id'])
+    try:
+        response = client.post("/pomodoros/", data={
+            'category_id': user['category_id'], 'project_id': user['project_id'], 'duration': 25
+        })
+    finally:
+        BROKER.unsubscribe(subscriber)
+
+    assert response.status_code == 201
+    event, data = subscriber.frames.popleft().decode().splitlines()[:2]
+    assert event == "event: pomodoro-created"
+    assert json.loads(data.removeprefix("data: "))['duration'] == 25 * 60
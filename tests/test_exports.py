@@ -0,0 +1,39 @@
+import gzip
+import json
+
+import pytest
+
+import query as q
+
+
+def test_csv_export(client, user):
+    response = client.get("/export/categories")
+
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith("text/csv")
+    assert 'filename="categories.csv"' in response.headers['content-disposition']
+    assert response.text.splitlines() == ["category_id,category_name", f"{user['category_id']},Work"]
+
+
+def test_gzipped_export_is_the_same_csv(client):
+    plain = client.get("/export/projects")
+    compressed = client.get("/export/projects", params={'gzip': True})
+
+    assert compressed.headers['content-type'] == "application/gzip"
+    assert 'filename="projects.csv.gz"' in compressed.headers['content-disposition']
+    assert gzip.decompress(compressed.content) == plain.content
+
+
+def test_empty_export_has_the_header(client):
+    response = client.get("/export/recalls", params={'gzip': True})
+
+    assert gzip.decompress(response.content).decode().splitlines() == [",".join(q.EXPORT_COLUMNS['recalls'])]
+
+
+@pytest.mark.parametrize('table', ['categories', 'projects'])
+def test_ndjson_rows_have_the_export_columns(client, table):
+    response = client.get(f"/export/{table}", params={'format': 'ndjson'})
+    rows = [json.loads(line) for line in response.text.splitlines()]
+
+    assert len(rows) == 1
+    assert tuple(rows[0]) == q.EXPORT_COLUMNS[table]
@@ -0,0 +1,76 @@
+from datetime import datetime
+
+from fastapi import Request
+
+from cache import TTLCache
+from data import ADB
+from fragments import FragmentCache
+import query as q
+import versions
+
+
+def request(if_none_match:str = None) -> Request:
+    headers = [(b'if-none-match', if_none_match.encode())] if if_none_match else []
+    return Request({'type': 'http', 'method': 'GET', 'path': '/categories', 'headers': headers})
+
+
+def test_revalidation_skips_the_query_and_the_render(run, user, monkeypatch):
+    user_id = user['user_id']
+    fragments = FragmentCache()
+    renders, lookups = [], []
+
+    get_data_version = q.get_data_version
+
+    async def counted_get_data_version(*args):
+        lookups.append(args)
+        return await get_data_version(*args)
+
+    monkeypatch.setattr(q, 'get_data_version', counted_get_data_version)
+
+    async def render():
+        renders.append(1)
+        return f"<ul><li>Work {len(renders)}</li></ul>"
+
+    async def fetch(if_none_match:str = None):
+        return await fragments.response(
+            request(if_none_match), user_id, 'categories', (), ('categories',), render
+        )
+
+    async def scenario():
+        first = await fetch()
+        tag = first.headers['etag']
+        revalidated = await fetch(tag)
+        counts = (len(renders), len(lookups))
+
+        async with ADB.transaction() as cursor:
+            await cursor.execute(q.create_category(), ("Study", user_id))
+            await versions.bump(cursor, user_id, 'categories')
+        changed = await fetch(tag)
+
+        return first, revalidated, counts, changed
+
+    first, revalidated, counts, changed = run(scenario())
+
+    assert first.status_code == 200 and first.body == b"<ul><li>Work 1</li></ul>"
+    assert revalidated.status_code == 304 and revalidated.headers['etag'] == first.headers['etag']
+    # One version lookup and one render, both for the first request
+    assert counts == (1, 1)
+    # The bump dropped the cached version, the fragment is built again
+    assert changed.status_code == 200 and changed.body == b"<ul><li>Work 2</li></ul>"
+    assert changed.headers['etag'] != first.headers['etag']
+    assert fragments.stats()['not_modified'] == 1
+
+
+def test_versions_of_another_worker_expire(run, user, monkeypatch):
+    user_id = user['user_id']
+    monkeypatch.setattr(versions, 'CACHE', TTLCache(ttl=0))
+
+    async def scenario():
+        before = await versions.cached(user_id, 'projects')
+        # Bumped by another worker, this one's cache isn't touched
+        await ADB.execute(q.bump_data_version(), (user_id, 'projects', 1, datetime.utcnow()))
+        return before, await versions.cached(user_id, 'projects')
+
+    before, after = run(scenario())
+
+    assert before.etag != after.etag
@@ -0,0 +1,134 @@
+import gzip
+import io
+import json
+import threading
+import zipfile
+
+import pytest
+
+from data import ADB
+import imports
+import markdown_render
+import query as q
+
+POMODOROS = [
+    {'category_name': "Work", 'project_name': "API", 'pomodoro_date': "2026-10-18T09:00:00",
+     'duration': "25", 'pomodoro_satisfaction': "good"},
+    {'category_name': "Work", 'project_name': "API", 'pomodoro_date': "2026-10-18T09:30:00",
+     'duration': "50", 'pomodoro_satisfaction': ""},
+]
+
+
+def csv_bytes(rows:list[dict]) -> bytes:
+    header = ",".join(rows[0])
+    lines = [",".join(row.values()) for row in rows]
+    # Spreadsheet tools write a BOM
+    return ("\ufeff" + "\r\n".join([header, *lines]) + "\r\n").encode()
+
+
+def ndjson_bytes(rows:list[dict]) -> bytes:
+    return "".join(json.dumps(row) + "\n" for row in rows).encode()
+
+
+def zip_bytes(files:dict[str, str]) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        for name, content in files.items():
+            archive.writestr(name, content)
+
+    return buffer.getvalue()
+
+
+def read(content:bytes, filename:str) -> list[tuple[int, dict]]:
+    return list(imports.read_upload(io.BytesIO(content), filename))
+
+
+@pytest.mark.parametrize('filename, content', [
+    ("pomodoros.csv", csv_bytes(POMODOROS)),
+    ("pomodoros.csv.gz", gzip.compress(csv_bytes(POMODOROS))),
+    ("pomodoros.ndjson", ndjson_bytes(POMODOROS)),
+    ("pomodoros.jsonl.gz", gzip.compress(ndjson_bytes(POMODOROS))),
+])
+def test_rows_of_csv_and_ndjson(filename, content):
+    rows = read(content, filename)
+
+    assert [row for _, row in rows] == POMODOROS
+    # CSV counts the header line
+    assert [line for line, _ in rows] == ([2, 3] if ".csv" in filename else [1, 2])
+
+
+def test_ndjson_bad_lines_are_rows_with_an_error():
+    content = b'{"recall": "x"}\n\nnot json\n[1, 2]\n'
+
+    rows = read(content, "recalls.ndjson")
+
+    assert rows[0] == (1, {'recall': "x"})
+    assert [line for line, _ in rows] == [1, 3, 4]
+    assert rows[1][1]['__error__'].startswith("invalid JSON")
+    assert rows[2][1] == {'__error__': "not a JSON object"}
+
+
+def test_markdown_zip_one_recall_per_file():
+    content = zip_bytes({
+        "Python/generators.md": "# Generators\n\nyield pauses the function",
+        "Python/notes.txt": "not markdown",
+        "loose.md": "no heading",
+        "__MACOSX/Python/._generators.md": "metadata",
+    })
+
+    rows = read(content, "recalls.zip")
+
+    assert rows == [
+        (1, {'project_name': "Python", 'recall_title': "Generators",
+             'recall': "# Generators\n\nyield pauses the function"}),
+        # Files at the root go to a project named after the archive
+        (2, {'project_name': "recalls", 'recall_title': "loose", 'recall': "no heading"}),
+    ]
+
+
+@pytest.mark.parametrize('filename', ["recalls.txt", "recalls.zip.gz", "recalls", ""])
+def test_unsupported_files(filename):
+    with pytest.raises(imports.InvalidUpload):
+        imports.read_upload(io.BytesIO(b""), filename)
+
+
+def test_not_a_zip():
+    with pytest.raises(imports.InvalidUpload):
+        read(b"plain text", "recalls.zip")
+
+
+def test_write_renders_recalls_off_the_event_loop(run, user, monkeypatch):
+    threads = []
+
+    def markdown_to_html(text:str) -> str:
+        threads.append(threading.current_thread())
+        return f"<p>{text}</p>"
+
+    monkeypatch.setattr(markdown_render, 'markdown_to_html', markdown_to_html)
+    importer = imports.Importer(user['user_id'])
+    chunk = [
+        (1, {'project_name': "Python", 'recall_title': "One", 'recall': "first"}),
+        (2, {**POMODOROS[0], 'category_name': "Study"}),
+        (3, {'project_name': "Python", 'recall_title': "Two", 'recall': "second"}),
+        (4, {'project_name': "Python", 'recall': "no title"}),
+    ]
+
+    async def scenario():
+        await importer.load()
+        await importer.write(chunk)
+        values = (user['user_id'], importer.recall_projects["Python"])
+        return await ADB.fetch_all(
+            "SELECT recall_title, recall_html FROM recalls WHERE user_id = ? AND recall_project_id = ? "
+            "ORDER BY recall_id", values
+        ), await q.get_categories((user['user_id'],))
+
+    recalls, categories = run(scenario())
+
+    assert recalls == [
+        {'recall_title': "One", 'recall_html': "<p>first</p>"},
+        {'recall_title': "Two", 'recall_html': "<p>second</p>"},
+    ]
+    assert "Study" in [category['category_name'] for category in categories]
+    assert threads and threading.main_thread() not in threads
+    assert (importer.recalls, importer.pomodoros, importer.rejected) == (2, 1, 1)
+    assert importer.errors[0]['line'] == 4
@@ -0,0 +1,52 @@
+import sqlite3
+
+from pypika import Order, Table
+import pytest
+
+import queries
+
+ROWS = Table('rows')
+
+
+def page_query(desc:bool, after:bool, size:int) -> str:
+    order = Order.desc if desc else Order.asc
+    query = queries.Query.from_(ROWS).select(ROWS.day, ROWS.row_id)
+    if after:
+        query = query.where(queries.keyset_condition([ROWS.day, ROWS.row_id], desc))
+
+    return query.orderby(ROWS.day, ROWS.row_id, order=order).limit(size).get_sql()
+
+
+def test_keyset_condition_compares_each_prefix():
+    condition = queries.keyset_condition([ROWS.a, ROWS.b, ROWS.c])
+
+    assert condition.get_sql(quote_char='"') == (
+        '"a"<? OR ("a"=? AND "b"<?) OR ("a"=? AND "b"=? AND "c"<?)'
+    )
+    assert queries.keyset_condition([ROWS.a, ROWS.b], desc=False).get_sql(quote_char='"') == (
+        '"a">? OR ("a"=? AND "b">?)'
+    )
+
+
+def test_keyset_values_repeat_the_cursor_prefixes():
+    assert queries.keyset_values((1, 2, 3)) == [1, 1, 2, 1, 2, 3]
+    assert queries.keyset_values(["2026-10-18"]) == ["2026-10-18"]
+
+
+@pytest.mark.parametrize('desc', [True, False])
+def test_pages_cover_every_row_once(desc):
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE rows (day TEXT, row_id INTEGER PRIMARY KEY)")
+    # Several rows share a day, only the row_id breaks the ties
+    days = ["2026-10-01", "2026-10-02", "2026-10-02", "2026-10-02", "2026-10-03", "2026-10-05", "2026-10-05"]
+    conn.executemany("INSERT INTO rows (day, row_id) VALUES (?, ?)", [(day, i) for i, day in enumerate(days, 1)])
+
+    expected = sorted(conn.execute("SELECT day, row_id FROM rows").fetchall(), reverse=desc)
+    rows = conn.execute(page_query(desc, after=False, size=3)).fetchall()
+    pages = [rows]
+    while rows:
+        rows = conn.execute(page_query(desc, after=True, size=3), queries.keyset_values(rows[-1])).fetchall()
+        pages.append(rows)
+
+    assert [row for page in pages for row in page] == expected
+    assert [len(page) for page in pages] == [3, 3, 1, 0]
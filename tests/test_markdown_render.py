@@ -0,0 +1,42 @@
+from data import ADB, DB
+from internal.backfill_recall_html import backfill
+import markdown_render
+from markdown_render import MARKDOWN_VERSION
+import query as q
+
+
+def test_markdown_escapes_raw_html():
+    html = markdown_render.markdown_to_html("**bold** <script>alert(1)</script>")
+
+    assert "<strong>bold</strong>" in html
+    assert "<script>" not in html and "&lt;script&gt;" in html
+
+
+def test_stored_html_is_used_only_for_the_current_version():
+    recall = {'recall': "*fresh*", 'recall_html': "<p>stored</p>", 'recall_html_version': MARKDOWN_VERSION}
+
+    assert markdown_render.recall_to_html(recall) == "<p>stored</p>"
+    assert markdown_render.recall_to_html({**recall, 'recall_html_version': "old"}) == "<p><em>fresh</em></p>"
+    assert markdown_render.recall_to_html({**recall, 'recall_html': None}) == "<p><em>fresh</em></p>"
+
+
+def test_backfill_renders_stale_recalls(run, user):
+    user_id = user['user_id']
+
+    async def create():
+        async with ADB.transaction() as cursor:
+            await cursor.execute(q.create_recall_project(), (user_id, "Notes"))
+            recall_project_id = cursor.lastrowid
+            for html, version in ((None, None), ("<p>old</p>", "old"), ("<p>kept</p>", MARKDOWN_VERSION)):
+                await cursor.execute(q.create_recall(), (user_id, recall_project_id, "Title", "`code`", html, version))
+
+    run(create())
+    backfill(batch_size=1)
+    recalls = DB.fetch_all(
+        "SELECT recall_html, recall_html_version FROM recalls WHERE user_id = ? ORDER BY recall_id", (user_id,)
+    )
+
+    assert [recall['recall_html_version'] for recall in recalls] == [MARKDOWN_VERSION] * 3
+    assert [recall['recall_html'] for recall in recalls] == [
+        "<p><code>code</code></p>", "<p><code>code</code></p>", "<p>kept</p>"
+    ]
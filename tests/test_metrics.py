@@ -0,0 +1,32 @@
+import metrics
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = metrics.Histogram("latency_seconds", "Latency", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 5.0):
+        histogram.observe("/a", value=value)
+
+    assert histogram.render() == [
+        'latency_seconds_bucket{route="/a",le="0.1"} 1',
+        'latency_seconds_bucket{route="/a",le="1.0"} 3',
+        'latency_seconds_bucket{route="/a",le="+Inf"} 4',
+        'latency_seconds_sum{route="/a"} 6.05',
+        'latency_seconds_count{route="/a"} 4',
+    ]
+
+
+def test_requests_are_counted_by_route_template(client, user):
+    key = ("/export/{table}", "GET", "200")
+    before = metrics.HTTP_REQUESTS._values.get(key, 0)
+
+    response = client.get("/export/categories", headers={'X-Request-ID': "abc123"})
+    page = client.get("/metrics")
+
+    assert response.headers['x-request-id'] == "abc123"
+    assert client.get("/export/projects").headers['x-request-id']
+    assert metrics.HTTP_REQUESTS._values[key] == before + 2
+    assert page.headers['content-type'] == metrics.CONTENT_TYPE
+    assert f'http_requests_total{{route="/export/{{table}}",method="GET",status="200"}} {before + 1}' in page.text
+    # The collectors' stats are exported as gauges
+    assert "\ndb_pool_checkouts " in page.text
+    assert metrics.HTTP_IN_FLIGHT._values[("/export/{table}", "GET")] == 0
@@ -0,0 +1,46 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+
+import passwords
+from passwords import PasswordPool
+
+
+def test_hash_and_verify():
+    hashed = passwords._hash("correct horse")
+
+    assert hashed != "correct horse"
+    assert passwords._verify("correct horse", hashed)
+    assert not passwords._verify("wrong horse", hashed)
+
+
+def test_pool_runs_at_most_max_concurrency_calls():
+    pool = PasswordPool(workers=4, max_concurrency=2)
+    # Threads stand in for the worker processes
+    pool.executor = ThreadPoolExecutor(max_workers=4)
+    lock = threading.Lock()
+    running, peak = [0], [0]
+
+    def slow_hash(number:int) -> int:
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.02)
+        with lock:
+            running[0] -= 1
+        return number
+
+    async def burst():
+        return await asyncio.gather(*(pool.run(slow_hash, number) for number in range(6)))
+
+    try:
+        assert asyncio.run(burst()) == list(range(6))
+    finally:
+        pool.shutdown()
+
+    stats = pool.stats()
+    assert peak[0] == 2
+    assert (stats['completed'], stats['running'], stats['waiting']) == (6, 0, 0)
+    # Four calls waited for a slot
+    assert stats['queue_time_max'] > 0.01
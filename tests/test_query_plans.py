@@ -0,0 +1,47 @@
+import os
+import re
+
+from data import DB
+from internal import query_plans
+import query as q
+
+MIGRATION = os.path.join(os.path.dirname(q.__file__), 'migrations', '20261018_access_path_indexes.sql')
+
+
+def test_check_plan_reports_scans_and_filesorts():
+    plan = [
+        {'table': 'pomodoros', 'type': 'ref', 'rows': 40, 'Extra': "Using where; Using index"},
+        {'table': 'projects', 'type': 'ALL', 'rows': 900, 'Extra': None},
+        {'table': 'categories', 'type': 'ref', 'rows': 5, 'Extra': "Using temporary; Using filesort"},
+    ]
+
+    assert query_plans.check_plan(plan) == [
+        "full scan on projects (type=ALL, rows=900)",
+        "using filesort on categories",
+        "using temporary on categories",
+    ]
+    assert query_plans.check_plan(plan[:1]) == []
+
+
+def test_placeholders_take_the_sample_values():
+    sql = "SELECT * FROM `pomodoros` WHERE `user_id`=%s AND `pomodoro_date`>=%s LIMIT %s"
+    sample = {'user_id': "u1", 'pomodoro_date': "2026-10-18"}
+
+    assert query_plans.get_values(sql, sample) == ("u1", "2026-10-18", 1)
+
+
+def test_sqlite_has_the_access_path_indexes():
+    with open(MIGRATION) as f:
+        migrated = set(re.findall(r"CREATE INDEX `(\w+)`", f.read()))
+
+    indexes = {row['name'] for row in DB.fetch_all("SELECT name FROM sqlite_master WHERE type = 'index'")}
+
+    assert migrated and migrated <= indexes
+
+
+def test_latest_pomodoros_use_the_user_date_index(user):
+    plan = DB.fetch_all(f"EXPLAIN QUERY PLAN {q.get_pomodoros_query(True)}", (user['user_id'], "2026-01-01", 10))
+    details = " ".join(step['detail'] for step in plan)
+
+    assert "ix_pomodoros_user_date" in details
+    assert "TEMP B-TREE" not in details
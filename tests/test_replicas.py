@@ -0,0 +1,87 @@
+import pytest
+
+from config import settings
+from data import CURRENT_USER, changed_rows
+from data_sqlite import AsyncSQLiteDatabase
+import query as q
+
+USER_ID = "reader"
+
+
+@pytest.fixture
+def database(run):
+    """ A primary with the same file as its replica, only the routing differs. """
+    replica = AsyncSQLiteDatabase(settings.SQLITE_PATH)
+    database = AsyncSQLiteDatabase(settings.SQLITE_PATH, replicas=[replica])
+    yield database
+    run(database.close_pool())
+
+
+def as_user(database:AsyncSQLiteDatabase, coroutine):
+    async def main():
+        CURRENT_USER.set(USER_ID)
+        await coroutine
+        return bool(database.pinned.get(USER_ID))
+
+    return main()
+
+
+def test_reads_go_to_the_replicas(run, database):
+    async def read():
+        await database.fetch_all(q.get_deletion_job_query(), (0, USER_ID))
+
+    assert not run(as_user(database, read()))
+    assert database.stats()['replica_reads'] == 1
+    assert database.stats()['primary_reads'] == 0
+
+
+def test_a_write_pins_the_user(run, database, user):
+    async def write():
+        async with database.transaction() as cursor:
+            await cursor.execute(q.create_category(), ("Pinned", user['user_id']))
+
+    assert run(as_user(database, write()))
+
+    async def read():
+        await database.fetch_all(q.get_categories_query(), (user['user_id'],))
+
+    run(as_user(database, read()))
+    assert database.stats()['primary_reads'] == 1
+
+
+def test_reads_and_empty_writes_dont_pin(run, database, user):
+    async def read_in_a_transaction():
+        async with database.transaction() as cursor:
+            await cursor.execute(q.get_categories_query(), (user['user_id'],))
+            await cursor.fetchall()
+
+    async def update_nothing():
+        await database.execute(q.update_category(), ("Renamed", -1, user['user_id']))
+
+    async def rolled_back():
+        with pytest.raises(RuntimeError):
+            async with database.transaction() as cursor:
+                await cursor.execute(q.create_category(), ("Rolled back", user['user_id']))
+                raise RuntimeError
+
+    async def update_nothing_after_an_insert():
+        async with database.connection() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute(q.create_category(), ("Unpinned", user['user_id']))
+                await cursor.execute(q.update_category(), ("Renamed", -1, user['user_id']))
+                return changed_rows(cursor)
+
+    assert not run(update_nothing_after_an_insert())
+    assert not run(as_user(database, read_in_a_transaction()))
+    assert not run(as_user(database, update_nothing()))
+    assert not run(as_user(database, rolled_back()))
+
+
+def test_writes_without_a_user_pin_nobody(run, database, user):
+    async def write():
+        async with database.transaction() as cursor:
+            await cursor.execute(q.create_category(), ("Background", user['user_id']))
+
+    run(write())
+
+    assert len(database.pinned) == 0
@@ -0,0 +1,116 @@
+from datetime import date, datetime
+
+from data import ADB
+from internal.rebuild_rollups import rebuild_user
+import query as q
+import rollups
+
+
+def test_period_starts_of_a_sunday():
+    assert rollups.period_starts(datetime(2026, 10, 18, 23, 59)) == [
+        ('day', date(2026, 10, 18)),
+        # Weeks start on monday
+        ('week', date(2026, 10, 12)),
+        ('month', date(2026, 10, 1)),
+    ]
+
+
+def test_period_starts_takes_dates():
+    assert rollups.period_starts(date(2026, 9, 1)) == [
+        ('day', date(2026, 9, 1)),
+        ('week', date(2026, 8, 31)),
+        ('month', date(2026, 9, 1)),
+    ]
+
+
+async def create_pomodoro(user:dict, pomodoro_date:datetime) -> int:
+    async with ADB.transaction() as cursor:
+        values = (user['category_id'], user['project_id'], 25, pomodoro_date, user['user_id'])
+        await cursor.execute(q.create_pomodoro(), values)
+        pomodoro_id = cursor.lastrowid
+        await rollups.add_pomodoro(
+            cursor, user['user_id'], user['category_id'], user['project_id'], 25, pomodoro_date
+        )
+
+    return pomodoro_id
+
+
+async def rate(user:dict, pomodoro_id:int, satisfaction:int) -> bool:
+    async with ADB.transaction() as cursor:
+        return await rollups.rate_pomodoro(cursor, user['user_id'], pomodoro_id, satisfaction)
+
+
+async def counts(user:dict) -> dict:
+    rows = await ADB.fetch_all(
+        "SELECT period, minutes, pomodoros, good, bad FROM pomodoro_rollups WHERE user_id = ?",
+        (user['user_id'],)
+    )
+    return {row['period']: (row['minutes'], row['pomodoros'], row['good'], row['bad']) for row in rows}
+
+
+def test_rate_pomodoro_moves_the_rollup_counts(run, user):
+    async def scenario():
+        pomodoro_id = await create_pomodoro(user, datetime(2026, 10, 14, 9, 30))
+        counted = await counts(user)
+
+        assert await rate(user, pomodoro_id, 1)
+        rated_good = await counts(user)
+        assert await rate(user, pomodoro_id, 2)
+        rated_bad = await counts(user)
+        # Rating it the same again changes nothing
+        assert await rate(user, pomodoro_id, 2)
+        rated_bad_again = await counts(user)
+
+        return counted, rated_good, rated_bad, rated_bad_again
+
+    counted, rated_good, rated_bad, rated_bad_again = run(scenario())
+
+    assert counted == {period: (25, 1, 0, 0) for period in rollups.PERIODS}
+    assert rated_good == {period: (25, 1, 1, 0) for period in rollups.PERIODS}
+    assert rated_bad == {period: (25, 1, 0, 1) for period in rollups.PERIODS}
+    assert rated_bad_again == rated_bad
+
+
+def test_rate_pomodoro_of_another_user(run, user):
+    async def scenario():
+        pomodoro_id = await create_pomodoro(user, datetime(2026, 10, 14, 9, 30))
+        other = {**user, 'user_id': "someone-else"}
+        return await rate(other, pomodoro_id, 1), await counts(user)
+
+    rated, counted = run(scenario())
+
+    assert not rated
+    assert counted == {period: (25, 1, 0, 0) for period in rollups.PERIODS}
+
+
+async def rollup_rows(user:dict) -> list[dict]:
+    return await ADB.fetch_all(
+        "SELECT period, period_start, category_id, project_id, minutes, pomodoros, good, bad "
+        "FROM pomodoro_rollups WHERE user_id = ? ORDER BY period, period_start", (user['user_id'],)
+    )
+
+
+def test_rebuild_matches_the_incremental_rollups(run, user):
+    async def scenario():
+        # A sunday and the monday after, in two weeks and two months
+        await create_pomodoro(user, datetime(2026, 8, 30, 22, 0))
+        pomodoro_id = await create_pomodoro(user, datetime(2026, 8, 31, 9, 0))
+        await rate(user, pomodoro_id, 1)
+        incremental = await rollup_rows(user)
+        # Drifted, one pomodoro counted twice
+        await ADB.execute(
+            "UPDATE pomodoro_rollups SET pomodoros = 2 WHERE user_id = ? AND period = 'month'",
+            (user['user_id'],)
+        )
+        return incremental
+
+    incremental = run(scenario())
+    rebuild_user(user['user_id'])
+    rebuilt = run(rollup_rows(user))
+
+    assert rebuilt == incremental
+    assert [(row['period'], row['period_start']) for row in rebuilt] == [
+        ('day', date(2026, 8, 30)), ('day', date(2026, 8, 31)),
+        ('month', date(2026, 8, 1)),
+        ('week', date(2026, 8, 24)), ('week', date(2026, 8, 31)),
+    ]
@@ -0,0 +1,53 @@
+from data import ADB
+import query as q
+import utils
+
+
+def test_search_terms_skip_single_characters():
+    assert utils.search_terms("A Python-generator, a yield!") == ["python", "generator", "yield"]
+
+
+def test_highlight_escapes_and_marks_every_match():
+    html = utils.highlight("<b>Yield</b> pauses; yield resumes", ["yield"])
+
+    assert html == "&lt;b&gt;<mark>Yield</mark>&lt;/b&gt; pauses; <mark>yield</mark> resumes"
+    assert utils.highlight("<i>", []) == "&lt;i&gt;"
+
+
+def test_snippet_is_a_window_around_the_first_match():
+    text = "x" * 300 + " generators yield values " + "y" * 300
+
+    snippet = utils.highlight_snippet(text, ["yield"], width=100)
+
+    assert snippet.startswith("...") and snippet.endswith("...")
+    assert "<mark>yield</mark>" in snippet
+    assert utils.highlight_snippet("short yield", ["yield"]) == "short <mark>yield</mark>"
+
+
+def test_search_ranks_title_matches_first(run, user):
+    user_id = user['user_id']
+
+    async def scenario():
+        async with ADB.transaction() as cursor:
+            await cursor.execute(q.create_recall_project(), (user_id, "Python"))
+            recall_project_id = cursor.lastrowid
+            recalls = [
+                ("Decorators", "wrap a function, generators can be decorated"),
+                ("Generators", "functions that yield"),
+                ("Classes", "nothing to find here"),
+            ]
+            for title, recall in recalls:
+                await cursor.execute(q.create_recall(), (user_id, recall_project_id, title, recall, None, None))
+
+        return (
+            await q.search_recalls(user_id, "generators", 10),
+            await q.search_recalls(user_id, "generators", 10, 1),
+            await q.search_recalls("someone-else", "generators", 10),
+        )
+
+    found, second_page, others = run(scenario())
+
+    assert [recall['recall_title'] for recall in found] == ["Generators", "Decorators"]
+    assert found[0]['project_name'] == "Python" and found[0]['score'] > found[1]['score']
+    assert [recall['recall_title'] for recall in second_page] == ["Decorators"]
+    assert others == []
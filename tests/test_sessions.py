@@ -0,0 +1,120 @@
+import time
+
+import pytest
+
+from models import SessionState
+from sessions import SessionError, SessionTable
+
+
+class Clock:
+
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(time, 'time', clock)
+    monkeypatch.setattr(time, 'monotonic', clock)
+    return clock
+
+
+def test_lifecycle_counts_only_running_time(clock):
+    table = SessionTable()
+    session = table.open(1, "user", 25 * 60)
+    assert session.state is SessionState.created
+
+    table.transition(session, 'start')
+    clock.now += 60
+    table.transition(session, 'pause')
+    # Paused time isn't counted
+    clock.now += 600
+    assert session.remaining() == 24 * 60
+
+    table.transition(session, 'resume')
+    clock.now += 30
+    assert session.view()['remaining'] == 24 * 60 - 30
+    assert session.view()['ends_at'] == clock.now + 24 * 60 - 30
+
+    table.transition(session, 'complete')
+    assert session.state is SessionState.completed
+    assert session.remaining() == 0
+    assert table.completed == 1
+
+
+def test_reset_goes_back_to_created(clock):
+    table = SessionTable()
+    session = table.open(1, "user", 25 * 60)
+    table.transition(session, 'start')
+    clock.now += 120
+    table.transition(session, 'pause')
+
+    table.transition(session, 'reset')
+
+    assert session.state is SessionState.created
+    assert session.remaining() == 25 * 60
+
+
+@pytest.mark.parametrize('actions, action', [
+    ((), 'pause'),
+    ((), 'resume'),
+    (('start',), 'start'),
+    (('start',), 'resume'),
+    (('start', 'pause'), 'pause'),
+    (('complete',), 'start'),
+    (('complete',), 'reset'),
+    (('complete',), 'complete'),
+])
+def test_transitions_not_allowed(clock, actions, action):
+    table = SessionTable()
+    session = table.open(1, "user", 25 * 60)
+    for previous in actions:
+        table.transition(session, previous)
+    state = session.state
+
+    with pytest.raises(SessionError):
+        table.transition(session, action)
+    assert session.state is state
+
+
+def test_complete_a_session_opened_again(clock):
+    # A session lost to a restart is opened again in created
+    table = SessionTable()
+    session = table.open(1, "user", 25 * 60)
+
+    table.transition(session, 'complete')
+
+    assert session.state is SessionState.completed
+
+
+def test_sessions_belong_to_their_user(clock):
+    table = SessionTable()
+    first = table.open(1, "user", 25 * 60)
+    second = table.open(2, "user", 25 * 60)
+
+    assert table.get("user", 1) is first
+    assert table.get("other", 1) is None
+    assert table.current("user") is second
+
+    table.close(2)
+    assert table.current("user") is None
+    assert table.get("user", 1) is first
+
+
+def test_expired_sessions_are_dropped(clock):
+    table = SessionTable(maxsize=2, ttl=60)
+    table.open(1, "a", 25 * 60)
+    clock.now += 61
+    table.open(2, "b", 25 * 60)
+    assert table.get("a", 1) is None
+
+    table.open(3, "c", 25 * 60)
+    table.open(4, "d", 25 * 60)
+    # Over maxsize, the least recently used goes first
+    assert table.get("b", 2) is None
+    assert len(table) == 2
+    assert table.expired == 2
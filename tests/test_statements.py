@@ -0,0 +1,36 @@
+import query as q
+import statements
+from statements import statement
+
+
+def test_builder_runs_once_per_shape(monkeypatch):
+    monkeypatch.setattr(statements, 'BUILDERS', {})
+    calls = []
+
+    @statement((False,), (True,))
+    def select_names(by_user:bool = False) -> str:
+        calls.append(by_user)
+        return "SELECT name FROM names" + (" WHERE user_id=?" if by_user else "")
+
+    first = select_names(True)
+    again = select_names(True)
+    other = select_names()
+
+    assert first is again and other == "SELECT name FROM names"
+    assert calls == [True, False]
+    assert statements.statement_name(first) == "test_statements.select_names"
+    assert statements.BUILDERS["test_statements.select_names"][1] == ((False,), (True,))
+
+
+def test_compile_all_renders_every_declared_shape():
+    statements.clear()
+    statements.compile_all()
+
+    compiled = {(name, shape) for name, shape, _ in statements.compiled_statements()}
+
+    for name, (_, shapes) in statements.BUILDERS.items():
+        for shape in shapes:
+            assert (name, shape) in compiled
+    # The SQL run by data.py is tagged with its builder
+    assert statements.statement_name(q.create_category()) == "query.create_category"
+    assert statements.statement_name("SELECT 1") == statements.UNKNOWN
@@ -0,0 +1,48 @@
+from datetime import datetime, timezone
+
+from fastapi import Request
+
+import versions
+from versions import Version
+
+
+def request(**headers:str) -> Request:
+    headers = [(name.replace('_', '-').encode(), value.encode()) for name, value in headers.items()]
+    return Request({'type': 'http', 'method': 'GET', 'path': '/', 'headers': headers})
+
+
+def test_if_none_match_takes_precedence():
+    version = Version('"abc"', datetime(2024, 1, 1, tzinfo=timezone.utc))
+    later = "Tue, 02 Jan 2024 00:00:00 GMT"
+
+    assert versions.is_fresh(request(if_none_match='"old", W/"abc"'), version)
+    assert versions.is_fresh(request(if_none_match='*'), version)
+    assert not versions.is_fresh(request(if_none_match='"old"', if_modified_since=later), version)
+
+
+def test_if_modified_since_compares_seconds():
+    version = Version('"abc"', datetime(2024, 1, 2, tzinfo=timezone.utc))
+
+    assert versions.is_fresh(request(if_modified_since="Tue, 02 Jan 2024 00:00:00 GMT"), version)
+    assert not versions.is_fresh(request(if_modified_since="Mon, 01 Jan 2024 23:59:59 GMT"), version)
+    assert not versions.is_fresh(request(if_modified_since="not a date"), version)
+    # No Last-Modified while the version can still change within its second
+    unsettled = version._replace(last_modified=None)
+    assert not versions.is_fresh(request(if_modified_since="Tue, 02 Jan 2024 00:00:00 GMT"), unsettled)
+    assert not versions.is_fresh(request(), version)
+
+
+def test_unchanged_category_is_not_modified(client, user):
+    path = f"/categories/{user['category_id']}"
+
+    first = client.get(path)
+    tag = first.headers['etag']
+    revalidated = client.get(path, headers={'If-None-Match': tag})
+    client.put(path, data={'category_name': "Study"})
+    changed = client.get(path, headers={'If-None-Match': tag})
+
+    assert first.status_code == 200 and first.json()['category_name'] == "Work"
+    assert revalidated.status_code == 304 and revalidated.content == b""
+    assert revalidated.headers['etag'] == tag
+    assert changed.status_code == 200 and changed.json()['category_name'] == "Study"
+    assert changed.headers['etag'] != tag
@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+
+from config import settings
+import data
+from data import CURRENT_USER
+from data_sqlite import AsyncSQLiteDatabase
+import query as q
+
+
+@pytest.fixture
+def database(run):
+    """ Write-behind on the test database, with a replica to see the pins. """
+    replica = AsyncSQLiteDatabase(settings.SQLITE_PATH)
+    database = AsyncSQLiteDatabase(settings.SQLITE_PATH, replicas=[replica])
+    database.write_behind = True
+    yield database
+    run(database.close_pool())
+
+
+def category_names(run, user_id:str) -> list[str]:
+    return [category['category_name'] for category in run(q.get_categories((user_id,)))]
+
+
+def test_failing_write_is_rolled_back_alone(run, database, user):
+    user_id = user['user_id']
+    calls = []
+
+    def insert(name:str, fail:bool = False):
+        async def work(cursor):
+            calls.append(name)
+            await cursor.execute(q.create_category(), (name, user_id))
+            if fail:
+                raise ValueError(name)
+            return cursor.lastrowid
+
+        return work
+
+    async def scenario():
+        return await asyncio.gather(
+            database.submit(insert("First")),
+            database.submit(insert("Failing", fail=True)),
+            database.submit(insert("Last")),
+            return_exceptions=True,
+        )
+
+    first, failing, last = run(scenario())
+
+    assert isinstance(first, int) and isinstance(last, int)
+    assert isinstance(failing, ValueError)
+    # One transaction, every write ran once
+    assert calls == ["First", "Failing", "Last"]
+    assert database.writes.stats()['batches'] == 1
+    assert sorted(category_names(run, user_id)) == ["First", "Last", "Work"]
+
+
+def test_failed_write_that_isnt_waited_for_is_logged(run, database, user, monkeypatch):
+    logged = []
+    monkeypatch.setattr(data.ERROR_LOG, 'exception', lambda exc, **fields: logged.append((exc, fields)))
+
+    async def work(cursor):
+        await cursor.execute(q.create_category(), ("Lost", user['user_id']))
+        raise ValueError("lost")
+
+    async def scenario():
+        queued = await database.submit(work, durable=False)
+        await database.writes.flush()
+        return queued
+
+    assert run(scenario()) is None
+    assert [(str(exc), fields) for exc, fields in logged] == [("lost", {'source': 'write-behind'})]
+    assert "Lost" not in category_names(run, user['user_id'])
+
+
+def test_only_callers_that_wrote_are_pinned(run, database, user):
+    async def as_user(user_id:str, work):
+        CURRENT_USER.set(user_id)
+        await database.submit(work)
+
+    async def insert(cursor):
+        await cursor.execute(q.create_category(), ("Pinned", user['user_id']))
+
+    async def update_nothing(cursor):
+        await cursor.execute(q.update_category(), ("Renamed", -1, user['user_id']))
+
+    async def scenario():
+        await asyncio.gather(as_user("writer", insert), as_user("idle", update_nothing))
+
+    run(scenario())
+
+    assert database.pinned.get("writer") and not database.pinned.get("idle")
+    # The writer task doesn't pin for the caller that started it
+    assert database.pinned.get(None) is None
@@ -1,38 +1,32 @@
 from curses.ascii import US
 from datetime import datetime, timedelta
+from html import escape
 import os
-from typing import Union
+import re
+from typing import Optional, Union
 
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
-import markdown as mk
-from markdown.extensions import Extension
-from pandas import DataFrame
-from passlib.context import CryptContext
-from pypika import Table, Parameter
+from pypika import Table
+from pypika.terms import ExistsCriterion
 
 from authentication import OAuth2PasswordBearerWithCookie
+from cache import TTLCache
 from config import settings
-from data import DB
-from models import ResponseUser
+from data import ADB, CURRENT_USER
+from models import DeletionStatus, DeletionTarget, ResponseUser
 import queries
 import query as q
-
-
-
-class EscapeHtml(Extension):
-    def extendMarkdown(self, md):
-        md.preprocessors.deregister('html_block')
-        md.inlinePatterns.deregister('html')
+from statements import statement
 
 
 # General utils
 
-def delete_message(db):
-    if db.cursor.rowcount > 0:
+def delete_message(rowcount:int):
+    if rowcount > 0:
         message = f"Deletion was successfull"
-    elif db.cursor.rowcount == 0:
+    elif rowcount == 0:
         message = f"There were not deletions"
     else:
         message = "Unexpected error occured"
@@ -48,41 +42,116 @@ def get_current_endpoint(url:str)-> str:
 
     return endpoint
 
-def markdown_to_html(text:str)-> str:
-    return mk.markdown(text, extensions=[EscapeHtml(), 'fenced_code', 'codehilite', 'nl2br'])
+def fill_missing(rows:list[dict], value = "")-> list[dict]:
+    for row in rows:
+        for key, item in row.items():
+            if item is None:
+                row[key] = value
 
-# User utils
+    return rows
 
-PWD_CXT = CryptContext(schemes=['bcrypt'], deprecated='auto')
-USERS = Table("users")
+# Recall utils
+
+def search_terms(text:str)-> list[str]:
+    return [term for term in re.findall(r"\w+", text.lower()) if len(term) > 1]
+
+def highlight(text:str, terms:list[str])-> str:
+    """ Escape `text` and wrap every occurrence of `terms` in <mark>. """
+    if not terms:
+        return escape(text)
+
+    pattern = re.compile("|".join(re.escape(term) for term in terms), re.IGNORECASE)
+    parts = []
+    last = 0
+    for match in pattern.finditer(text):
+        parts.append(escape(text[last:match.start()]))
+        parts.append(f"<mark>{escape(match.group(0))}</mark>")
+        last = match.end()
+    parts.append(escape(text[last:]))
 
-def verify_password(plain_pass, hashed_pass):
-    return PWD_CXT.verify(plain_pass, hashed_pass)
+    return "".join(parts)
 
+def highlight_snippet(text:str, terms:list[str], width:int = 200)-> str:
+    """ Highlighted window of `width` characters around the first match. """
+    text = text or ""
+    lowered = text.lower()
+    positions = [lowered.find(term) for term in terms]
+    positions = [position for position in positions if position >= 0]
 
-def select_user(email:str)-> DataFrame:
+    start = max(min(positions, default=0) - width // 4, 0)
+    snippet = text[start:start + width]
+    prefix = "..." if start > 0 else ""
+    suffix = "..." if start + width < len(text) else ""
 
-    # Generate query
+    return prefix + highlight(snippet, terms) + suffix
+
+# User utils
+
+USERS = Table("users")
+DELETION_JOBS = Table("deletion_jobs")
+
+@statement()
+def select_user_query()-> str:
     columns = [
         USERS.user_id, USERS.email, USERS.first_name,
         USERS.last_name, USERS.birth_date
     ]
-    condition = [USERS.email == Parameter("%s")]
+    # A user being deleted is not found, their writes would land under
+    # tables the deletion already emptied. After a failed deletion the
+    # user and their data stay, they can log in again.
+    deleting = queries.select_query(
+        DELETION_JOBS, [DELETION_JOBS.job_id],
+        [
+            DELETION_JOBS.user_id == USERS.user_id,
+            DELETION_JOBS.target == queries.placeholder(),
+            DELETION_JOBS.status.isin([queries.placeholder(), queries.placeholder()]),
+        ]
+    )
+    condition = [USERS.email == queries.placeholder(), ExistsCriterion(deleting).negate()]
     query = queries.select_query(USERS, columns, condition)
-    values = (email, )
-    user = DB.pandas_query(query.get_sql(), values)
+
+    return query.get_sql()
+
+async def select_user(email:str)-> Optional[dict]:
+    values = (email, DeletionTarget.user.value, DeletionStatus.running.value, DeletionStatus.done.value)
+    # From the primary, a replica may not have a new user yet
+    user = await ADB.fetch_one(select_user_query(), values, primary=True)
 
     return user
 
+# Resolved users by token subject. Every worker has its own cache, the
+# ttl bounds how long another worker can serve a stale user.
+USER_CACHE = TTLCache(
+    maxsize=getattr(settings, 'USER_CACHE_SIZE', 1024),
+    ttl=getattr(settings, 'USER_CACHE_TTL', 60),
+)
+
+# Cached in place of a user whose deletion started
+DELETING = object()
+
+def invalidate_user(email:str)-> None:
+    USER_CACHE.delete(email)
+
+def mark_deleting(email:str)-> None:
+    """ Reject the user's token at once, select_user stops finding them after the TTL. """
+    USER_CACHE.set(email, DELETING)
+
 # Categories utils
 
-def get_categories_list(user_id:int)-> list[str]:
+async def get_categories_list(user_id:int)-> list[dict]:
     values = (user_id, )
-    df = q.get_categories(values)
-    return df.to_dict('records')
+    categories = await q.get_categories(values)
+    return categories
 
 # Pomodoros utils
 
+def to_local_naive(moment:datetime) -> datetime:
+    """ Aware datetimes to the server local time, the database stores naive ones. """
+    if moment.tzinfo is None:
+        return moment
+
+    return moment.astimezone().replace(tzinfo=None)
+
 def get_satisfaction_int(satisfaction):
     satisfaction_dict = {
         "good": 1,
@@ -97,6 +166,16 @@ def get_satisfaction_int(satisfaction):
             detail=f"Pomodoro satisfaction has to be either 'good' or 'bad' currently it is {satisfaction}",
             )
     return value
+
+def get_satisfaction_name(value:Optional[int])-> str:
+    satisfaction_dict = {
+        None: "",
+        0: "missing",
+        1: "good",
+        2: "bad",
+    }
+
+    return satisfaction_dict[value]
     
 
 # JWT token
@@ -129,7 +208,7 @@ def verify_token(token, credentials_exception):
     
     return email
 
-def get_current_user(token:str = Depends(oauth2_scheme)) -> ResponseUser:
+async def get_current_user(request:Request, token:str = Depends(oauth2_scheme)) -> ResponseUser:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -137,9 +216,22 @@ def get_current_user(token:str = Depends(oauth2_scheme)) -> ResponseUser:
     )
 
     email = verify_token(token, credentials_exception)
-    user = select_user(email)
+    user = USER_CACHE.get(email)
 
-    if user.empty:
+    if user is DELETING:
         raise credentials_exception
 
-    return user.to_dict('records')[0]
+    if user is None:
+        user = await select_user(email)
+
+        if user is None:
+            raise credentials_exception
+        USER_CACHE.set(email, user)
+
+    # For the error log
+    request.state.user_id = user['user_id']
+    # Pins the user's reads to the primary after a write, see data.ReplicaRouter
+    CURRENT_USER.set(user['user_id'])
+
+    # Handlers get their own copy so they can't change the cached user
+    return dict(user)
@@ -0,0 +1,109 @@
+"""
+Per-user data versions for conditional GETs.
+
+Every write to a user's rows bumps the (user_id, table) row of
+data_versions in the same transaction. A read endpoint looks the version
+up by primary key, builds an ETag and a Last-Modified from it and
+answers If-None-Match / If-Modified-Since with 304 when they still
+match, skipping its query and serialisation.
+
+cached() keeps the versions in the worker for CACHE_TTL seconds, the
+fragment cache (fragments.py) revalidates with it without a query. A
+bump drops the entries of its worker, a write on another worker (or a
+read racing the commit) is seen once they expire.
+"""
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+import hashlib
+from typing import NamedTuple, Optional
+
+from fastapi import Request, Response, status
+
+from cache import TTLCache
+from config import settings
+import query as q
+
+# Tables whose reads are validated with a version
+TABLES = ('categories', 'projects', 'pomodoros', 'recall_projects')
+# Seconds another worker's write can go unseen by cached(), 0 disables it
+CACHE_TTL = getattr(settings, 'VERSION_CACHE_TTL', 1.0)
+
+# (user_id, table) -> Version
+CACHE = TTLCache(maxsize=getattr(settings, 'VERSION_CACHE_SIZE', 100000), ttl=CACHE_TTL)
+
+
+class Version(NamedTuple):
+    etag: str
+    # None while the version may still change within the same second
+    last_modified: Optional[datetime]
+
+    def headers(self) -> dict:
+        headers = {'ETag': self.etag, 'Cache-Control': "private, no-cache", 'Vary': "Cookie"}
+        if self.last_modified is not None:
+            headers['Last-Modified'] = format_datetime(self.last_modified, usegmt=True)
+
+        return headers
+
+
+async def bump(cursor, user_id:str, *tables:str) -> None:
+    """ Bump the versions of `tables`, call it with the cursor of the write's transaction. """
+    modified_at = datetime.utcnow()
+    await cursor.executemany(q.bump_data_version(), [(user_id, table, 1, modified_at) for table in tables])
+    for table in tables:
+        CACHE.delete((user_id, table))
+
+
+async def current(user_id:str, table:str) -> Version:
+    row = await q.get_data_version(user_id, table)
+    version = row['version'] if row else 0
+    # The app version changes the tag when a release changes the responses
+    tag = f"{settings.PROJECT_VERSION}:{user_id}:{table}:{version}"
+    tag = hashlib.sha1(tag.encode()).hexdigest()[:20]
+
+    last_modified = None
+    if row:
+        modified = row['modified_at'].replace(microsecond=0, tzinfo=timezone.utc)
+        # HTTP dates have second precision, a second write within the
+        # same second would get the same Last-Modified. It's only sent
+        # once that second is over, If-None-Match still works meanwhile
+        if modified < datetime.now(timezone.utc).replace(microsecond=0):
+            last_modified = modified
+
+    return Version(f'"{tag}"', last_modified)
+
+
+async def cached(user_id:str, table:str) -> Version:
+    """ current(), from the worker's cache while it's younger than CACHE_TTL. """
+    key = (user_id, table)
+    version = CACHE.get(key)
+    if version is None:
+        version = await current(user_id, table)
+        if CACHE_TTL > 0:
+            CACHE.set(key, version)
+
+    return version
+
+
+def is_fresh(request:Request, version:Version) -> bool:
+    """ True when the client's copy is still current, If-None-Match takes precedence. """
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+        return version.etag in tags or '*' in tags
+
+    if_modified_since = request.headers.get('if-modified-since')
+    if if_modified_since is None or version.last_modified is None:
+        return False
+
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+
+    return version.last_modified <= since
+
+
+def not_modified(version:Version) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=version.headers())